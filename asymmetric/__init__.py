@@ -1 +1 @@
-__all__ = ["rsa"]
+__all__ = ["batchgcd", "lattice", "rsa"]
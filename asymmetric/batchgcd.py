@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+"""Batch GCD: find the RSA moduli sharing a prime factor in a large corpus.
+
+The product of all moduli is computed with a product tree, then reduced
+modulo the square of every modulus with a remainder tree (Bernstein), so that
+gcd(n, (P mod n^2)/n) gives the factors n shares with the other moduli in
+quasi-linear time instead of the quadratic pairwise gcds.
+
+Tree levels can be spilled to disk when the corpus does not fit in memory,
+and the products and remainders of a level are split across processes (a
+single process pool being used for the whole computation).
+"""
+
+import os
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import gmpy2
+
+from asymmetric.rsa import RSA
+from util.error import BatchGCDError, RSAError
+from util.parallel import nb_workers, run_jobs, split
+
+# Levels with fewer numbers are computed in the main process
+_min_parallel = 64
+
+def _multiply_pairs(level):
+    """Return the products of consecutive pairs of 'level' [List<mpz>] (odd last one kept)."""
+    res = [level[i]*level[i+1] for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        res.append(level[-1])
+    return res
+
+def _reduce(parents, level):
+    """Return each number of 'level' [List<mpz>] reducing its parent modulo its square."""
+    return [parents[i//2] % (n*n) for i, n in enumerate(level)]
+
+# -------------------------------------------------------------------------- #
+
+class _Level:
+    """Tree level, kept in memory or stored in a file of length-prefixed numbers."""
+    def __init__(self, numbers, directory=None):
+        self.size = len(numbers)
+        self.path = None
+        self.numbers = numbers
+        if directory is not None:
+            fd, self.path = tempfile.mkstemp(suffix=".level", dir=directory)
+            with os.fdopen(fd, "wb") as f:
+                for n in numbers:
+                    data = gmpy2.to_binary(n)
+                    f.write(struct.pack("<Q", len(data)) + data)
+            self.numbers = None
+
+    def load(self):
+        """Return the numbers [List<mpz>] of the level."""
+        if self.numbers is not None:
+            return self.numbers
+        numbers = []
+        with open(self.path, "rb") as f:
+            for _ in range(self.size):
+                length, = struct.unpack("<Q", f.read(8))
+                numbers.append(gmpy2.from_binary(f.read(length)))
+        return numbers
+
+    def drop(self):
+        """Release the level (and delete its file)."""
+        self.numbers = None
+        if self.path is not None:
+            os.remove(self.path)
+            self.path = None
+
+
+class BatchGCD:
+    """Product/remainder tree batch GCD.
+
+    Keyword arguments:
+    workers [int] -- number of worker processes, 0 for one per CPU (default 1)
+    spill [string] -- directory where the tree levels are stored instead of
+        being kept in memory (default None)
+    """
+    def __init__(self, workers=1, spill=None):
+        if spill is not None and not os.path.isdir(spill):
+            raise BatchGCDError("Spill directory '{}' does not exist".format(spill))
+        self.workers = nb_workers(workers)
+        self.spill = spill
+
+    def __repr__(self):
+        return "BatchGCD({:d}, {})".format(self.workers, self.spill)
+
+    def _pool(self, pool=None):
+        """Return a context manager [ContextManager] giving 'pool', or a new
+        process pool if 'pool' is None and several workers are used.
+        """
+        if pool is not None or self.workers <= 1:
+            return nullcontext(pool)
+        # Worker processes are only started by the first parallel level
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def _map(self, fcn, level, parents=None, pool=None):
+        """Return fcn(level) or fcn(parents, level), the level being split across the processes of 'pool'.
+
+        Chunks start at even indexes, so that pairs of children stay with
+        their parent.
+        """
+        if self.workers <= 1 or len(level) < _min_parallel:
+            return fcn(level) if parents is None else fcn(parents, level)
+        jobs = []
+        for start, end in split(len(level), self.workers, 2):
+            chunk = level[start:end]
+            jobs.append((chunk,) if parents is None else (parents[start//2:(end + 1)//2], chunk))
+        return [n for res in run_jobs(fcn, jobs, self.workers, pool) for n in res]
+
+    def product_tree(self, moduli, pool=None):
+        """Return the levels [List<_Level>] of the product tree of 'moduli', leaves first.
+
+        Keyword arguments:
+        moduli [List<int>] -- leaves of the tree
+        pool [ProcessPoolExecutor] -- process pool shared with the caller
+            (default None, one pool for all the levels)
+        """
+        with self._pool(pool) as pool:
+            level = [gmpy2.mpz(n) for n in moduli]
+            levels = [_Level(level, self.spill)]
+            while len(level) > 1:
+                level = self._map(_multiply_pairs, level, pool=pool)
+                levels.append(_Level(level, self.spill))
+        return levels
+
+    def remainders(self, moduli):
+        """Return P mod n^2 [List<mpz>] for every n of 'moduli', P being their product."""
+        with self._pool() as pool:
+            levels = self.product_tree(moduli, pool)
+            rems = levels[-1].load()
+            levels[-1].drop()
+            for level in reversed(levels[:-1]):
+                rems = self._map(_reduce, level.load(), rems, pool)
+                level.drop()
+        return rems
+
+    def gcds(self, moduli):
+        """Return gcd(n, P/n) [List<mpz>] for every n of 'moduli' (1 when no factor is shared).
+
+        A result equal to n means that all its factors are shared (e.g. a
+        repeated modulus); gcds() then falls back to pairwise gcds between the
+        moduli in that case.
+        """
+        moduli = [gmpy2.mpz(n) for n in moduli]
+        if len(moduli) < 2:
+            raise BatchGCDError("At least two moduli are needed")
+        rems = self.remainders(moduli)
+        res = [gmpy2.gcd(n, r//n) for n, r in zip(moduli, rems)]
+        shared = [i for i, g in enumerate(res) if g > 1]
+        for i in shared:
+            if res[i] != moduli[i]:
+                continue
+            # Both factors shared: look for a modulus sharing only one of them
+            for j in shared:
+                g = gmpy2.gcd(moduli[i], moduli[j])
+                if 1 < g < moduli[i]:
+                    res[i] = g
+                    break
+        return res
+
+    def factor(self, pubkeys):
+        """Factor the public keys sharing a prime with another key of the corpus.
+
+        Keyword arguments:
+        pubkeys [List<PubKey>] -- public keys
+        Output:
+        res [List<(PubKey, RSA)>] -- factored keys with the corresponding RSA
+            objects (keys whose cofactor is not prime are left out)
+        """
+        res = []
+        for pk, g in zip(pubkeys, self.gcds([pk.n for pk in pubkeys])):
+            if g == 1 or g == pk.n:
+                continue
+            p, q = sorted([int(g), int(pk.n//g)])
+            try:
+                res.append((pk, RSA(p, q, pk.e)))
+            except RSAError:
+                continue
+        return res
+
+# -------------------------------------------------------------------------- #
+
+def batch_gcd(pubkeys, workers=1, spill=None):
+    """Find the public keys sharing a prime factor (cf. BatchGCD.factor).
+
+    Keyword arguments:
+    pubkeys [List<PubKey>] -- public keys
+    workers [int] -- number of worker processes, 0 for one per CPU (default 1)
+    spill [string] -- directory storing the tree levels (default None, in memory)
+    Output:
+    res [List<(PubKey, RSA)>] -- factored keys with the corresponding RSA objects
+    """
+    return BatchGCD(workers, spill).factor(pubkeys)
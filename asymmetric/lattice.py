@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+
+"""Lattice reduction and Coppersmith's small roots method.
+
+Bases are lists of integer row vectors. lll() reduces them either with
+integral arithmetic only (exact Gram-Schmidt, kept as integers as in Cohen's
+algorithm 2.6.7) or with a floating-point Gram-Schmidt computed with gmpy2
+mpfr numbers from the exact Gram matrix (L2). The integers of the exact
+algorithm grow with the lattice determinant: it is the faster one on small
+determinants (e.g. knapsacks), the floating-point one on the huge entries of
+Coppersmith lattices.
+
+Univariate polynomials are coefficient lists, lowest degree first. Bivariate
+polynomials are {(i, j): coefficient} dicts of the monomials x^i*y^j.
+"""
+
+from fractions import Fraction
+from functools import reduce
+from math import gcd
+
+import gmpy2
+
+from util.error import LatticeError
+
+# Size reduction bound of the floating-point LLL
+_eta = 0.51
+# Size reduction rounds of a row before the floating-point LLL gives up
+_max_rounds = 1000
+# Primes used to find the integer roots of a polynomial
+_primes = [101, 103, 107, 109, 113, 127, 131, 137, 139, 149, 151, 157, 163, 167, 173]
+
+def _dot(x, y):
+    """Return the dot product [mpz] of the vectors x and y."""
+    res = gmpy2.mpz(0)
+    for a, b in zip(x, y):
+        if a and b:
+            res += a*b
+    return res
+
+def _axpy(x, c, y):
+    """Return the vector x - c*y."""
+    return [a - c*b for a, b in zip(x, y)]
+
+# -------------------------------------------------------------------------- #
+
+def lll(basis, delta=0.99, exact=False, prec=None):
+    """Return an LLL-reduced basis [List<List<mpz>>] of the lattice spanned by 'basis'.
+
+    Keyword arguments:
+    basis [List<List<int>>] -- linearly independent row vectors
+    delta [float] -- Lovasz condition parameter, in ]0.25, 1[ (default 0.99)
+    exact [bool] -- integral Gram-Schmidt instead of floating-point (default False)
+    prec [int] -- floating-point precision in bits (default 2*dimension + 64)
+    """
+    if not 0.25 < delta < 1:
+        raise LatticeError("delta must be in ]0.25, 1[")
+    rows = [[gmpy2.mpz(c) for c in row] for row in basis]
+    if not rows:
+        return rows
+    if any(len(row) != len(rows[0]) for row in rows):
+        raise LatticeError("Vectors' sizes not matching")
+    if exact:
+        return _lll_exact(rows, Fraction(delta).limit_denominator(1 << 16))
+    try:
+        return _lll_fp(rows, delta, prec or 2*len(rows) + 64)
+    except _PrecisionError:
+        # 'rows' is still a basis of the lattice, finish with exact arithmetic
+        return _lll_exact(rows, Fraction(delta).limit_denominator(1 << 16))
+
+
+class _PrecisionError(Exception):
+    """Floating-point size reduction not converging."""
+    pass
+
+
+def _lll_exact(b, delta):
+    """Integral LLL (Cohen, algorithm 2.6.7), reducing 'b' in place.
+
+    d[i] is the Gram determinant of the first i vectors and lam[k][j] the
+    integer d[j+1]*mu[k][j]. Only the (k, k-1) coefficient is size-reduced
+    before the Lovasz test, the rest of the row once the test passes.
+    """
+    n = len(b)
+    p, q = delta.numerator, delta.denominator
+    d = [gmpy2.mpz(1)] + [gmpy2.mpz(0)]*n
+    lam = [[gmpy2.mpz(0)]*n for i in range(n)]
+
+    def gram_schmidt(k):
+        for j in range(k + 1):
+            u = _dot(b[k], b[j])
+            for i in range(j):
+                u = (d[i+1]*u - lam[k][i]*lam[j][i]) // d[i]
+            if j < k:
+                lam[k][j] = u
+            elif not u:
+                raise LatticeError("Linearly dependent vectors")
+            else:
+                d[k+1] = u
+
+    def size_reduce(k, l):
+        if 2*abs(lam[k][l]) > d[l+1]:
+            r = (2*lam[k][l] + d[l+1]) // (2*d[l+1])
+            b[k] = _axpy(b[k], r, b[l])
+            lam[k][l] -= r*d[l+1]
+            for i in range(l):
+                lam[k][i] -= r*lam[l][i]
+
+    def swap(k, kmax):
+        b[k], b[k-1] = b[k-1], b[k]
+        for j in range(k - 1):
+            lam[k][j], lam[k-1][j] = lam[k-1][j], lam[k][j]
+        mu = lam[k][k-1]
+        big = (d[k-1]*d[k+1] + mu*mu) // d[k]
+        for i in range(k + 1, kmax + 1):
+            t = lam[i][k]
+            lam[i][k] = (d[k+1]*lam[i][k-1] - mu*t) // d[k]
+            lam[i][k-1] = (big*t + mu*lam[i][k]) // d[k+1]
+        d[k] = big
+
+    gram_schmidt(0)
+    k, kmax = 1, 0
+    while k < n:
+        if k > kmax:
+            kmax = k
+            gram_schmidt(k)
+        size_reduce(k, k - 1)
+        mu = lam[k][k-1]
+        if q*d[k+1]*d[k-1] < p*d[k]*d[k] - q*mu*mu:
+            swap(k, kmax)
+            k = max(1, k - 1)
+        else:
+            for l in range(k - 2, -1, -1):
+                size_reduce(k, l)
+            k += 1
+    return b
+
+
+def _lll_fp(b, delta, prec):
+    """Floating-point LLL, reducing 'b' in place.
+
+    The Gram matrix is exact, r and mu are mpfr numbers recomputed from it
+    (Nguyen-Stehle L2). A row is size-reduced by rounds until all its mu are
+    under _eta: the intermediate values of a round may be inaccurate, but
+    the rounds stop (early exit) as soon as a row needs no reduction, which
+    is the case of most rows once the basis is nearly reduced.
+    """
+    n = len(b)
+    gram = [[_dot(b[i], b[j]) for j in range(n)] for i in range(n)]
+    # valid[k]: number of Gram-Schmidt coefficients of row k still up to date
+    valid = [0]*n
+    with gmpy2.context(gmpy2.get_context(), precision=prec):
+        zero = gmpy2.mpfr(0)
+        r = [[zero]*n for i in range(n)]
+        mu = [[zero]*n for i in range(n)]
+
+        def gram_schmidt(k):
+            for j in range(valid[k], k + 1):
+                s = gmpy2.mpfr(gram[k][j])
+                for i in range(j):
+                    s -= mu[j][i]*r[k][i]
+                r[k][j] = s
+                if j < k:
+                    mu[k][j] = s/r[j][j]
+            valid[k] = k + 1
+
+        def size_reduce(k):
+            for _ in range(_max_rounds):
+                gram_schmidt(k)
+                if all(abs(mu[k][j]) <= _eta for j in range(k)):
+                    if not gram[k][k]:
+                        raise LatticeError("Linearly dependent vectors")
+                    return
+                for j in range(k - 1, -1, -1):
+                    x = gmpy2.mpz(gmpy2.rint(mu[k][j]))
+                    if not x:
+                        continue
+                    b[k] = _axpy(b[k], x, b[j])
+                    for i in range(j):
+                        mu[k][i] -= x*mu[j][i]
+                    mu[k][j] -= x
+                    gkk = gram[k][k] - 2*x*gram[k][j] + x*x*gram[j][j]
+                    for i in range(n):
+                        if i != k:
+                            gram[k][i] -= x*gram[j][i]
+                            gram[i][k] = gram[k][i]
+                    gram[k][k] = gkk
+                valid[k] = 0
+                for i in range(k + 1, n):
+                    valid[i] = min(valid[i], k)
+            raise _PrecisionError()
+
+        def swap(k):
+            b[k], b[k-1] = b[k-1], b[k]
+            gram[k], gram[k-1] = gram[k-1], gram[k]
+            for row in gram:
+                row[k], row[k-1] = row[k-1], row[k]
+            # The coefficients on the first k-1 vectors are unchanged
+            r[k], r[k-1] = r[k-1], r[k]
+            mu[k], mu[k-1] = mu[k-1], mu[k]
+            valid[k], valid[k-1] = min(valid[k-1], k - 1), min(valid[k], k - 1)
+            for i in range(k + 1, n):
+                valid[i] = min(valid[i], k - 1)
+
+        if not gram[0][0]:
+            raise LatticeError("Linearly dependent vectors")
+        gram_schmidt(0)
+        k = 1
+        while k < n:
+            size_reduce(k)
+            if delta*r[k-1][k-1] > r[k][k] + mu[k][k-1]*mu[k][k-1]*r[k-1][k-1]:
+                swap(k)
+                k = max(1, k - 1)
+                gram_schmidt(k - 1)
+            else:
+                k += 1
+    return b
+
+
+def is_reduced(basis, delta=0.99, eta=Fraction(1, 2)):
+    """Return True if 'basis' is size-reduced (|mu| <= eta) and satisfies the Lovasz condition (exact check)."""
+    n = len(basis)
+    star = []
+    mu = [[Fraction(0)]*n for i in range(n)]
+    norms = []
+    for i in range(n):
+        v = [Fraction(int(c)) for c in basis[i]]
+        for j in range(i):
+            mu[i][j] = sum(Fraction(int(c))*s for c, s in zip(basis[i], star[j]))/norms[j]
+            v = [a - mu[i][j]*s for a, s in zip(v, star[j])]
+        star.append(v)
+        norms.append(sum(c*c for c in v))
+    for i in range(1, n):
+        if any(abs(mu[i][j]) > eta for j in range(i)):
+            return False
+        if norms[i] < (Fraction(delta).limit_denominator(1 << 16) - mu[i][i-1]**2)*norms[i-1]:
+            return False
+    return True
+
+# -------------------------------------------------------------------------- #
+
+def poly_mul(x, y):
+    """Multiply the univariate polynomials x and y."""
+    if not x or not y:
+        return []
+    res = [0]*(len(x) + len(y) - 1)
+    for i, a in enumerate(x):
+        if a:
+            for j, b in enumerate(y):
+                res[i+j] += a*b
+    return res
+
+def poly_eval(poly, x):
+    """Evaluate the univariate polynomial 'poly' at x (Horner)."""
+    res = 0
+    for c in reversed(poly):
+        res = res*x + c
+    return res
+
+def _trim(poly):
+    """Remove the zero leading coefficients of 'poly'."""
+    poly = list(poly)
+    while poly and not poly[-1]:
+        poly.pop()
+    return poly
+
+def _derivative(poly):
+    """Return the derivative of the univariate polynomial 'poly'."""
+    return [i*c for i, c in enumerate(poly)][1:]
+
+def _primitive(poly):
+    """Return 'poly' divided by the gcd of its coefficients."""
+    content = reduce(gcd, poly, 0)
+    return [c//content for c in poly] if content > 1 else poly
+
+def _squarefree(poly):
+    """Return poly/gcd(poly, poly') with integer coefficients (same roots, all simple).
+
+    The gcd is computed with primitive pseudo-remainder sequences, keeping
+    the coefficients integral and small.
+    """
+    a, b = _primitive(poly), _primitive(_trim(_derivative(poly)))
+    while len(b) > 1:
+        rem = list(a)
+        while len(rem) >= len(b):
+            lead = rem[-1]
+            rem = [c*b[-1] for c in rem]
+            shift = len(rem) - len(b)
+            for i, c in enumerate(b):
+                rem[shift+i] -= lead*c
+            rem = _trim(rem)
+        a, b = b, _primitive(rem) if rem else rem
+    if b:
+        # Constant remainder: coprime polynomials
+        return poly
+    # Gauss's lemma: the primitive gcd divides poly over the integers
+    return _poly_exact_div(poly, a)
+
+def integer_roots(poly, bound=None):
+    """Return the integer roots [List<int>] of the univariate polynomial 'poly'.
+
+    Roots are found modulo a small prime, lifted with Hensel's lemma until
+    the modulus exceeds twice the bound, and checked over the integers.
+
+    Keyword arguments:
+    poly [List<int>] -- integer coefficients, lowest degree first
+    bound [int] -- only roots of absolute value up to 'bound' are searched (default Cauchy's bound)
+    """
+    poly = _trim([int(c) for c in poly])
+    roots = set()
+    if not poly:
+        raise LatticeError("Zero polynomial")
+    while len(poly) > 1 and not poly[0]:
+        roots.add(0)
+        poly = poly[1:]
+    if len(poly) <= 1:
+        return sorted(roots)
+    poly = _primitive(poly)
+    if bound is None:
+        bound = 2 + max(abs(c) for c in poly[:-1])//abs(poly[-1])
+    for attempt in range(2):
+        deriv = _derivative(poly)
+        for p in _primes:
+            if poly[-1] % p == 0:
+                continue
+            residues = [c % p for c in poly]
+            mods = [r for r in range(p) if poly_eval(residues, r) % p == 0]
+            if any(poly_eval(deriv, r) % p == 0 for r in mods):
+                # Multiple root modulo p, Hensel's lemma does not apply
+                continue
+            for r in mods:
+                modulus = p
+                while modulus <= 2*bound:
+                    modulus *= modulus
+                    r = (r - poly_eval(poly, r)*gmpy2.invert(poly_eval(deriv, r), modulus)) % modulus
+                r = int(r)
+                if r > modulus//2:
+                    r -= modulus
+                if abs(r) <= bound and poly_eval(poly, r) == 0:
+                    roots.add(r)
+            return sorted(roots)
+        # Repeated roots: remove the multiplicities
+        poly = _squarefree(poly)
+    raise LatticeError("Unable to find the roots of the polynomial")
+
+# -------------------------------------------------------------------------- #
+
+def univariate_lattice(f, N, m, t, X):
+    """Howgrave-Graham lattice basis for the small roots of the monic polynomial f mod N.
+
+    The rows are the coefficients of g(x*X) for the polynomials
+    g = x^j * N^(m-i) * f^i (0 <= i < m, 0 <= j < deg f) and x^i * f^m (0 <= i < t).
+
+    Keyword arguments:
+    f [List<int>] -- monic polynomial, lowest degree first
+    N [int] -- modulus
+    m [int] -- multiplicity of the roots
+    t [int] -- number of x-shifts of f^m
+    X [int] -- bound on the roots
+    """
+    deg = len(f) - 1
+    dim = m*deg + t
+    powers = [[1]]
+    for i in range(m):
+        powers.append(poly_mul(powers[-1], f))
+    polys = []
+    for i in range(m):
+        for j in range(deg):
+            polys.append([0]*j + [c*N**(m - i) for c in powers[i]])
+    for i in range(t):
+        polys.append([0]*i + powers[m])
+    scale = [gmpy2.mpz(X)**k for k in range(dim)]
+    return [[c*scale[k] for k, c in enumerate(g)] + [0]*(dim - len(g)) for g in polys]
+
+def small_roots(f, N, X=None, beta=1.0, epsilon=None, m=None, t=None, exact=False):
+    """Coppersmith's method: small roots of a univariate polynomial modulo a divisor of N.
+
+    Returns the integers |x0| <= X such that f(x0) = 0 mod b, for a divisor
+    b >= N^beta of N (b = N when beta is 1).
+
+    Keyword arguments:
+    f [List<int>] -- polynomial, lowest degree first (made monic modulo N)
+    N [int] -- modulus
+    X [int] -- bound on the roots (default N^(beta^2/deg - epsilon)/2)
+    beta [float] -- b >= N^beta (default 1.0)
+    epsilon [float] -- trade-off between the bound and the lattice size (default beta/7)
+    m [int] -- multiplicity (default ceil(beta^2/(deg*epsilon)))
+    t [int] -- x-shifts of f^m (default floor(deg*m*(1/beta - 1)))
+    exact [bool] -- exact LLL (default False)
+    Output:
+    roots [List<int>] -- small roots found
+    """
+    f = _trim([c % N for c in f])
+    deg = len(f) - 1
+    if deg < 1:
+        raise LatticeError("Polynomial of degree at least 1 needed")
+    if gmpy2.gcd(f[-1], N) != 1:
+        raise LatticeError("Leading coefficient not invertible modulo N")
+    inv = gmpy2.invert(f[-1], N)
+    f = [int(c*inv % N) for c in f]
+    if epsilon is None:
+        epsilon = beta/7
+    if m is None:
+        m = max(1, int(gmpy2.ceil(beta*beta/(deg*epsilon))))
+    if t is None:
+        t = int(deg*m*(1/beta - 1))
+    if X is None:
+        X = int(gmpy2.exp2((beta*beta/deg - epsilon)*gmpy2.log2(N))) // 2
+    X = max(1, X)
+    basis = lll(univariate_lattice(f, N, m, t, X), exact=exact)
+    roots = set()
+    tried, failures = 0, []
+    for row in basis:
+        poly = [c // gmpy2.mpz(X)**k for k, c in enumerate(row)]
+        if not _trim(poly):
+            continue
+        tried += 1
+        try:
+            candidates = integer_roots(poly, X)
+        except LatticeError as err:
+            # Unusable vector, the next short ones often give the roots
+            failures.append(err)
+            continue
+        for r in candidates:
+            value = poly_eval(f, r)
+            if beta >= 1 and value % N == 0 or beta < 1 and gmpy2.gcd(value, N) > 1:
+                roots.add(r)
+        if roots:
+            return sorted(roots)
+    if failures and len(failures) == tried:
+        # No vector could be used at all
+        raise failures[0]
+    return sorted(roots)
+
+# -------------------------------------------------------------------------- #
+
+def bpoly_mul(x, y):
+    """Multiply the bivariate polynomials x and y."""
+    res = {}
+    for (i, j), a in x.items():
+        for (k, l), b in y.items():
+            res[i+k, j+l] = res.get((i+k, j+l), 0) + a*b
+    return {mono: c for mono, c in res.items() if c}
+
+def bpoly_eval(poly, x, y):
+    """Evaluate the bivariate polynomial 'poly' at (x, y)."""
+    return sum(c*x**i*y**j for (i, j), c in poly.items())
+
+def _leading(poly):
+    """Return the leading monomial (i, j) of 'poly' (highest total degree, then highest i)."""
+    return max(poly, key=lambda mono: (mono[0] + mono[1], mono[0]))
+
+def bivariate_lattice(f, N, m, X, Y):
+    """Lattice basis for the small roots of the bivariate polynomial f mod N (Jochemsz-May basic strategy).
+
+    With l the leading monomial of f (made monic), the shifts
+    s * f^k * N^(m-k) are taken for every monomial s*l^k of f^(m-k)*l^k not
+    already obtained with k+1, so that the basis is triangular.
+
+    Keyword arguments:
+    f [dict] -- polynomial {(i, j): coefficient}, monic in its leading monomial
+    N [int] -- modulus
+    m [int] -- multiplicity of the roots
+    X, Y [int] -- bounds on the roots
+    Output:
+    (basis, monomials) [(List<List<mpz>>, List<(int, int)>)] -- rows and column monomials
+    """
+    lead = _leading(f)
+    powers = [{(0, 0): 1}]
+    for k in range(m):
+        powers.append(bpoly_mul(powers[-1], f))
+    def shifted(k):
+        return {(i + k*lead[0], j + k*lead[1]) for i, j in powers[m-k]}
+    polys = []
+    for k in range(m + 1):
+        above = shifted(k + 1) if k < m else set()
+        for mono in sorted(shifted(k) - above):
+            shift = {(mono[0] - k*lead[0], mono[1] - k*lead[1]): N**(m - k)}
+            polys.append(bpoly_mul(shift, powers[k]))
+    monomials = sorted({mono for g in polys for mono in g}, key=lambda mono: (mono[0] + mono[1], mono))
+    basis = [[gmpy2.mpz(g.get(mono, 0))*gmpy2.mpz(X)**mono[0]*gmpy2.mpz(Y)**mono[1] for mono in monomials]
+             for g in polys]
+    return basis, monomials
+
+def _to_y(poly):
+    """Return 'poly' as a list (by power of y) of univariate polynomials in x."""
+    deg = max(j for i, j in poly)
+    res = [[] for j in range(deg + 1)]
+    for (i, j), c in poly.items():
+        if len(res[j]) <= i:
+            res[j] += [0]*(i + 1 - len(res[j]))
+        res[j][i] += c
+    return res
+
+def _poly_sub(x, y):
+    """Return the univariate polynomial x - y."""
+    size = max(len(x), len(y))
+    return _trim([(x[i] if i < len(x) else 0) - (y[i] if i < len(y) else 0) for i in range(size)])
+
+def _poly_exact_div(x, y):
+    """Return x/y for univariate polynomials with integer coefficients, y dividing x."""
+    x, y = _trim(x), _trim(y)
+    if not x:
+        return []
+    quo = [0]*(len(x) - len(y) + 1)
+    rem = list(x)
+    for shift in range(len(quo) - 1, -1, -1):
+        c = rem[shift + len(y) - 1]
+        if c:
+            quo[shift] = c // y[-1]
+            for i, a in enumerate(y):
+                rem[shift+i] -= quo[shift]*a
+    return _trim(quo)
+
+def resultant_y(f, g):
+    """Return the resultant [List<int>] of the bivariate polynomials f and g with respect to y.
+
+    The determinant of the Sylvester matrix, whose entries are polynomials
+    in x, is computed with Bareiss' fraction-free elimination.
+    """
+    fy, gy = _to_y(f), _to_y(g)
+    df, dg = len(fy) - 1, len(gy) - 1
+    size = df + dg
+    if not size:
+        return [1]
+    mat = []
+    for i in range(dg):
+        mat.append([[] for j in range(i)] + list(reversed(fy)) + [[] for j in range(size - i - df - 1)])
+    for i in range(df):
+        mat.append([[] for j in range(i)] + list(reversed(gy)) + [[] for j in range(size - i - dg - 1)])
+    sign, prev = 1, [1]
+    for k in range(size - 1):
+        if not _trim(mat[k][k]):
+            pivot = next((i for i in range(k + 1, size) if _trim(mat[i][k])), None)
+            if pivot is None:
+                return []
+            mat[k], mat[pivot] = mat[pivot], mat[k]
+            sign = -sign
+        for i in range(k + 1, size):
+            for j in range(k + 1, size):
+                num = _poly_sub(poly_mul(mat[i][j], mat[k][k]), poly_mul(mat[i][k], mat[k][j]))
+                mat[i][j] = _poly_exact_div(num, prev)
+        prev = mat[k][k]
+    return [sign*c for c in _trim(mat[-1][-1])]
+
+def bivariate_small_roots(f, N, X, Y, m=3, exact=False):
+    """Small roots (x0, y0), |x0| <= X and |y0| <= Y, of the bivariate polynomial f modulo N.
+
+    The resultant of two short polynomials of the reduced lattice gives the
+    candidates for x0, then y0 is a root of one of them in x0. As usual with
+    the bivariate heuristic, the roots are found only if the two polynomials
+    are algebraically independent.
+
+    Keyword arguments:
+    f [dict] -- polynomial {(i, j): coefficient}
+    N [int] -- modulus
+    X, Y [int] -- bounds on the roots
+    m [int] -- multiplicity (default 3)
+    exact [bool] -- exact LLL (default False)
+    Output:
+    roots [List<(int, int)>] -- small roots found
+    """
+    f = {mono: c % N for mono, c in f.items() if c % N}
+    if not f:
+        raise LatticeError("Zero polynomial")
+    lead = _leading(f)
+    if gmpy2.gcd(f[lead], N) != 1:
+        raise LatticeError("Leading coefficient not invertible modulo N")
+    inv = gmpy2.invert(f[lead], N)
+    f = {mono: int(c*inv % N) for mono, c in f.items()}
+    basis, monomials = bivariate_lattice(f, N, m, X, Y)
+    polys = []
+    for row in lll(basis, exact=exact):
+        poly = {mono: int(c // (gmpy2.mpz(X)**mono[0]*gmpy2.mpz(Y)**mono[1]))
+                for mono, c in zip(monomials, row) if c}
+        if poly and any(j for i, j in poly):
+            polys.append(poly)
+    roots = set()
+    for a in range(len(polys)):
+        for b in range(a + 1, len(polys)):
+            res = resultant_y(polys[a], polys[b])
+            if len(res) <= 1:
+                continue
+            for x0 in integer_roots(res, X):
+                ypoly = [0]*(max(j for i, j in polys[a]) + 1)
+                for (i, j), c in polys[a].items():
+                    ypoly[j] += c*x0**i
+                if not _trim(ypoly):
+                    continue
+                for y0 in integer_roots(ypoly, Y):
+                    if bpoly_eval(f, x0, y0) % N == 0:
+                        roots.add((x0, y0))
+            if roots:
+                return sorted(roots)
+    return sorted(roots)
@@ -1,9 +1,49 @@
 #!/usr/bin/env python3
 
+from itertools import islice
+
 import gmpy2
 
-from util.error import RSAError, WienerError, HastadError, CommonModError
-from util.convert import hex_to_str, str_to_hex
+from asymmetric.lattice import small_roots
+from util.error import RSAError, WienerError, HastadError, CommonModError, CoppersmithError
+from util.convert import hex_to_str
+from util.parallel import nb_workers, stream_jobs
+
+# Messages per job sent to the worker processes by encrypt_many/decrypt_many
+_chunk = 256
+# Key loaded once by each worker process
+_worker_key = None
+
+def _to_int(data):
+    """Convert 'data' [bytes] into an integer [mpz] (big endian)."""
+    return gmpy2.mpz(int.from_bytes(data, "big"))
+
+def _to_bytes(value):
+    """Convert 'value' [int] into bytes [bytes] (big endian, at least one byte)."""
+    value = int(value)
+    return value.to_bytes(max(1, (value.bit_length() + 7)//8), "big")
+
+def _chunks(iterable, size):
+    """Yield the consecutive 'size'-element lists [(List,)] of 'iterable', as jobs."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield (chunk,)
+
+def _load_key(key):
+    """Worker initializer: keep 'key' [PubKey|PrivKey] for the next jobs."""
+    global _worker_key
+    _worker_key = key
+
+def _encrypt_chunk(plains):
+    """Encrypt 'plains' [List<bytes>] with the worker key."""
+    return [int(_worker_key._encrypt_int(_to_int(p))) for p in plains]
+
+def _decrypt_chunk(ciphers):
+    """Decrypt 'ciphers' [List<int>] with the worker key."""
+    return [_to_bytes(_worker_key._decrypt_int(gmpy2.mpz(c))) for c in ciphers]
 
 class RSA:
     """RSA encryption (cf. https://en.wikipedia.org/wiki/RSA_(cryptosystem)).
@@ -12,35 +52,50 @@ class RSA:
     p [int] -- first prime used to generate RSA keys
     q [int] -- second prime used to generate RSA keys
     e [int] -- public exponent (default 65537)
+    others [List<int>] -- additional primes of a multi-prime modulus (default None)
     """
-    def __init__(self, p, q, e=65537):
+    def __init__(self, p, q, e=65537, others=None):
         self.p = gmpy2.mpz(p)
         if not gmpy2.is_prime(self.p):
             raise RSAError("'p' is not prime")
         self.q = gmpy2.mpz(q)
         if not gmpy2.is_prime(self.q):
             raise RSAError("'q' is not prime")
+        self.others = [gmpy2.mpz(r) for r in others or []]
+        if not all(gmpy2.is_prime(r) for r in self.others):
+            raise RSAError("Additional factors must be prime")
         self.e = e
         self.privkey = None
         self.pubkey = None
 
     def __repr__(self):
+        if self.others:
+            return "RSA({:d}, {:d}, {:d}, {})".format(self.p, self.q, self.e, [int(r) for r in self.others])
         return "RSA({:d}, {:d}, {:d})".format(self.p, self.q, self.e)
 
     def __str__(self):
-        return "RSA\n  p: {:d}\n  q: {:d}\n  e: {:d}".format(self.p, self.q, self.e)
+        others = "".join("\n  r: {:d}".format(r) for r in self.others)
+        return "RSA\n  p: {:d}\n  q: {:d}{}\n  e: {:d}".format(self.p, self.q, others, self.e)
 
+    @property
+    def primes(self):
+        """Prime factors [List<mpz>] of the modulus (repetitions allowed)."""
+        return [self.p, self.q] + self.others
 
     def gen_keys(self):
         """Generate private and public keys."""
         if not (self.pubkey and self.privkey):
-            phi = gmpy2.lcm(self.p-1, self.q-1)
+            phi = 1
+            for r, k in _prime_powers(self.primes):
+                phi = gmpy2.lcm(phi, _totient(r, k))
             if gmpy2.gcd(phi, self.e) != 1:
                 raise RSAError("Unable to generate keys: phi and e are not coprimes")
             d = int(gmpy2.invert(self.e, phi))
-        n = self.p * self.q
-        self.pubkey = PubKey(n, self.e)
-        self.privkey = PrivKey(n, d)
+            n = 1
+            for r in self.primes:
+                n *= r
+            self.pubkey = PubKey(int(n), self.e)
+            self.privkey = PrivKey(int(n), d, self.primes)
         return self.pubkey, self.privkey
 
 # -------------------------------------------------------------------------- #
@@ -55,42 +110,139 @@ class PubKey():
     def __init__(self, n, e):
         self.n = n
         self.e = e
+        self._key = None
 
     def __repr__(self):
         return "PubKey({:d}, {:d})".format(self.n, self.e)
 
     def encrypt(self, plainstr):
         """Encrypt 'plainstr' [bytes] and return the corresponding ciphertext [int]."""
-        plain = str_to_hex(plainstr)
-        cipher = pow(plain, self.e, self.n)
-        return cipher
+        return int(self._encrypt_int(_to_int(plainstr)))
+
+    def encrypt_many(self, plains, workers=1, chunk=_chunk):
+        """Encrypt each message of 'plains' and yield the ciphertexts [int] in order.
+
+        Keyword arguments:
+        plains [Iterable<bytes>] -- messages, consumed lazily
+        workers [int] -- number of worker processes, 0 for one per CPU (default 1)
+        chunk [int] -- messages per worker job (default 256)
+        """
+        if nb_workers(workers) <= 1:
+            for plain in plains:
+                yield int(self._encrypt_int(_to_int(plain)))
+            return
+        for res in stream_jobs(_encrypt_chunk, _chunks(plains, chunk), workers, _load_key, (self,)):
+            yield from res
+
+    def _encrypt_int(self, plain):
+        """Return plain^e mod n [mpz]."""
+        if self._key is None:
+            self._key = (gmpy2.mpz(self.e), gmpy2.mpz(self.n))
+        return gmpy2.powmod(plain, *self._key)
 
 # -------------------------------------------------------------------------- #
 
 class PrivKey():
     """RSA private key
 
+    When the factors of n are known, decryption uses the Chinese remainder
+    theorem: one exponentiation with a reduced exponent modulo each factor,
+    recombined with Garner's formula (PKCS #1 dp, dq, qinv and, for
+    multi-prime keys, one (r, d, t) triplet per additional factor). Repeated
+    factors are handled as prime powers.
+
     Keyword arguments:
     n [int] -- modulus
     d [int] -- private exponent
+    primes [List<int>] -- prime factors of n (default None)
     """
-    def __init__(self, n, d):
+    def __init__(self, n, d, primes=None):
         self.n = n
         self.d = d
+        self.p = self.q = self.dp = self.dq = self.qinv = None
+        self.crt = []
+        if primes:
+            self._crt_params(primes)
 
     def __repr__(self):
         return "PrivKey({:d}, {:d})".format(self.n, self.d)
 
+    def _crt_params(self, primes):
+        """Compute the CRT parameters from the prime factors of n."""
+        powers = [r**k for r, k in _prime_powers(primes)]
+        prod = 1
+        for r in powers:
+            prod *= r
+        if prod != self.n:
+            raise RSAError("Factors' product is not equal to n")
+        if len(powers) < 2:
+            return
+        exps = [gmpy2.mpz(self.d) % gmpy2.mpz(_totient(r, k)) for r, k in _prime_powers(primes)]
+        self.p, self.q = powers[0], powers[1]
+        self.dp, self.dq = exps[0], exps[1]
+        self.qinv = gmpy2.invert(self.q, self.p)
+        prod = self.p*self.q
+        for r, d in zip(powers[2:], exps[2:]):
+            self.crt.append((r, d, gmpy2.invert(prod, r)))
+            prod *= r
+
     def decrypt(self, cipher):
         """Decrypt 'cipher' [int] and return the corresponding plaintext [bytes]."""
-        plain = pow(cipher, self.d, self.n)
-        return hex_to_str(plain)
+        return _to_bytes(self._decrypt_int(gmpy2.mpz(cipher)))
+
+    def decrypt_many(self, ciphers, workers=1, chunk=_chunk):
+        """Decrypt each ciphertext of 'ciphers' and yield the plaintexts [bytes] in order.
+
+        Keyword arguments:
+        ciphers [Iterable<int>] -- ciphertexts, consumed lazily
+        workers [int] -- number of worker processes, 0 for one per CPU (default 1)
+        chunk [int] -- ciphertexts per worker job (default 256)
+        """
+        if nb_workers(workers) <= 1:
+            for cipher in ciphers:
+                yield _to_bytes(self._decrypt_int(gmpy2.mpz(cipher)))
+            return
+        for res in stream_jobs(_decrypt_chunk, _chunks(ciphers, chunk), workers, _load_key, (self,)):
+            yield from res
+
+    def _decrypt_int(self, cipher):
+        """Return cipher^d mod n [mpz] (CRT when the factors are known)."""
+        if self.p is None:
+            return gmpy2.powmod(cipher, self.d, self.n)
+        return self._crt_decrypt(cipher)
+
+    def _crt_decrypt(self, cipher):
+        """Return cipher^d mod n [mpz] with Garner's CRT recombination."""
+        m1 = gmpy2.powmod(cipher, self.dp, self.p)
+        m2 = gmpy2.powmod(cipher, self.dq, self.q)
+        plain = m2 + self.q*((self.qinv*(m1 - m2)) % self.p)
+        prod = self.p*self.q
+        for r, d, t in self.crt:
+            mi = gmpy2.powmod(cipher, d, r)
+            plain += prod*(((mi - plain)*t) % r)
+            prod *= r
+        return plain
+
+def _prime_powers(primes):
+    """Group 'primes' into [(prime, exponent)] pairs, in order of first appearance."""
+    powers = {}
+    for r in primes:
+        r = gmpy2.mpz(r)
+        powers[r] = powers.get(r, 0) + 1
+    return list(powers.items())
+
+def _totient(r, k):
+    """Return Euler's totient [mpz] of r^k (r prime)."""
+    return r**(k-1) * (r-1)
 
 # -------------------------------------------------------------------------- #
 
 def wiener(pk):
     """Wiener's attack (d small)
 
+    The convergents k/d of e/n are generated one at a time and tested as
+    they come, the attack stopping at the first one giving the factors of n.
+
     Keyword arguments:
     pk [PubKey] -- public key
     Output:
@@ -98,46 +250,74 @@ def wiener(pk):
     q [int] -- second prime factor of n
     d [int] -- private exponent
     """
-    cf = _continued_frac(pk.e, pk.n)
-    for c in _cvgs(cf):
-        k, d = c.numerator, c.denominator
-        if k == 0 or (pk.e*d - 1)%k != 0:
-            continue
-        phi = (pk.e*d - 1) // k
-        b = pk.n - phi + 1
-        delta = b*b - 4*pk.n
-        if delta >= 0:
-            root = gmpy2.isqrt(delta)
-            if root*root == delta and not (b+root) & 1:
-                p, q = (b+root)//2, (b-root)//2
-                return p, q, d
+    for k, d in _cvgs(_continued_frac(pk.e, pk.n)):
+        pq = _wiener_check(pk, k, d)
+        if pq:
+            return pq[0], pq[1], d
     raise WienerError("Unable to crack RSA with Wiener's attack")
 
+def extended_wiener(pk, bound=16):
+    """Extended Wiener's attack (d slightly larger than Wiener's bound)
+
+    Following Verheul-van Tilborg and Bloemer-May, the candidates are the
+    combinations (r*h[m+1] + s*h[m]) / (r*k[m+1] + s*k[m]) of consecutive
+    convergents h/k of e/n, with 1 <= r <= 'bound' and 0 <= s <= 'bound'.
+    The cost grows as bound^2 per convergent; bound=1 already contains
+    Wiener's attack.
+
+    Keyword arguments:
+    pk [PubKey] -- public key
+    bound [int] -- largest multiplier r, s tried near each convergent (default 16)
+    Output:
+    p [int] -- first prime factor of n
+    q [int] -- second prime factor of n
+    d [int] -- private exponent
+    """
+    if bound < 1:
+        raise WienerError("Bound must be positive")
+    prev = (0, 1)
+    for cur in _cvgs(_continued_frac(pk.e, pk.n)):
+        for r in range(1, bound + 1):
+            for s in range(bound + 1):
+                k = r*cur[0] + s*prev[0]
+                d = r*cur[1] + s*prev[1]
+                pq = _wiener_check(pk, k, d)
+                if pq:
+                    return pq[0], pq[1], d
+        prev = cur
+    raise WienerError("Unable to crack RSA with the extended Wiener's attack")
+
+def _wiener_check(pk, k, d):
+    """Return the factors (p, q) of n if e*d = 1 + k*phi(n), None otherwise."""
+    if k == 0 or (pk.e*d - 1)%k != 0:
+        return None
+    phi = (pk.e*d - 1) // k
+    b = pk.n - phi + 1
+    delta = b*b - 4*pk.n
+    if delta >= 0:
+        root = gmpy2.isqrt(delta)
+        if root*root == delta and not (b+root) & 1:
+            return (b+root)//2, (b-root)//2
+    return None
+
 def _continued_frac(num, den):
-    """Compute continued fraction of num/den."""
-    res = []
+    """Yield the continued fraction coefficients of num/den one at a time."""
     while den:
         q = num // den
-        res.append(q)
+        yield q
         num, den = den, num - den*q
-    return res
-
-def _convergent(coeffs):
-    """Compute the convergent of 'coeffs'."""
-    f = gmpy2.mpq(0, 1)
-    for x in reversed(coeffs):
-        try:
-            f = 1 / (f + x)
-        except ZeroDivisionError:
-            return f
-    return 1/f
 
 def _cvgs(coeffs):
-    """Compute all intermediate convergents of 'coeffs'."""
-    i = 0
-    while i < len(coeffs):
-        yield _convergent(coeffs[:i+1])
-        i += 1
+    """Yield the successive convergents (h, k) [(int, int)] of the coefficients 'coeffs'.
+
+    Uses the recurrences h[i] = a[i]*h[i-1] + h[i-2] and k[i] = a[i]*k[i-1] + k[i-2].
+    """
+    h, h_prev = 1, 0
+    k, k_prev = 0, 1
+    for a in coeffs:
+        h, h_prev = a*h + h_prev, h
+        k, k_prev = a*k + k_prev, k
+        yield h, k
 
 # -------------------------------------------------------------------------- #
 
@@ -192,3 +372,70 @@ def common_modulus(pk1, pk2, c1, c2):
     m1 = pow(c1, u, pk1.n)
     m2 = pow(inv_c2, -v, pk2.n)
     return hex_to_str(m1*m2 % pk1.n)
+
+# -------------------------------------------------------------------------- #
+
+def factor_high_bits(pk, p_high, unknown, exact=False):
+    """Coppersmith's attack (high bits of a prime factor known)
+
+    The low bits x of p are a small root of p_high + x modulo p, a divisor
+    of n of size about sqrt(n): lattices of growing dimension are tried
+    until x is found, up to about log2(n)/4 unknown bits.
+
+    Keyword arguments:
+    pk [PubKey] -- public key
+    p_high [int] -- prime factor of n with its 'unknown' low bits set to 0
+    unknown [int] -- number of unknown low bits
+    exact [bool] -- exact lattice reduction (default False)
+    Output:
+    p [int] -- first prime factor of n
+    q [int] -- second prime factor of n
+    """
+    n = int(pk.n)
+    beta = (int(p_high).bit_length() - 1)/n.bit_length()
+    # Roots centred on 0 to halve the bound
+    center = (int(p_high) >> unknown << unknown) + (1 << unknown >> 1)
+    for m in _multiplicities(beta*beta, unknown, n):
+        t = int(m*(1/beta - 1))
+        for x in small_roots([center, 1], n, 1 << unknown >> 1, beta, m=m, t=t, exact=exact):
+            p = center + x
+            if 1 < p < n and n % p == 0:
+                return min(p, n//p), max(p, n//p)
+    raise CoppersmithError("Unable to factor n with {:d} unknown bits".format(unknown))
+
+def stereotyped(pk, c, known, unknown, offset=0, exact=False):
+    """Coppersmith's stereotyped message attack (most of 'm' known, 'e' small)
+
+    Keyword arguments:
+    pk [PubKey] -- public key
+    c [int] -- ciphertext
+    known [bytes] -- plaintext with its unknown bytes set to 0
+    unknown [int] -- number of unknown bytes, up to about len(n)/e
+    offset [int] -- number of known bytes after the unknown ones (default 0)
+    exact [bool] -- exact lattice reduction (default False)
+    Output:
+    m [bytes] -- plaintext
+    """
+    n, e = int(pk.n), int(pk.e)
+    shift, bits = 8*offset, 8*unknown
+    base = int.from_bytes(known, "big") + (1 << bits >> 1 << shift)
+    # f(x) = (base + x*2^shift)^e - c
+    f = [0]*(e + 1)
+    for i in range(e + 1):
+        f[i] = int(gmpy2.bincoef(e, i)*pow(base, e - i, n)*pow(1 << shift, i, n) % n)
+    f[0] = (f[0] - c) % n
+    for m in _multiplicities(1/e, bits, n):
+        for x in small_roots(f, n, 1 << bits >> 1, m=m, t=0, exact=exact):
+            plain = base + (x << shift)
+            if pow(plain, e, n) == c % n:
+                return hex_to_str(plain)
+    raise CoppersmithError("Unable to find the {:d} unknown bytes".format(unknown))
+
+def _multiplicities(exponent, unknown, n):
+    """Yield the multiplicities to try for roots of 'unknown' bits below n^exponent."""
+    gap = exponent - unknown/n.bit_length()
+    if gap <= 0:
+        raise CoppersmithError("Too many unknown bits for Coppersmith's method")
+    # Lattices reaching the bound n^(exponent - gap/2)
+    for m in range(1, max(2, int(gmpy2.ceil(exponent/(gap/2)))) + 1):
+        yield m
@@ -0,0 +1 @@
+__all__ = ["aes_engines", "aes_latency", "aes_parallel", "aes_suite", "batchgcd", "ghash", "lattice", "rsa_crt"]
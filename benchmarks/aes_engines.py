@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+"""Throughput comparison of the AES block engines.
+
+Usage (from the repository root):
+    python3 -m benchmarks.aes_engines [--size BYTES] [--repeat N]
+
+Speedups are given relative to the MATRIX engine. The NUMPY engine is only
+measured when numpy is installed.
+"""
+
+import os
+import time
+from argparse import ArgumentParser
+
+from symmetric import aesbatch
+from symmetric.aes import AES, Engine
+from util.blockcipher import Mode, Padding
+
+def measure(engine, mode, data, repeat):
+    """Return the best encryption and decryption throughputs [float] (bytes/s) of 'engine'."""
+    key = b"Yellow submarine"
+    iv = b"\x00"*(8 if mode == Mode.CTR else 16)
+    aes = AES(key, mode, Padding.NONE, iv, engine)
+    best_enc, best_dec = 0, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cipher = aes.encrypt(data)
+        middle = time.perf_counter()
+        aes.decrypt(cipher)
+        end = time.perf_counter()
+        best_enc = max(best_enc, len(data)/(middle - start))
+        best_dec = max(best_dec, len(data)/(end - middle))
+    return best_enc, best_dec
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="AES engines throughput comparison")
+    parser.add_argument("--size", type=int, default=16*1024, help="message size in bytes (default 16384)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs per engine (default 3)")
+    args = parser.parse_args()
+
+    data = os.urandom(args.size - args.size % 16)
+    print("{:<8} {:<4} {:>14} {:>14}".format("engine", "mode", "encrypt KB/s", "decrypt KB/s"))
+    engines = [e for e in Engine if e != Engine.NUMPY or aesbatch.available()]
+    for mode in Mode:
+        base = None
+        for engine in engines:
+            enc, dec = measure(engine, mode, data, args.repeat)
+            base = base or (enc, dec)
+            print("{:<8} {:<4} {:>14.1f} {:>14.1f}   ({:.1f}x / {:.1f}x)".format(
+                engine.name, mode.name, enc/1024, dec/1024, enc/base[0], dec/base[1]))
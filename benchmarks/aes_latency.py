@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+"""Per-call latency of the TTABLE and NUMPY block engines on small inputs.
+
+A NumPy call has a fixed cost whatever the number of blocks, the T-tables
+a cost per block: the sizes where both are even give AES.batch_threshold.
+The engines are called directly (aesbatch / ttable_*), without the dispatch
+of the AES class.
+
+Usage (from the repository root):
+    python3 -m benchmarks.aes_latency [--blocks 1,2,4,8,16,24,32,64] [--number N]
+"""
+
+import os
+import timeit
+from argparse import ArgumentParser
+
+from symmetric import aesbatch
+from symmetric.aesutil import get_schedule, ttable_encrypt, ttable_decrypt
+
+def latency(fcn, number):
+    """Return the best duration [float] (us) of a call to 'fcn'."""
+    return min(timeit.repeat(fcn, number=number, repeat=3))/number*1e6
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="AES engines latency on small inputs")
+    parser.add_argument("--blocks", default="1,2,4,8,16,24,32,64",
+                        help="comma-separated numbers of blocks (default 1,2,4,8,16,24,32,64)")
+    parser.add_argument("--number", type=int, default=200, help="calls per measure (default 200)")
+    args = parser.parse_args()
+    if not aesbatch.available():
+        raise SystemExit("numpy not installed")
+
+    sched = get_schedule(b"Yellow submarine")
+    print("{:>6} {:>14} {:>14} {:>14} {:>14}".format(
+        "blocks", "TTABLE enc us", "NUMPY enc us", "TTABLE dec us", "NUMPY dec us"))
+    for blocks in [int(b) for b in args.blocks.split(",")]:
+        data = os.urandom(16*blocks)
+        offsets = range(0, len(data), 16)
+        enc = latency(lambda: b"".join([ttable_encrypt(data[i:i+16], sched.ekeys, sched.rounds)
+                                        for i in offsets]), args.number)
+        dec = latency(lambda: b"".join([ttable_decrypt(data[i:i+16], sched.dkeys, sched.rounds)
+                                        for i in offsets]), args.number)
+        print("{:>6d} {:>14.0f} {:>14.0f} {:>14.0f} {:>14.0f}".format(
+            blocks, enc, latency(lambda: aesbatch.encrypt_blocks(data, sched), args.number),
+            dec, latency(lambda: aesbatch.decrypt_blocks(data, sched), args.number)))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""Serial versus process pool throughput of the parallel AES code paths.
+
+Usage (from the repository root):
+    python3 -m benchmarks.aes_parallel [--size BYTES] [--workers N]
+
+The CBC decryption sweep reports the crossover size from which the process
+pool beats the serial path (cf. AES.parallel_threshold). The break-even
+estimate does not need several CPUs: with 'w' processes, the pool wins once
+the serial duration times (1 - 1/w) exceeds its fixed cost (process start-up,
+pickling), measured on a handful of blocks.
+"""
+
+import os
+import time
+from argparse import ArgumentParser
+
+from symmetric import aesbatch
+from symmetric.aes import AES, Engine
+from util.blockcipher import Mode, Padding
+from util.parallel import nb_workers
+
+def timed(fcn, *args):
+    """Return the duration [float] (s) of fcn(*args)."""
+    start = time.perf_counter()
+    fcn(*args)
+    return time.perf_counter() - start
+
+def bench_ctr(data, workers):
+    """Return the CTR throughputs [float] (bytes/s) with 1 and 'workers' processes."""
+    aes = AES(b"Yellow submarine", Mode.CTR, iv=b"\x00"*8)
+    aes.parallel_threshold = 0
+    serial = timed(aes.ctr_crypt, data, 0, 1)
+    parallel = timed(aes.ctr_crypt, data, 0, workers)
+    return len(data)/serial, len(data)/parallel
+
+def crossover(mode, workers, sizes):
+    """Return the smallest size [int] of 'sizes' where decrypting with 'workers' processes wins."""
+    aes = AES(b"Yellow submarine", mode, Padding.NONE, b"\x00"*16, workers=workers)
+    aes.parallel_threshold = 0
+    found = None
+    for size in sizes:
+        cipher = aes.encrypt(os.urandom(size))
+        aes.workers = 1
+        serial = timed(aes.decrypt, cipher)
+        aes.workers = workers
+        parallel = timed(aes.decrypt, cipher)
+        print("{} decrypt {:>9} B: serial {:>8.1f} ms, {} processes {:>8.1f} ms".format(
+            mode.name, size, 1000*serial, workers, 1000*parallel))
+        if found is None and parallel < serial:
+            found = size
+    return found
+
+def best(fcn, *args):
+    """Return the best duration [float] (s) of 5 calls to fcn(*args)."""
+    return min(timed(fcn, *args) for _ in range(5))
+
+def break_even(engine, workers, size):
+    """Return the pool fixed cost [float] (s), the serial cost per byte [float] (s)
+    and the estimated break-even size [int] of the CBC decryption with 'engine'.
+    """
+    aes = AES(b"Yellow submarine", Mode.CBC, Padding.NONE, b"\x00"*16, engine, workers=workers)
+    aes.parallel_threshold = 0
+    small = aes.encrypt_bytes(os.urandom(16*4*workers))
+    large = aes.encrypt_bytes(os.urandom(size))
+    aes.workers = 1
+    serial_small, serial_large = best(aes.decrypt_bytes, small), best(aes.decrypt_bytes, large)
+    aes.workers = workers
+    overhead = best(aes.decrypt_bytes, small) - serial_small
+    per_byte = serial_large/size
+    return overhead, per_byte, int(overhead/(per_byte*(1 - 1/workers)))
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="AES serial/parallel throughput comparison")
+    parser.add_argument("--size", type=int, default=1024*1024, help="message size in bytes (default 1 MB)")
+    parser.add_argument("--workers", type=int, default=0, help="number of processes (default one per CPU)")
+    args = parser.parse_args()
+
+    for engine in [Engine.TTABLE] + ([Engine.NUMPY] if aesbatch.available() else []):
+        for count in [2, 4]:
+            overhead, per_byte, size = break_even(engine, count, args.size)
+            print("{:<6} {} processes: pool cost {:>5.1f} ms, serial {:>5.1f} ns/B, break-even {:>7d} B".format(
+                engine.name, count, 1000*overhead, 1e9*per_byte, size))
+
+    workers = nb_workers(args.workers)
+    data = os.urandom(args.size)
+    serial, parallel = bench_ctr(data, workers)
+    print("CTR  1 process:  {:>10.1f} KB/s".format(serial/1024))
+    print("CTR  {} processes: {:>10.1f} KB/s ({:.1f}x)".format(workers, parallel/1024, parallel/serial))
+
+    sizes = [1 << k for k in range(10, 21) if 1 << k <= args.size]
+    for mode in [Mode.ECB, Mode.CBC]:
+        size = crossover(mode, workers, sizes)
+        if size is None:
+            print("{}: no crossover up to {} bytes".format(mode.name, sizes[-1]))
+        else:
+            print("{}: crossover at {} bytes (parallel_threshold = {})".format(
+                mode.name, size, AES.parallel_threshold))
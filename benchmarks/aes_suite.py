@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+"""AES throughput/latency benchmark suite with JSON results and regression checks.
+
+Usage (from the repository root):
+    python3 -m benchmarks.aes_suite run [--output FILE] [--engine NAME] [--sizes N,N,...] [--quick]
+    python3 -m benchmarks.aes_suite compare BASELINE CURRENT [--threshold RATIO]
+
+'run' measures encryption and decryption for every key size, mode, padding
+and message size (one block up to 16 MB by default), plus micro-benchmarks of
+expand_key, gf28.multiply and gf28.matrix_multiply. Results are printed and,
+with --output, saved as JSON along with the machine metadata.
+
+'compare' prints the speed ratio of each case of CURRENT against BASELINE and
+exits with status 1 when a case got slower than the allowed threshold.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+from argparse import ArgumentParser
+
+from symmetric import aesbatch
+from symmetric.aes import AES, Engine, default_engine
+from symmetric.aesutil import expand_key
+from util import gf28
+from util.blockcipher import Mode, Padding
+
+_sizes = [16, 1024, 64*1024, 1024*1024, 16*1024*1024]
+_quick_sizes = [16, 1024, 64*1024]
+_keys = {16: b"Yellow submarine", 24: b"Yellow submarineazertyui", 32: b"Yellow submarine"*2}
+_mixcolumns = [[2, 3, 1, 1], [1, 2, 3, 1], [1, 1, 2, 3], [3, 1, 1, 2]]
+
+# -------------------------------------------------------------------------- #
+
+def metadata(engine):
+    """Return a description [dict] of the machine and software running the benchmark."""
+    meta = {"date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": "{} {}".format(platform.python_implementation(), platform.python_version()),
+            "engine": engine.name,
+            "numpy": aesbatch.np.__version__ if aesbatch.available() else None}
+    try:
+        meta["commit"] = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                                        text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        meta["commit"] = None
+    return meta
+
+def timed(fcn, arg, repeat, budget):
+    """Run fcn(arg) up to 'repeat' times (at least once, stopping after 'budget' seconds).
+
+    Output:
+    times [list] -- duration (s) of each run
+    """
+    times = []
+    total = 0
+    while len(times) < repeat and (not times or total < budget):
+        start = time.perf_counter()
+        fcn(arg)
+        times.append(time.perf_counter() - start)
+        total += times[-1]
+    return times
+
+def result(size, times):
+    """Return the result entry [dict] of a case processing 'size' bytes."""
+    best = min(times)
+    return {"size": size, "runs": len(times), "best": best, "mean": sum(times)/len(times),
+            "throughput": size/best if best else 0}
+
+def bench_aes(engine, sizes, repeat, budget):
+    """Yield (name, result) for every encryption/decryption case."""
+    for keylen, key in sorted(_keys.items()):
+        for mode in Mode:
+            # CTR is a stream mode, padding does not apply
+            paddings = [Padding.NONE] if mode == Mode.CTR else list(Padding)
+            iv = b"\x00"*(8 if mode == Mode.CTR else 16)
+            for padding in paddings:
+                aes = AES(key, mode, padding, iv, engine)
+                for size in sizes:
+                    plain = os.urandom(size)
+                    cipher = aes.encrypt_bytes(plain)
+                    base = "AES-{}/{}/{}/{}".format(8*keylen, mode.name, padding.name, size)
+                    yield "encrypt/" + base, result(size, timed(aes.encrypt_bytes, plain, repeat, budget))
+                    yield "decrypt/" + base, result(size, timed(aes.decrypt_bytes, cipher, repeat, budget))
+
+def bench_micro(repeat):
+    """Yield (name, result) for the micro-benchmarks (time per call)."""
+    cases = [("expand_key/{}".format(8*n), lambda k=k: expand_key(k)) for n, k in sorted(_keys.items())]
+    cases += [("gf28.multiply", lambda: gf28.multiply(0x57, 0x83)),
+              ("gf28.matrix_multiply", lambda: gf28.matrix_multiply(_mixcolumns, _mixcolumns))]
+    for name, fcn in cases:
+        timer = timeit.Timer(fcn)
+        number, _ = timer.autorange()
+        times = [t/number for t in timer.repeat(repeat, number)]
+        # Throughput of micro-benchmarks is expressed in calls per second
+        yield "micro/" + name, result(1, times)
+
+# -------------------------------------------------------------------------- #
+
+def run(args):
+    """Run the suite, print the results and save them if requested."""
+    engine = Engine[args.engine.upper()] if args.engine else default_engine()
+    if args.sizes:
+        sizes = [int(s) for s in args.sizes.split(",")]
+    else:
+        sizes = _quick_sizes if args.quick else _sizes
+    results = {}
+    print("{:<40} {:>5} {:>12} {:>14}".format("case", "runs", "best (us)", "throughput/s"))
+    for name, res in list(bench_micro(args.repeat)) + list(bench_aes(engine, sizes, args.repeat, args.budget)):
+        results[name] = res
+        print("{:<40} {:>5} {:>12.1f} {:>14.1f}".format(name, res["runs"], 1e6*res["best"], res["throughput"]))
+        sys.stdout.flush()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"metadata": metadata(engine), "results": results}, f, indent=2, sort_keys=True)
+    return 0
+
+def compare(args):
+    """Compare two result files, return 1 if a regression is found (0 otherwise)."""
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    for label, data in [("baseline", baseline), ("current", current)]:
+        meta = data["metadata"]
+        print("{:<9} {} ({}, {}, {} engine)".format(label, meta["date"], meta["python"],
+                                                    meta["machine"], meta["engine"]))
+    regressions = 0
+    print("{:<40} {:>14} {:>14} {:>8}".format("case", "baseline/s", "current/s", "ratio"))
+    for name, base in sorted(baseline["results"].items()):
+        if name not in current["results"]:
+            continue
+        cur = current["results"][name]
+        ratio = cur["throughput"]/base["throughput"] if base["throughput"] else 1
+        flag = ""
+        if ratio < 1 - args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print("{:<40} {:>14.1f} {:>14.1f} {:>7.2f}x{}".format(
+            name, base["throughput"], cur["throughput"], ratio, flag))
+    missing = sorted(set(baseline["results"]) ^ set(current["results"]))
+    if missing:
+        print("{} case(s) only present in one file".format(len(missing)))
+    print("{} regression(s) (threshold {:.0%})".format(regressions, args.threshold))
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="AES benchmark suite")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("-o", "--output", help="JSON results file")
+    run_parser.add_argument("--engine", choices=[e.name.lower() for e in Engine],
+                            help="AES engine (default: fastest available)")
+    run_parser.add_argument("--sizes", help="comma separated message sizes in bytes (default 16 B to 16 MB)")
+    run_parser.add_argument("--quick", action="store_true", help="only use message sizes up to 64 KB")
+    run_parser.add_argument("--repeat", type=int, default=5, help="maximum number of runs per case (default 5)")
+    run_parser.add_argument("--budget", type=float, default=1.0,
+                            help="no more runs after this many seconds per case (default 1)")
+    run_parser.set_defaults(func=run)
+
+    cmp_parser = subparsers.add_parser("compare", help="compare results against a baseline")
+    cmp_parser.add_argument("baseline", help="baseline JSON results file")
+    cmp_parser.add_argument("current", help="current JSON results file")
+    cmp_parser.add_argument("--threshold", type=float, default=0.1,
+                            help="allowed throughput loss ratio (default 0.1)")
+    cmp_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""Batch GCD on synthetic corpora of 2048-bit moduli.
+
+Moduli are products of two random odd 1024-bit numbers (primality does not
+change the tree costs and generating 200k primes would dominate the run),
+a few of them sharing a factor. The pairwise gcd baseline is extrapolated
+from a sample of pairs.
+
+Usage (from the repository root):
+    python3 -m benchmarks.batchgcd [--sizes 1000,10000,100000] [--workers N] [--spill DIR]
+"""
+
+import os
+import time
+from argparse import ArgumentParser
+
+import gmpy2
+
+from asymmetric.batchgcd import BatchGCD
+
+def corpus(size, bits=2048, shared=10):
+    """Return 'size' moduli [List<mpz>] of 'bits' bits, 'shared' pairs sharing a factor."""
+    def odd():
+        return gmpy2.mpz(int.from_bytes(os.urandom(bits//16), "big")) | (1 << (bits//2 - 1)) | 1
+    factors = [odd() for i in range(2*size)]
+    for i in range(min(shared, size//2)):
+        factors[4*i + 2] = factors[4*i]
+    return [factors[2*i]*factors[2*i + 1] for i in range(size)]
+
+def pairwise_estimate(moduli, sample=2000):
+    """Return the estimated duration [float] (s) of all the pairwise gcds."""
+    start = time.perf_counter()
+    for i in range(sample):
+        gmpy2.gcd(moduli[i % len(moduli)], moduli[(i*7 + 1) % len(moduli)])
+    pairs = len(moduli)*(len(moduli) - 1)//2
+    return (time.perf_counter() - start)/sample*pairs
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Batch GCD on synthetic RSA moduli")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma-separated corpus sizes (default 1000,10000,100000)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, 0 for one per CPU (default 1)")
+    parser.add_argument("--spill", help="directory storing the tree levels (default in memory)")
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        moduli = corpus(size)
+        batch = BatchGCD(args.workers, args.spill)
+        start = time.perf_counter()
+        gcds = batch.gcds(moduli)
+        duration = time.perf_counter() - start
+        print("{:>7d} moduli: batch GCD {:>8.2f} s, pairwise ~{:>10.0f} s, {:d} sharing a factor".format(
+            size, duration, pairwise_estimate(moduli), sum(1 for g in gcds if g.bit_length() > 512)))
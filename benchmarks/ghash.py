@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+"""GHASH and AES-GCM throughput with the bitwise and table-driven multiplications.
+
+Usage (from the repository root):
+    python3 -m benchmarks.ghash [--size BYTES]
+"""
+
+import os
+import time
+from argparse import ArgumentParser
+
+from symmetric.gcm import GCM, GHash, gf128_multiply
+
+class BitwiseGHash(GHash):
+    """GHASH using the bitwise reference multiplication (baseline)."""
+    def __init__(self, h):
+        super().__init__(h, 4)
+        self._h = int.from_bytes(h, "big")
+
+    def multiply(self, x):
+        return gf128_multiply(x, self._h)
+
+def timed(fcn, *args):
+    """Return the duration [float] (s) of fcn(*args)."""
+    start = time.perf_counter()
+    fcn(*args)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="GHASH/AES-GCM throughput")
+    parser.add_argument("--size", type=int, default=256*1024, help="message size in bytes (default 256 KB)")
+    args = parser.parse_args()
+
+    data = os.urandom(args.size)
+    h = os.urandom(16)
+    base = None
+    for name, ghash in [("bitwise", BitwiseGHash(h)), ("4-bit", GHash(h, 4)), ("8-bit", GHash(h, 8))]:
+        rate = args.size/timed(ghash.update, data)
+        base = base or rate
+        print("GHASH {:<8} {:>10.1f} KB/s ({:.1f}x)".format(name, rate/1024, rate/base))
+    for bits in [4, 8]:
+        gcm = GCM(os.urandom(16), os.urandom(12), bits=bits)
+        rate = args.size/timed(gcm.encrypt_and_digest, data)
+        print("GCM   {}-bit    {:>10.1f} KB/s".format(bits, rate/1024))
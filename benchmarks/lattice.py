@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+"""LLL reduction with exact and floating-point Gram-Schmidt.
+
+Knapsack lattices (identity plus a column of random numbers) of dimension 40
+to 60 have a small determinant, the integers of the exact algorithm stay
+small. Coppersmith lattices (known high bits of p) have huge entries and
+determinant, where the floating-point reduction is the faster one.
+
+Usage (from the repository root):
+    python3 -m benchmarks.lattice [--dims 40,50,60] [--bits BITS] [--mults 4,6,8]
+"""
+
+import os
+import time
+from argparse import ArgumentParser
+
+import gmpy2
+
+from asymmetric.lattice import lll, univariate_lattice
+
+def random_prime(bits):
+    """Return a random prime [mpz] of 'bits' bits."""
+    return gmpy2.next_prime(gmpy2.mpz(int.from_bytes(os.urandom(bits//8), "big")) | (1 << (bits - 1)))
+
+def knapsack(dim, bits):
+    """Return a knapsack lattice basis [List<List<int>>] of dimension 'dim'."""
+    weights = [int.from_bytes(os.urandom(bits//8), "big") for i in range(dim)]
+    return [[int(i == j) for j in range(dim)] + [w] for i, w in enumerate(weights)]
+
+def timed(basis, exact):
+    """Return the duration [float] (s) of the reduction of 'basis'."""
+    start = time.perf_counter()
+    lll(basis, exact=exact)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="LLL reduction speed")
+    parser.add_argument("--dims", default="40,50,60",
+                        help="comma-separated knapsack lattice dimensions (default 40,50,60)")
+    parser.add_argument("--bits", type=int, default=400, help="size of the knapsack weights (default 400)")
+    parser.add_argument("--mults", default="4,6,8",
+                        help="comma-separated Coppersmith multiplicities, dimension 2*m (default 4,6,8)")
+    args = parser.parse_args()
+
+    for dim in [int(d) for d in args.dims.split(",")]:
+        basis = knapsack(dim, args.bits)
+        exact, fp = timed(basis, True), timed(basis, False)
+        print("knapsack, dim {:>2d}: exact {:>7.2f} s, floating-point {:>7.2f} s".format(dim, exact, fp))
+
+    p, q = random_prime(512), random_prime(512)
+    for m in [int(m) for m in args.mults.split(",")]:
+        unknown = 200
+        basis = univariate_lattice([int(p) >> unknown << unknown, 1], int(p*q), m, m, 1 << unknown)
+        exact, fp = timed(basis, True), timed(basis, False)
+        print("Coppersmith, dim {:>2d}: exact {:>7.2f} s, floating-point {:>7.2f} s".format(2*m, exact, fp))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""RSA decryption with the full private exponent and with the CRT, and bulk
+decryption throughput with decrypt_many().
+
+Usage (from the repository root):
+    python3 -m benchmarks.rsa_crt [--bits BITS] [--count N] [--workers N]
+"""
+
+import os
+import time
+from argparse import ArgumentParser
+
+import gmpy2
+
+from asymmetric.rsa import RSA, PrivKey
+from util.parallel import nb_workers
+
+def random_prime(bits):
+    """Return a random prime [mpz] of 'bits' bits."""
+    return gmpy2.next_prime(gmpy2.mpz(int.from_bytes(os.urandom(bits//8), "big")) | (1 << (bits - 1)))
+
+def timed(priv, ciphers):
+    """Return the duration [float] (s) of the decryption of 'ciphers'."""
+    start = time.perf_counter()
+    for c in ciphers:
+        priv.decrypt(c)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="RSA CRT and bulk decryption speed")
+    parser.add_argument("--bits", type=int, default=2048, help="modulus size (default 2048)")
+    parser.add_argument("--count", type=int, default=50, help="decryptions per key (default 50)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="decrypt_many() worker processes, 0 for one per CPU (default 0)")
+    args = parser.parse_args()
+
+    for k in [2, 3, 4]:
+        primes = [random_prime(args.bits//k) for i in range(k)]
+        pub, priv = RSA(primes[0], primes[1], 65537, primes[2:]).gen_keys()
+        ciphers = [pub.encrypt(os.urandom(args.bits//8 - 16)) for i in range(args.count)]
+        full = timed(PrivKey(pub.n, priv.d), ciphers)
+        crt = timed(priv, ciphers)
+        print("{:d}-bit, {:d} primes: full {:>8.2f} ms, CRT {:>8.2f} ms ({:.1f}x)".format(
+            args.bits, k, 1000*full/args.count, 1000*crt/args.count, full/crt))
+
+    pub, priv = RSA(random_prime(args.bits//2), random_prime(args.bits//2)).gen_keys()
+    ciphers = [pub.encrypt(os.urandom(args.bits//8 - 16)) for i in range(20*args.count)]
+    for workers in sorted({1, nb_workers(args.workers)}):
+        start = time.perf_counter()
+        for plain in priv.decrypt_many(ciphers, workers):
+            pass
+        rate = len(ciphers)/(time.perf_counter() - start)
+        print("decrypt_many, {:d} worker(s): {:>8.0f} messages/s".format(workers, rate))
@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
 
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
+import shlex
+import sys
 import gmpy2
 
 import substitution.vigenere as vig
 from substitution.ceasar import rot
 from substitution.xor import xorvalue
 from factorizer.factorizer import Factorizer, Algo
-from asymmetric.rsa import RSA, PrivKey, PubKey, wiener, hastad, common_modulus
+from asymmetric.rsa import RSA, PrivKey, PubKey, wiener, extended_wiener, hastad, common_modulus, \
+    factor_high_bits, stereotyped
 from symmetric.aes import AES
-from symmetric.padoracle import padding_oracle
+from symmetric.aesfile import encrypt_file, decrypt_file
+from symmetric.ecboracle import ECBOracleAttack, SocketOracle
+from symmetric.keysearch import KeySearch, MaskSpace, WordlistSpace, charsets, derivations
+from symmetric.guess import GuessModel, NumericModel
+from symmetric.oracle import TCPOracle, HTTPOracle, SubprocessOracle
+from symmetric.oraclestats import OracleStats
+from symmetric.padoracle import Journal, PaddingOracleAttack
 from dlp.dlp import discrete_log
 from util.blockcipher import Mode, Padding
 from util.convert import hex_to_str
@@ -34,13 +43,27 @@ def handle_rsa(args):
         return hastad(pks, cs)
     elif args.action == "wiener":
         pubk = PubKey(args.n, args.e)
-        _, _, d = wiener(pubk)
+        if args.extended:
+            _, _, d = extended_wiener(pubk, args.extended)
+        else:
+            _, _, d = wiener(pubk)
         priv = PrivKey(args.n, d)
         return priv.decrypt(args.c)
+    elif args.action == "high-bits":
+        p, q = factor_high_bits(PubKey(args.n, args.e), args.hint, args.unknown, args.exact)
+        pub, priv = RSA(p, q, args.e).gen_keys()
+        return priv.decrypt(args.c)
+    elif args.action == "stereotyped":
+        known = args.prefix.encode() + bytes(args.unknown) + args.suffix.encode()
+        return stereotyped(PubKey(args.n, args.e), args.c, known, args.unknown,
+                           len(args.suffix.encode()), args.exact)
     elif args.action == "crack":
         f = Factorizer(Algo[args.algo], args.limit)
-        pq = f.factorize(args.n)
-        r = RSA(pq[0], pq[1], args.e)
+        factors = [r for r in f.factorize(args.n) if r != 1]
+        if len(factors) < 2:
+            raise SystemExit("Unable to factorize n")
+        # Multi-prime moduli decrypt with every factor (CRT)
+        r = RSA(factors[0], factors[1], args.e, factors[2:])
         pub, priv = r.gen_keys()
         return priv.decrypt(args.c)
     elif args.action == "decrypt":
@@ -60,18 +83,122 @@ def handle_rsa(args):
 
 def handle_aes(args):
     if args.action == "oracle":
-        host = {}
-        host["hostname"] = args.host
-        host["port"] = args.port
-        host["error"] = args.error.encode()
-        return padding_oracle(args.c.encode(), host)
+        return handle_padding_oracle(args)
+    if args.action == "oracle-encrypt":
+        return handle_oracle_encrypt(args)
+    if args.action == "ecb-oracle":
+        return handle_ecb_oracle(args)
     if args.iv:
         args.iv = args.iv.encode()
-    aes = AES(args.key.encode(), Mode[args.mode], Padding[args.padding], args.iv)
+    if args.action == "bruteforce":
+        return handle_bruteforce(args)
+    aes = AES(args.key.encode(), Mode[args.mode], Padding[args.padding], args.iv,
+              counter=args.counter, workers=args.workers)
     if args.action == "encrypt":
         return aes.encrypt(args.m.encode())
     elif args.action == "decrypt":
         return aes.decrypt(args.c)
+    elif args.action in ("encrypt-file", "decrypt-file"):
+        def progress(done, total):
+            print("\r{:6.2f}% ({:d}/{:d} bytes)".format(100*done/total, done, total),
+                  end="", file=sys.stderr)
+        fcn = encrypt_file if args.action == "encrypt-file" else decrypt_file
+        try:
+            size = fcn(aes, args.input, args.output, args.hex, progress=progress)
+        finally:
+            print(file=sys.stderr)
+        return "{:d} bytes written to {}".format(size, args.output)
+
+def handle_bruteforce(args):
+    if args.wordlist:
+        space = WordlistSpace(args.wordlist)
+    else:
+        charset = charsets.get(args.charset, args.charset.encode())
+        space = MaskSpace(args.mask.encode(), charset, args.wildcard.encode())
+    plain = bytes.fromhex(args.plain_hex) if args.plain_hex else args.m.encode()
+    search = KeySearch(space, plain, bytes.fromhex(args.c), Mode[args.mode], args.iv,
+                       args.counter, derivations[args.derive], args.workers)
+
+    def progress(tested, done, total, rate):
+        print("\r{:6.2f}% - {:d} keys tested ({:.0f} keys/s)".format(100*done/total, tested, rate),
+              end="", file=sys.stderr)
+    try:
+        key = search.run(progress)
+    finally:
+        print(file=sys.stderr)
+    if search.candidate != key:
+        return "{} (candidate {})".format(key, search.candidate)
+    return key
+
+def oracle_connect(args):
+    error = args.error.encode()
+    if args.url:
+        return lambda: HTTPOracle(args.url, args.param, args.method, error if args.error_text else None)
+    if args.command:
+        return lambda: SubprocessOracle(shlex.split(args.command), error)
+    if args.port is None:
+        raise SystemExit("--port is required with --host")
+    prompt = args.prompt.encode() if args.prompt else None
+    return lambda: TCPOracle(args.host, args.port, error, prompt, framing=args.framing)
+
+def oracle_stats(args):
+    stats = OracleStats(not args.no_throttle)
+    if args.log_interval:
+        stats.start_log(args.log_interval)
+    return stats
+
+def report_stats(stats, args):
+    stats.stop_log()
+    if args.stats:
+        stats.to_json(args.stats)
+    if args.log_interval:
+        print(stats.summary(), file=sys.stderr)
+
+def handle_padding_oracle(args):
+    model = NumericModel() if args.model == "numeric" else GuessModel()
+    journal = Journal(args.journal, args.resume) if args.journal else None
+    stats = oracle_stats(args)
+    attack = PaddingOracleAttack(oracle_connect(args), args.connections, args.pipeline,
+                                 model=model, journal=journal, stats=stats)
+    try:
+        plain = attack.run(bytes.fromhex(args.c))
+    finally:
+        if journal:
+            journal.close()
+        report_stats(stats, args)
+    print("{:d} oracle queries ({:.1f} per byte, {:d} cached), per block: {}".format(
+        attack.queries, attack.queries/(16*len(attack.block_queries)), attack.cached,
+        attack.block_queries), file=sys.stderr)
+    return plain
+
+def handle_oracle_encrypt(args):
+    journal = Journal(args.journal, args.resume) if args.journal else None
+    stats = oracle_stats(args)
+    attack = PaddingOracleAttack(oracle_connect(args), args.connections, args.pipeline,
+                                 journal=journal, stats=stats)
+    block = bytes.fromhex(args.block) if args.block else None
+    try:
+        cipher = attack.encrypt(args.m.encode(), block)
+    finally:
+        if journal:
+            journal.close()
+        report_stats(stats, args)
+    print("{:d} oracle queries ({:d} cached), per block: {}".format(
+        attack.queries, attack.cached, attack.block_queries), file=sys.stderr)
+    return cipher.hex()
+
+def handle_ecb_oracle(args):
+    oracle = SocketOracle({"hostname": args.host, "port": args.port})
+    stats = oracle_stats(args)
+    attack = ECBOracleAttack(oracle, args.batch, stats)
+    try:
+        secret = attack.run()
+    finally:
+        oracle.close()
+        report_stats(stats, args)
+    print("{:d} oracle queries (block size {:d}, prefix {:d} bytes)".format(
+        attack.queries, attack.block_size, attack.prefix_len), file=sys.stderr)
+    return secret
 
 def handle_rot(args):
     if args.all:
@@ -111,8 +238,11 @@ if __name__ == "__main__":
              "\n    * prime factorization;",
              "\n    * RSA basic encryption/decryption;",
              "\n    * common RSA attacks such as Wiener, Hastad or common modulus;",
-             "\n    * AES-128, AES-192, AES-224 (ECB or CBC) with multiple padding choice;",
-             "\n    * CBC padding oracle attack.",
+             "\n    * Coppersmith's RSA attacks with LLL lattice reduction (known high bits of p, stereotyped messages);",
+             "\n    * AES-128, AES-192, AES-224 (ECB, CBC or CTR) with multiple padding choice;",
+             "\n    * AES known-plaintext key search (mask or wordlist);",
+             "\n    * CBC padding oracle attack (decryption and encryption);",
+             "\n    * byte-at-a-time ECB encryption oracle attack.",
              "\n    * resolution of the discrete logarithm problem based on Pohlig-Hellman algorithm.")
     parser = ArgumentParser(description=''.join(descr), formatter_class=RawDescriptionHelpFormatter)
     parser.add_argument('--version', action='version', version="%(prog)s 1.0")
@@ -161,8 +291,26 @@ if __name__ == "__main__":
                          help="algorithm used to factorize n (default FACTORDB)")
     factsub.add_argument("--limit", default=10000, type=parse_int,
                          help="maximum number of tries (SMALL_PRIMES and FERMAT only) (default 10000)")
-    rsasubs.add_parser("wiener", parents=[n_argp, e_argp, c_argp],
-                       help="Wiener's attack (d small)")
+    wienersub = rsasubs.add_parser("wiener", parents=[n_argp, e_argp, c_argp],
+                                   help="Wiener's attack (d small)")
+    wienersub.add_argument("--extended", default=0, type=parse_int, metavar="BOUND",
+                           help="extended attack, searching BOUND^2 candidates near each "
+                                "convergent [int] (default 0: plain Wiener)")
+    lattice_argp = ArgumentParser(add_help=False)
+    lattice_argp.add_argument("--exact", action="store_true",
+                              help="exact LLL reduction instead of floating-point")
+    highsub = rsasubs.add_parser("high-bits", parents=[n_argp, e_argp, c_argp, lattice_argp],
+                                 help="Coppersmith's attack (high bits of p known)")
+    highsub.add_argument("--hint", type=parse_int, required=True,
+                         help="prime factor with its unknown low bits set to 0 [int]")
+    highsub.add_argument("--unknown", type=parse_int, required=True,
+                         help="number of unknown low bits of the prime factor [int]")
+    stereosub = rsasubs.add_parser("stereotyped", parents=[n_argp, e_argp, c_argp, lattice_argp],
+                                   help="stereotyped message attack (m mostly known, e small)")
+    stereosub.add_argument("--prefix", default="", help="known start of the plaintext [string]")
+    stereosub.add_argument("--suffix", default="", help="known end of the plaintext [string]")
+    stereosub.add_argument("--unknown", type=parse_int, required=True,
+                           help="number of unknown bytes between prefix and suffix [int]")
     commonsub = rsasubs.add_parser("common", parents=[n_argp],
                                    help="common modulus attack (same n, same m)")
     commonsub.add_argument("-e", type=parse_int, nargs=2, required=True,
@@ -186,7 +334,12 @@ if __name__ == "__main__":
     pad_argp.add_argument("--padding", default="PKCS7", choices=[e.name for e in Padding],
                           help="Padding method (default PKCS7)")
     iv_argp = ArgumentParser(add_help=False)
-    iv_argp.add_argument("--iv", default=None, help="CBC initialization vector [string] (16 bytes)")
+    iv_argp.add_argument("--iv", default=None,
+                         help="CBC initialization vector [string] (16 bytes) or CTR nonce [string] (0 to 15 bytes)")
+    iv_argp.add_argument("--counter", default=0, type=parse_int,
+                         help="CTR initial counter value [int] (default 0)")
+    iv_argp.add_argument("--workers", default=1, type=parse_int,
+                         help="number of processes, 0 for one per CPU (CTR, ECB/CBC decryption) (default 1)")
     # AES parser
     aesparser = subparser.add_parser("aes", help="AES-[128|192|224] encryption")
     aessubs = aesparser.add_subparsers(dest="action")
@@ -196,12 +349,76 @@ if __name__ == "__main__":
     encsub = aessubs.add_parser("encrypt", parents=[key_argp, mode_argp, pad_argp, iv_argp],
                                 help="encrypt m with key k")
     encsub.add_argument("-m", required=True, help="plaintext [string]")
-    oraclesub = aessubs.add_parser("oracle", help="Decrypt 'c' using CBC padding oracle attack")
+    file_argp = ArgumentParser(add_help=False)
+    file_argp.add_argument("input", help="input file")
+    file_argp.add_argument("output", help="output file")
+    encfsub = aessubs.add_parser("encrypt-file", parents=[key_argp, mode_argp, pad_argp, iv_argp, file_argp],
+                                 help="encrypt a (large) file with key k")
+    encfsub.add_argument("--hex", action="store_true", help="write the ciphertext as a hex string")
+    decfsub = aessubs.add_parser("decrypt-file", parents=[key_argp, mode_argp, pad_argp, iv_argp, file_argp],
+                                 help="decrypt a (large) file with key k")
+    decfsub.add_argument("--hex", action="store_true", help="the ciphertext is a hex string")
+    brutesub = aessubs.add_parser("bruteforce", parents=[mode_argp, iv_argp],
+                                  help="known-plaintext key search")
+    brutesub.add_argument("-c", required=True, help="ciphertext [hex string] (first block used)")
+    bruteplain = brutesub.add_mutually_exclusive_group(required=True)
+    bruteplain.add_argument("-m", help="known plaintext [string] (at least 16 bytes)")
+    bruteplain.add_argument("--plain-hex", help="known plaintext [hex string]")
+    brutespace = brutesub.add_mutually_exclusive_group(required=True)
+    brutespace.add_argument("--mask", help="key mask [string], unknown bytes replaced by the wildcard")
+    brutespace.add_argument("--wordlist", help="wordlist file, one candidate per line")
+    brutesub.add_argument("--charset", default="printable",
+                          help="values of the unknown bytes: one of {} or a literal string "
+                               "(default printable)".format(", ".join(charsets)))
+    brutesub.add_argument("--wildcard", default="?", help="mask wildcard [char] (default '?')")
+    brutesub.add_argument("--derive", default="none", choices=list(derivations),
+                          help="key derivation applied to each candidate (default none)")
+    statsparent = ArgumentParser(add_help=False)
+    statsparent.add_argument("--stats", help="JSON file receiving the oracle timing statistics [string]")
+    statsparent.add_argument("--log-interval", type=float,
+                             help="log the oracle statistics every LOG_INTERVAL seconds [float]")
+    statsparent.add_argument("--no-throttle", action="store_true",
+                             help="do not slow down when the oracle seems rate limited")
+    oracleparent = ArgumentParser(add_help=False, parents=[statsparent])
+    oracletarget = oracleparent.add_mutually_exclusive_group(required=True)
+    oracletarget.add_argument("--host", help="TCP oracle Hostname/IP adress [string]")
+    oracletarget.add_argument("--url", help="HTTP(S) oracle URL [string]")
+    oracletarget.add_argument("--command", help="oracle program reading stdin/writing stdout [string]")
+    oracleparent.add_argument("-p", "--port", type=parse_int, help="TCP oracle port [int]")
+    oracleparent.add_argument("--prompt", help="TCP oracle prompt before each request [string]")
+    oracleparent.add_argument("--param", default="c", help="HTTP parameter name [string] (default 'c')")
+    oracleparent.add_argument("--method", default="GET", choices=["GET", "POST"],
+                              help="HTTP method (default GET)")
+    oracleparent.add_argument("--error", default="Error",
+                              help="text received on error [string] (default 'Error')")
+    oracleparent.add_argument("--error-text", action="store_true",
+                              help="HTTP: also look for the error text in the body (default: status only)")
+    oracleparent.add_argument("--framing", default="recv", choices=["recv", "line"],
+                              help="TCP oracle framing: one message per recv() without newline (original "
+                                   "protocol) or newline-terminated lines (default recv)")
+    oracleparent.add_argument("--connections", default=1, type=parse_int,
+                              help="simultaneous connections to the oracle [int] (default 1)")
+    oracleparent.add_argument("--pipeline", default=1, type=parse_int,
+                              help="guesses sent at once for each byte [int] (default 1)")
+    oracleparent.add_argument("--journal", help="file recording the oracle answers and recovered bytes [string]")
+    oracleparent.add_argument("--resume", action="store_true",
+                              help="resume the attack recorded in the journal instead of overwriting it")
+    oraclesub = aessubs.add_parser("oracle", parents=[oracleparent],
+                                   help="Decrypt 'c' using CBC padding oracle attack")
     oraclesub.add_argument("-c", required=True, help="ciphertext [hex string]")
-    oraclesub.add_argument("--host", required=True, help="Hostname/IP adress [string]")
-    oraclesub.add_argument("-p", "--port", required=True, type=parse_int, help="port [int]")
-    oraclesub.add_argument("--error", default="Error",
-                           help="text received on error [string] (default 'Error')")
+    oraclesub.add_argument("--model", default="english", choices=["english", "numeric"],
+                           help="guess ordering: adaptive English text model or numeric (default english)")
+    oracleencsub = aessubs.add_parser("oracle-encrypt", parents=[oracleparent],
+                                      help="Forge the CBC encryption of 'm' using a padding oracle")
+    oracleencsub.add_argument("-m", required=True, help="plaintext [string]")
+    oracleencsub.add_argument("--block", help="last ciphertext block [hex string] (default a block "
+                                              "decrypted in the journal, or random)")
+    ecbsub = aessubs.add_parser("ecb-oracle", parents=[statsparent],
+                                help="Decrypt the secret appended by an ECB encryption oracle")
+    ecbsub.add_argument("--host", required=True, help="Hostname/IP adress [string]")
+    ecbsub.add_argument("-p", "--port", required=True, type=parse_int, help="port [int]")
+    ecbsub.add_argument("--batch", default=256, type=parse_int,
+                        help="candidate blocks sent per query [int] (default 256)")
 
     # Rot parser
     rotparser = subparser.add_parser("rot", help="Ceasar cipher / string rotation")
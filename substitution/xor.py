@@ -9,7 +9,6 @@ def xorvalue(instr, value):
 
 def xorstrings(str1, str2):
     """Xor 'str1' [bytes] with 'str2' [bytes]."""
-    res = []
-    for i in range(min(len(str1), len(str2))):
-        res.append(str1[i] ^ str2[i])
-    return bytes(res)
+    size = min(len(str1), len(str2))
+    res = int.from_bytes(str1[:size], "big") ^ int.from_bytes(str2[:size], "big")
+    return res.to_bytes(size, "big")
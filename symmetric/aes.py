@@ -1,22 +1,59 @@
 #!/usr/bin/env python3
 
-from symmetric.aesutil import AES_Matrix, expand_key
+from enum import IntEnum
+
+from symmetric import aesbatch
+from symmetric.aesutil import AES_Matrix, get_schedule, ttable_encrypt, ttable_decrypt
 from substitution.xor import xorstrings
 from util.blockcipher import Mode, Padding
+from util.parallel import nb_workers, run_jobs, split
 from util.convert import matrix_to_str, str_to_matrix
 from util.error import AESError, PaddingError
 
 _nbrounds = {16: 10, 24:12, 32:14}
 
+class Engine(IntEnum):
+    """AES block engine."""
+    MATRIX = 0
+    TTABLE = 1
+    NUMPY = 2
+
+def default_engine():
+    """Return the fastest available engine [IntEnum.Engine] (NUMPY if installed)."""
+    return Engine.NUMPY if aesbatch.available() else Engine.TTABLE
+
 class AES:
     """AES encryption
 
     Keyword arguments:
     key [bytes] -- symmetric key
-    padding [IntEnum.Padding] -- padding method used (default PKCS7)
-    iv [bytes] -- initialisation vector (CBC only)
+    padding [IntEnum.Padding] -- padding method used (default PKCS7, ignored in CTR mode)
+    iv [bytes] -- initialisation vector (CBC) or nonce of 0 to 15 bytes (CTR);
+        in CTR mode, the counter block is the nonce followed by a big-endian
+        counter filling the remaining bytes
+    engine [IntEnum.Engine] -- block engine used (default NUMPY if installed, TTABLE
+        otherwise); NUMPY processes independent blocks (ECB, CTR, CBC decryption)
+        in batches of at least batch_threshold bytes and falls back on TTABLE
+        for smaller inputs and CBC encryption
+    counter [int] -- initial counter value (CTR only) (default 0)
+    workers [int] -- number of processes used by the parallel code paths
+        (CTR, ECB/CBC decryption), 0 meaning one per CPU (default 1)
     """
-    def __init__(self, key, mode, padding=Padding.PKCS7, iv=None):
+    # Inputs smaller than this (in bytes) are always processed serially: the
+    # process pool costs 3.7 ms (2 processes) to 6.5 ms (4 processes), the
+    # NumPy engine decrypts 50 ns/B, the pool breaking even at 150 KB (2
+    # processes) to 172 KB (4 processes) (benchmarks/aes_parallel.py). The
+    # T-tables (470 ns/B) break even from 15 KB to 23 KB, lower the threshold
+    # for them if needed.
+    parallel_threshold = 256*1024
+    # Inputs smaller than this (in bytes) use the T-tables even with the NUMPY
+    # engine: a NumPy call costs about 85 us (encryption) or 140 us
+    # (decryption) whatever the size, the T-tables 6.7 us per block, the two
+    # being even around 24 blocks (benchmarks/aes_latency.py)
+    batch_threshold = 24*16
+
+    def __init__(self, key, mode, padding=Padding.PKCS7, iv=None, engine=None,
+                 counter=0, workers=1):
         self.key = key
         self.keylen = len(key)
         try:
@@ -27,7 +64,20 @@ class AES:
         self.padding = padding
         if self.mode == Mode.CBC and (not iv or len(iv) != 16):
             raise AESError("IV must be 16 bytes long")
+        if self.mode == Mode.CTR:
+            if iv is None or len(iv) > 15:
+                raise AESError("Nonce must be at most 15 bytes long")
+            self.padding = Padding.NONE
+            self._ctrlen = 16 - len(iv)
+            self.counter = counter % (1 << (8*self._ctrlen))
         self.iv = iv
+        if engine is None:
+            engine = default_engine()
+        elif engine == Engine.NUMPY and not aesbatch.available():
+            raise AESError("NumPy engine unavailable (numpy not installed)")
+        self.engine = engine
+        self.workers = workers
+        self._schedule = get_schedule(key)
 
     def __repr__(self):
         return "AES({}, {}, {})".format(self.key, self.padding, self.iv)
@@ -38,64 +88,293 @@ class AES:
 
     def encrypt(self, plain):
         """Encrypt 'plain' [bytes] and return the corresponding ciphertext [hex string]."""
-        parts = []
-        plain = self._pad(plain)
-        c_i = self.iv
-        for offset in range(0, len(plain), 16):
-            if self.mode == Mode.ECB:
-                parts.append(self._encrypt_core(plain[offset:offset+16], self.key))
-            elif self.mode == Mode.CBC:
-                cbcin = xorstrings(plain[offset:offset+16], c_i)
-                parts.append(self._encrypt_core(cbcin, self.key))
-                c_i = parts[-1]
-        return b"".join(parts).hex()
-
-    def _encrypt_core(self, plain, key):
+        return self.encrypt_bytes(plain).hex()
+
+    def encrypt_bytes(self, plain):
+        """Encrypt 'plain' [bytes-like] and return the corresponding ciphertext [bytes]."""
+        out = bytearray(self.encrypted_size(memoryview(plain).nbytes))
+        self.encrypt_into(plain, out)
+        return bytes(out)
+
+    def encrypt_into(self, plain, out):
+        """Encrypt 'plain' [bytes-like] into the writable buffer 'out' [bytes-like].
+
+        'out' must hold at least encrypted_size(len(plain)) bytes.
+        Output:
+        size [int] -- number of bytes written
+        """
+        src = memoryview(plain).cast("B")
+        dst = memoryview(out).cast("B")
+        size = self.encrypted_size(len(src))
+        if len(dst) < size:
+            raise AESError("Output buffer too small")
+        if self.mode == Mode.CTR:
+            dst[:size] = self.ctr_crypt(src)
+            return size
+        full = len(src) - len(src)%16
+        c_i = self._encrypt_into(src[:full], dst, self.iv)
+        last = self._pad(bytes(src[full:]))
+        if len(last)%16 != 0:
+            raise AESError("Plaintext length must be a multiple of 16 bytes")
+        self._encrypt_into(last, dst[full:size], c_i)
+        return size
+
+    def encrypted_size(self, size):
+        """Return the ciphertext size [int] of a 'size'-byte plaintext."""
+        if self.mode == Mode.CTR or self.padding == Padding.NONE:
+            return size
+        return size + 16 - size%16
+
+    def encryptor(self):
+        """Return an incremental encryption context [AESEncryptor]."""
+        return AESEncryptor(self)
+
+    def encrypt_stream(self, chunks):
+        """Encrypt the iterable 'chunks' [bytes] and yield the ciphertext [bytes] piece by piece."""
+        ctx = self.encryptor()
+        for chunk in chunks:
+            out = ctx.update(chunk)
+            if out:
+                yield out
+        yield ctx.finalize()
+
+    def _encrypt_blocks(self, plain, c_i):
+        """Encrypt the blocks of 'plain' [bytes] chained from 'c_i' [bytes].
+
+        Output:
+        cipher [bytes] -- ciphertext
+        c_i [bytes] -- last chaining block (CBC) or stream offset (CTR)
+        """
+        if self.mode == Mode.CTR:
+            return self._ctr_xor(plain, c_i), c_i + len(plain)
+        out = bytearray(len(plain))
+        c_i = self._encrypt_into(plain, memoryview(out), c_i)
+        return bytes(out), c_i
+
+    def _encrypt_into(self, plain, out, c_i):
+        """Encrypt the ECB/CBC blocks of 'plain' into 'out' [memoryview] and return the last chaining block."""
+        core = self._encrypt_core
+        if self.mode == Mode.ECB and self._batched(len(plain)):
+            out[:len(plain)] = aesbatch.encrypt_blocks(plain, self._schedule)
+        elif self.mode == Mode.ECB:
+            for offset in range(0, len(plain), 16):
+                out[offset:offset+16] = core(plain[offset:offset+16])
+        elif self.mode == Mode.CBC:
+            for offset in range(0, len(plain), 16):
+                c_i = core(xorstrings(plain[offset:offset+16], c_i))
+                out[offset:offset+16] = c_i
+        return c_i
+
+    def _encrypt_core(self, plain):
+        """AES encryption of a single block with the selected engine."""
+        if self.engine != Engine.MATRIX:
+            return ttable_encrypt(plain, self._schedule.ekeys, self._rounds)
+        return self._encrypt_matrix(plain)
+
+    def _encrypt_matrix(self, plain):
         """AES encryption loop for each block."""
         matrix = AES_Matrix(str_to_matrix(plain))
-        expkey = expand_key(key)
-        matrix.add_roundkey(expkey, 0)
+        subkeys = self._schedule.subkeys
+        matrix.add_subkey(subkeys[0])
         for i in range(1, self._rounds):
             matrix.sub_bytes()
             matrix.shift_rows()
             matrix.mix_columns()
-            matrix.add_roundkey(expkey, i)
+            matrix.add_subkey(subkeys[i])
         matrix.sub_bytes()
         matrix.shift_rows()
-        matrix.add_roundkey(expkey, self._rounds)
+        matrix.add_subkey(subkeys[self._rounds])
         return matrix_to_str(matrix.state)
 
 
     def decrypt(self, cipher):
         """Decrypt 'cipher' [hex string] and return the corresponding plaintext [bytes]."""
-        parts = []
-        cipher = bytes.fromhex(cipher)
-        c_i = self.iv
+        return self.decrypt_bytes(bytes.fromhex(cipher))
+
+    def decrypt_bytes(self, cipher):
+        """Decrypt 'cipher' [bytes-like] and return the corresponding plaintext [bytes]."""
+        out = bytearray(memoryview(cipher).nbytes)
+        size = self.decrypt_into(cipher, out)
+        return bytes(memoryview(out)[:size])
+
+    def decrypt_into(self, cipher, out):
+        """Decrypt 'cipher' [bytes-like] into the writable buffer 'out' [bytes-like].
+
+        'out' must hold at least len(cipher) bytes and may be 'cipher' itself.
+        Output:
+        size [int] -- number of plaintext bytes written (padding removed)
+        """
+        src = memoryview(cipher).cast("B")
+        dst = memoryview(out).cast("B")
+        size = len(src)
+        if len(dst) < size:
+            raise AESError("Output buffer too small")
+        if self.mode == Mode.CTR:
+            dst[:size] = self.ctr_crypt(src)
+            return size
+        if size%16 != 0:
+            raise AESError("Ciphertext length must be a multiple of 16 bytes")
+        self._decrypt_into(src, dst, self.iv)
+        return self._unpadded_size(dst, size)
+
+    def decryptor(self):
+        """Return an incremental decryption context [AESDecryptor]."""
+        return AESDecryptor(self)
+
+    def decrypt_stream(self, chunks):
+        """Decrypt the iterable 'chunks' [bytes] and yield the plaintext [bytes] piece by piece."""
+        ctx = self.decryptor()
+        for chunk in chunks:
+            out = ctx.update(chunk)
+            if out:
+                yield out
+        yield ctx.finalize()
+
+    def _decrypt_blocks(self, cipher, c_i):
+        """Decrypt the blocks of 'cipher' [bytes] chained from 'c_i' [bytes].
+
+        Output:
+        plain [bytes] -- plaintext (still padded)
+        c_i [bytes] -- last chaining block (CBC) or stream offset (CTR)
+        """
+        if self.mode == Mode.CTR:
+            return self._ctr_xor(cipher, c_i), c_i + len(cipher)
+        out = bytearray(len(cipher))
+        c_i = self._decrypt_into(memoryview(cipher), memoryview(out), c_i)
+        return bytes(out), c_i
+
+    def _decrypt_into(self, cipher, out, c_i):
+        """Decrypt the ECB/CBC blocks of 'cipher' into 'out' [memoryview] and return the last chaining block."""
+        size = len(cipher)
+        if not size:
+            return c_i
+        chain = c_i if self.mode == Mode.CBC else None
+        if chain is not None:
+            # Kept before 'out' (possibly 'cipher' itself) is written
+            c_i = bytes(cipher[size-16:size])
+        workers = self._workers_for(size)
+        if workers == 1:
+            self._decrypt_range(cipher, out, chain)
+            return c_i
+        # The blocks of each job are copied (pickled) with the ciphertext
+        # block preceding them, the CBC chaining being undone by the job
+        ranges = split(size, 4*workers, 16)
+        jobs = [(self, bytes(cipher[start:end]),
+                 None if chain is None else bytes(cipher[start-16:start]) if start else chain)
+                for start, end in ranges]
+        for (start, end), part in zip(ranges, run_jobs(_decrypt_job, jobs, workers)):
+            out[start:end] = part
+        return c_i
+
+    def _decrypt_range(self, cipher, out, chain=None):
+        """Decrypt the blocks of 'cipher' [bytes-like] into 'out' [memoryview],
+        chained from 'chain' [bytes] in CBC mode (None in ECB mode).
+        """
+        if self._batched(len(cipher)):
+            out[:len(cipher)] = aesbatch.decrypt_blocks(cipher, self._schedule, chain)
+            return
+        core = self._decrypt_core
+        if chain is None:
+            for offset in range(0, len(cipher), 16):
+                out[offset:offset+16] = core(cipher[offset:offset+16])
+            return
         for offset in range(0, len(cipher), 16):
-            if self.mode == Mode.ECB:
-                parts.append(self._decrypt_core(cipher[offset:offset+16], self.key))
-            elif self.mode == Mode.CBC:
-                cbcout = self._decrypt_core(cipher[offset:offset+16], self.key)
-                parts.append(xorstrings(cbcout, c_i))
-                c_i = cipher[offset:offset+16]
-        return self._unpad(b"".join(parts))
-
-    def _decrypt_core(self, cipher, key):
+            # Copied first, 'out' may be 'cipher' itself
+            block = bytes(cipher[offset:offset+16])
+            out[offset:offset+16] = xorstrings(core(block), chain)
+            chain = block
+
+    def _decrypt_core(self, cipher):
+        """AES decryption of a single block with the selected engine."""
+        if self.engine != Engine.MATRIX:
+            return ttable_decrypt(cipher, self._schedule.dkeys, self._rounds)
+        return self._decrypt_matrix(cipher)
+
+    def _decrypt_matrix(self, cipher):
         """AES decryption loop for each block."""
         matrix = AES_Matrix(str_to_matrix(cipher))
-        expkey = expand_key(key)
-        matrix.add_roundkey(expkey, self._rounds)
+        subkeys = self._schedule.subkeys
+        matrix.add_subkey(subkeys[self._rounds])
         matrix.inv_shift_rows()
         matrix.inv_sub_bytes()
         for i in range(self._rounds-1, 0, -1):
-            matrix.add_roundkey(expkey, i)
+            matrix.add_subkey(subkeys[i])
             matrix.inv_mix_columns()
             matrix.inv_shift_rows()
             matrix.inv_sub_bytes()
-        matrix.add_roundkey(expkey, 0)
+        matrix.add_subkey(subkeys[0])
         return matrix_to_str(matrix.state)
 
 
+    def ctr_crypt(self, data, offset=0, workers=None):
+        """Encrypt or decrypt 'data' [bytes] in CTR mode and return the result [bytes].
+
+        Keyword arguments:
+        data [bytes] -- input, starting at byte 'offset' of the CTR stream
+        offset [int] -- position of 'data' in the stream, allowing random
+            access decryption (default 0)
+        workers [int] -- number of processes generating the keystream, 0
+            meaning one per CPU (default self.workers)
+        """
+        if self.mode != Mode.CTR:
+            raise AESError("CTR mode required")
+        data = bytes(data)
+        workers = self._workers_for(len(data), workers)
+        if workers == 1:
+            return self._ctr_xor(data, offset)
+        # Chunk boundaries are aligned on the keystream blocks
+        shift = offset % 16
+        jobs = [(self, data[max(start-shift, 0):end-shift], offset + max(start-shift, 0))
+                for start, end in split(len(data) + shift, 4*workers, 16)]
+        return b"".join(run_jobs(_ctr_job, jobs, workers))
+
+    def keystream(self, offset, length):
+        """Return 'length' bytes of the CTR keystream [bytes] starting at byte 'offset'."""
+        first = offset // 16
+        last = (offset + length + 15) // 16
+        skip = offset % 16
+        if self._batched(16*(last - first)):
+            start = (self.counter + first) % (1 << (8*self._ctrlen))
+            ctrs = aesbatch.counter_blocks(bytes(self.iv), self._ctrlen, start, last - first)
+            return aesbatch.encrypt_blocks(ctrs, self._schedule)[skip:skip+length]
+        parts = []
+        for idx in range(first, last):
+            ctr = (self.counter + idx) % (1 << (8*self._ctrlen))
+            parts.append(self._encrypt_core(self.iv + ctr.to_bytes(self._ctrlen, "big")))
+        return b"".join(parts)[skip:skip+length]
+
+    def _ctr_xor(self, data, offset):
+        """Xor 'data' [bytes] with the keystream starting at byte 'offset'."""
+        return xorstrings(data, self.keystream(offset, len(data)))
+
+    def _batched(self, size):
+        """Return True if 'size' bytes of independent blocks are processed with the NumPy engine."""
+        return self.engine == Engine.NUMPY and size >= self.batch_threshold
+
+    def _workers_for(self, size, workers=None):
+        """Return the number of processes [int] worth using for 'size' bytes."""
+        if size < self.parallel_threshold:
+            return 1
+        return nb_workers(self.workers if workers is None else workers)
+
+    def _chain_start(self):
+        """Return the initial chaining value of the streaming contexts."""
+        return 0 if self.mode == Mode.CTR else self.iv
+
+
+    def _unpadded_size(self, text, size):
+        """Return the size [int] of the first 'size' bytes of 'text' [bytes-like] once unpadded."""
+        if self.padding == Padding.ZERO:
+            while size and text[size-1] == 0:
+                size -= 1
+        elif self.padding == Padding.ANSI or self.padding == Padding.PKCS7:
+            if size < 16 or not 0 < text[size-1] <= 16:
+                raise PaddingError("Invalid padding")
+            size += len(self._unpad(bytes(text[size-16:size]))) - 16
+        elif self.padding != Padding.NONE:
+            raise AESError("Unknown padding scheme")
+        return size
+
     def _pad(self, text):
         """Pad 'text' [bytes] with the chosen padding scheme."""
         padlen = 16 - len(text)%16
@@ -120,8 +399,7 @@ class AES:
     def _unpad(self, text):
         """Unpad 'text' [bytes] with the chosen padding scheme."""
         if self.padding == Padding.ZERO:
-            while text[-1] == 0:
-                text = text[:-1]
+            text = text.rstrip(b"\x00")
         elif self.padding == Padding.ANSI or self.padding == Padding.PKCS7:
             check = text[-text[-1]:-1]
             for n in check:
@@ -133,3 +411,117 @@ class AES:
         else:
             raise AESError("Unknown padding scheme")
         return text
+
+# -------------------------------------------------------------------------- #
+
+class AESEncryptor:
+    """Incremental AES encryption context (cf. AES.encryptor).
+
+    Data can be fed in chunks of any size with update(); only the trailing
+    incomplete block is buffered between calls.
+
+    Keyword arguments:
+    aes [AES] -- cipher whose key, mode, padding and IV are used
+    """
+    def __init__(self, aes):
+        self._aes = aes
+        self._chain = aes._chain_start()
+        self._buffer = b""
+        self._done = False
+
+    def update(self, data):
+        """Encrypt 'data' [bytes-like] and return the ciphertext available so far [bytes]."""
+        if self._done:
+            raise AESError("Context already finalized")
+        data = self._buffer + bytes(data)
+        end = len(data) - len(data)%16
+        self._buffer = data[end:]
+        cipher, self._chain = self._aes._encrypt_blocks(data[:end], self._chain)
+        return cipher
+
+    def finalize(self):
+        """Pad and encrypt the buffered data and return the last ciphertext blocks [bytes]."""
+        if self._done:
+            raise AESError("Context already finalized")
+        self._done = True
+        last = self._aes._pad(self._buffer)
+        if len(last)%16 != 0 and self._aes.mode != Mode.CTR:
+            raise AESError("Plaintext length must be a multiple of 16 bytes")
+        cipher, self._chain = self._aes._encrypt_blocks(last, self._chain)
+        self._buffer = b""
+        return cipher
+
+
+class AESDecryptor:
+    """Incremental AES decryption context (cf. AES.decryptor).
+
+    Ciphertext can be fed in chunks of any size with update(). Only the last
+    complete block is held back (PKCS7 and ANSI) so that it can be unpadded by
+    finalize(); with zero padding, trailing zeros are counted but not stored.
+
+    Keyword arguments:
+    aes [AES] -- cipher whose key, mode, padding and IV are used
+    """
+    def __init__(self, aes):
+        self._aes = aes
+        self._chain = aes._chain_start()
+        self._buffer = b""
+        self._zeros = 0
+        self._done = False
+
+    def update(self, data):
+        """Decrypt 'data' [bytes-like] and return the plaintext available so far [bytes]."""
+        if self._done:
+            raise AESError("Context already finalized")
+        data = self._buffer + bytes(data)
+        end = len(data) - len(data)%16
+        if end == len(data) and self._aes.padding in (Padding.ANSI, Padding.PKCS7):
+            end = max(end - 16, 0)
+        self._buffer = data[end:]
+        plain, self._chain = self._aes._decrypt_blocks(data[:end], self._chain)
+        if self._aes.padding == Padding.ZERO:
+            plain = self._hold_zeros(plain)
+        return plain
+
+    def finalize(self):
+        """Decrypt and unpad the buffered block and return the last plaintext bytes [bytes]."""
+        if self._done:
+            raise AESError("Context already finalized")
+        self._done = True
+        if self._aes.mode == Mode.CTR:
+            plain, self._chain = self._aes._decrypt_blocks(self._buffer, self._chain)
+        elif len(self._buffer)%16 != 0:
+            raise AESError("Ciphertext length must be a multiple of 16 bytes")
+        elif self._aes.padding in (Padding.ANSI, Padding.PKCS7):
+            if not self._buffer:
+                raise PaddingError("Invalid padding")
+            plain, self._chain = self._aes._decrypt_blocks(self._buffer, self._chain)
+            if not 0 < plain[-1] <= 16:
+                raise PaddingError("Invalid padding")
+            plain = self._aes._unpad(plain)
+        else:
+            plain = b""
+        self._buffer = b""
+        return plain
+
+    def _hold_zeros(self, plain):
+        """Withhold the trailing zeros of 'plain' [bytes] until non-zero data follows."""
+        stripped = plain.rstrip(b"\x00")
+        if not stripped:
+            self._zeros += len(plain)
+            return b""
+        held = b"\x00"*self._zeros
+        self._zeros = len(plain) - len(stripped)
+        return held + stripped
+
+# -------------------------------------------------------------------------- #
+
+def _ctr_job(aes, data, offset):
+    """Process pool job: xor 'data' with the keystream of 'aes' starting at 'offset'."""
+    return aes._ctr_xor(data, offset)
+
+def _decrypt_job(aes, cipher, chain):
+    """Process pool job: decrypt the blocks of 'cipher' [bytes] with 'aes', chained from 'chain' [bytes] (CBC, None in ECB)."""
+    out = bytearray(len(cipher))
+    aes._decrypt_range(cipher, memoryview(out), chain)
+    return out
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""Vectorized AES over many independent blocks at once (optional NumPy backend).
+
+The state of N blocks is stored as a (N, 16) uint8 array in the usual AES
+byte order (column-major). SubBytes is done by fancy indexing in the S-Box,
+ShiftRows by a column permutation and MixColumns with an xtime table.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from symmetric import aesutil
+
+# Number of blocks processed per batch (bounds the temporaries size)
+_batch = 1 << 16
+
+_tables = None
+
+def available():
+    """Return True if NumPy is installed."""
+    return np is not None
+
+def clear_tables():
+    """Drop the NumPy tables (regenerated from aesutil on next use)."""
+    global _tables
+    _tables = None
+
+def _gen_tables():
+    """Generate the NumPy S-Boxes, xtime and ShiftRows permutation tables."""
+    global _tables
+    sbox = np.array(aesutil._sbox, dtype=np.uint8)
+    invsbox = np.array(aesutil._invsbox, dtype=np.uint8)
+    x = np.arange(256, dtype=np.uint16)
+    xtime = (((x << 1) ^ np.where(x & 0x80, 0x11b, 0)) & 0xff).astype(np.uint8)
+    shift = np.array([4*((c + r) % 4) + r for c in range(4) for r in range(4)])
+    invshift = np.array([4*((c - r) % 4) + r for c in range(4) for r in range(4)])
+    _tables = (sbox, invsbox, xtime, xtime[xtime], shift, invshift)
+
+def _round_keys(schedule):
+    """Return the round keys of 'schedule' [KeySchedule] as a (rounds+1, 16) uint8 array."""
+    return np.array(schedule.expanded, dtype=np.uint8).reshape(-1, 16)
+
+def _mix_columns(state, xtime):
+    """MixColumns on a (N, 16) uint8 'state'."""
+    a = state.reshape(-1, 4, 4)
+    total = a[:, :, 0] ^ a[:, :, 1] ^ a[:, :, 2] ^ a[:, :, 3]
+    res = a ^ total[:, :, None] ^ xtime[a ^ a[:, :, [1, 2, 3, 0]]]
+    return res.reshape(-1, 16)
+
+def _inv_mix_columns(state, xtime, xtime2):
+    """InvMixColumns on a (N, 16) uint8 'state'."""
+    a = state.reshape(-1, 4, 4).copy()
+    u = xtime2[a[:, :, 0] ^ a[:, :, 2]]
+    v = xtime2[a[:, :, 1] ^ a[:, :, 3]]
+    a[:, :, 0] ^= u
+    a[:, :, 1] ^= v
+    a[:, :, 2] ^= u
+    a[:, :, 3] ^= v
+    return _mix_columns(a.reshape(-1, 16), xtime)
+
+def _encrypt_state(state, rkeys):
+    """Encrypt the (N, 16) uint8 'state' with the round keys 'rkeys'."""
+    sbox, _, xtime, _, shift, _ = _tables
+    rounds = len(rkeys) - 1
+    state = state ^ rkeys[0]
+    for rnd in range(1, rounds):
+        state = _mix_columns(sbox[state][:, shift], xtime) ^ rkeys[rnd]
+    return sbox[state][:, shift] ^ rkeys[rounds]
+
+def _decrypt_state(state, rkeys):
+    """Decrypt the (N, 16) uint8 'state' with the round keys 'rkeys'."""
+    _, invsbox, xtime, xtime2, _, invshift = _tables
+    rounds = len(rkeys) - 1
+    state = invsbox[(state ^ rkeys[rounds])[:, invshift]]
+    for rnd in range(rounds-1, 0, -1):
+        state = invsbox[_inv_mix_columns(state ^ rkeys[rnd], xtime, xtime2)[:, invshift]]
+    return state ^ rkeys[0]
+
+def _process(data, schedule, fcn, iv=None):
+    """Apply 'fcn' to all the 16-byte blocks of 'data' [bytes-like], batch by batch.
+
+    If 'iv' [bytes] is given, each result is xored with the previous block of
+    'data' ('iv' for the first one), i.e. the CBC decryption chaining.
+    """
+    if _tables is None:
+        _gen_tables()
+    rkeys = _round_keys(schedule)
+    blocks = np.frombuffer(data, dtype=np.uint8).reshape(-1, 16)
+    out = np.empty_like(blocks)
+    for start in range(0, len(blocks), _batch):
+        out[start:start+_batch] = fcn(blocks[start:start+_batch], rkeys)
+    if iv is not None and len(blocks):
+        out[0] ^= np.frombuffer(iv, dtype=np.uint8)
+        out[1:] ^= blocks[:-1]
+    return out.tobytes()
+
+def encrypt_blocks(data, schedule):
+    """Encrypt each block of 'data' [bytes-like] (ECB) with 'schedule' [KeySchedule] and return the result [bytes]."""
+    return _process(data, schedule, _encrypt_state)
+
+def decrypt_blocks(data, schedule, iv=None):
+    """Decrypt each block of 'data' [bytes-like] with 'schedule' [KeySchedule] and return the result [bytes].
+
+    The blocks are decrypted independently (ECB), or chained from 'iv'
+    [bytes] (CBC) if it is given.
+    """
+    return _process(data, schedule, _decrypt_state, iv)
+
+def counter_blocks(nonce, ctrlen, start, count):
+    """Return 'count' CTR counter blocks [bytes]: 'nonce' followed by the
+    'ctrlen'-byte big-endian counter (start + i) mod 2^(8*ctrlen).
+    """
+    modulus = 1 << (8*ctrlen)
+    if start + count > min(modulus, 1 << 64):
+        # Counter wrapping around (or beyond 64 bits): slow path
+        return b"".join([nonce + ((start + i) % modulus).to_bytes(ctrlen, "big")
+                         for i in range(count)])
+    blocks = np.zeros((count, 16), dtype=np.uint8)
+    blocks[:, :len(nonce)] = np.frombuffer(nonce, dtype=np.uint8)
+    width = min(ctrlen, 8)
+    # Offsets added to 'start' so that no value reaches 2^64, even when
+    # start + count is exactly 2^64
+    ctrs = (np.uint64(start) + np.arange(count, dtype=np.uint64)).astype(">u8")
+    blocks[:, 16-width:] = ctrs.view(np.uint8).reshape(-1, 8)[:, 8-width:]
+    return blocks.tobytes()
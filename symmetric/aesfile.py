@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import mmap
+import os
+import string
+from contextlib import contextmanager
+
+from util.error import AESError
+
+# Default number of bytes processed at once
+_chunk = 1 << 20
+# Characters ignored in hex input (line wrapping)
+_whitespace = string.whitespace.encode()
+
+@contextmanager
+def _map(f):
+    """Memory-map the whole file 'f' for reading (empty files are mapped to b"")."""
+    if os.fstat(f.fileno()).st_size == 0:
+        yield b""
+        return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        yield data
+
+def _hex_size(data):
+    """Return the size [int] of the hex 'data' [bytes-like] without trailing whitespaces."""
+    size = len(data)
+    while size and data[size-1:size].isspace():
+        size -= 1
+    return size
+
+def _unhex(part, nibble):
+    """Decode the hex 'part' [bytes], which may contain whitespaces, after the
+    leftover 'nibble' [bytes] of the previous part.
+
+    Output:
+    data [bytes] -- decoded bytes
+    nibble [bytes] -- odd hex digit to carry into the next part (or b"")
+    """
+    digits = nibble + part.translate(None, _whitespace)
+    cut = len(digits) & ~1
+    return bytes.fromhex(digits[:cut].decode()), digits[cut:]
+
+# -------------------------------------------------------------------------- #
+
+def encrypt_file(aes, src, dst, hexout=False, chunk=_chunk, progress=None):
+    """Encrypt the file 'src' into the file 'dst' in bounded memory.
+
+    Keyword arguments:
+    aes [AES] -- cipher
+    src [string] -- plaintext file path (memory-mapped)
+    dst [string] -- ciphertext file path
+    hexout [bool] -- write the ciphertext as a hex string (default False)
+    chunk [int] -- number of bytes processed at once (default 1 MB)
+    progress [function] -- called as progress(done, total) after each chunk (default None)
+    Output:
+    size [int] -- number of bytes written
+    """
+    written = 0
+    with open(src, "rb") as fin, open(dst, "wb") as fout, _map(fin) as data:
+        ctx = aes.encryptor()
+        total = len(data)
+        for offset in range(0, total, chunk):
+            written += _write(fout, ctx.update(data[offset:offset+chunk]), hexout)
+            if progress:
+                progress(min(offset + chunk, total), total)
+        written += _write(fout, ctx.finalize(), hexout)
+    return written
+
+def decrypt_file(aes, src, dst, hexin=False, chunk=_chunk, progress=None):
+    """Decrypt the file 'src' into the file 'dst' in bounded memory.
+
+    Keyword arguments:
+    aes [AES] -- cipher
+    src [string] -- ciphertext file path (memory-mapped)
+    dst [string] -- plaintext file path
+    hexin [bool] -- the ciphertext is stored as a hex string, possibly
+        wrapped over several lines (default False)
+    chunk [int] -- number of ciphertext bytes processed at once (default 1 MB)
+    progress [function] -- called as progress(done, total) after each chunk (default None)
+    Output:
+    size [int] -- number of bytes written
+    """
+    written = 0
+    step = 2*chunk if hexin else chunk
+    with open(src, "rb") as fin, open(dst, "wb") as fout, _map(fin) as data:
+        ctx = aes.decryptor()
+        total = _hex_size(data) if hexin else len(data)
+        nibble = b""
+        for offset in range(0, total, step):
+            part = data[offset:min(offset+step, total)]
+            if hexin:
+                # A chunk boundary may split a hex pair
+                part, nibble = _unhex(part, nibble)
+            written += _write(fout, ctx.update(part))
+            if progress:
+                progress(min(offset + step, total), total)
+        if nibble:
+            raise AESError("Odd number of hex digits in the ciphertext")
+        written += _write(fout, ctx.finalize())
+    return written
+
+def _write(f, data, hexout=False):
+    """Write 'data' [bytes] (hex encoded if 'hexout') into 'f' and return the number of bytes written."""
+    if hexout:
+        data = data.hex().encode()
+    f.write(data)
+    return len(data)
@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 
+import struct
+from collections import OrderedDict, namedtuple
+
 import util.gf28 as gf28
 from util.convert import str_to_hexarray
+from util.error import AESError
 
 # AES S-Box
 _sbox = [0x63, 0x7c, 0x77, 0x7b, 0xf2, 0x6b, 0x6f, 0xc5, 0x30, 0x01, 0x67,
@@ -54,19 +58,55 @@ _invsbox = [0x52, 0x09, 0x6a, 0xd5, 0x30, 0x36, 0xa5, 0x38, 0xbf, 0x40, 0xa3,
             0x04, 0x7e, 0xba, 0x77, 0xd6, 0x26, 0xe1, 0x69, 0x14, 0x63, 0x55,
             0x21, 0x0c, 0x7d]
 
-def _initialize_sbox():
-    """Generate AES S-Box and inverse S-Box."""
-    global _sbox, _invsbox
-    _sbox = [0 for i in range(256)]
-    _invsbox = [0 for i in range(256)]
+def make_sboxes(field=None, constant=0x63):
+    """Build an S-Box and its inverse from the multiplicative inverse in a GF(2^8) field.
+
+    Keyword arguments:
+    field [GF2n] -- field of degree 8 (default the AES field, polynomial 0x11B)
+    constant [int] -- constant added by the affine transformation (default 0x63)
+    Output:
+    sbox [List<int>] -- S-Box
+    invsbox [List<int>] -- inverse S-Box
+    """
+    if field is not None and field.n != 8:
+        raise AESError("S-Box field must be of degree 8")
+    invert = gf28.invert if field is None else field.invert
+    sbox = [0 for i in range(256)]
+    invsbox = [0 for i in range(256)]
     for i in range(256):
-        n = gf28.invert(i)
+        n = invert(i)
         svalue = 0
         for _ in range(5):
             svalue ^= n
             n = ((n << 1) | (n >> 7)) & 0xff
-        _sbox[i] = svalue ^ 0x63
-        _invsbox[svalue ^ 0x63] = i
+        sbox[i] = svalue ^ constant
+        invsbox[svalue ^ constant] = i
+    return sbox, invsbox
+
+def set_sbox(sbox):
+    """Replace the AES S-Box by 'sbox' [List<int>] (a permutation of 0..255).
+
+    The T-tables are rebuilt, the NumPy tables and the key schedule cache are
+    reset; AES objects created before keep their key schedules. Only SubBytes
+    changes: MixColumns and the key schedule constants stay in the AES field
+    (polynomial 0x11B), even for an S-Box built with make_sboxes(field).
+    """
+    global _sbox, _invsbox
+    if sorted(sbox) != list(range(256)):
+        raise AESError("S-Box must be a permutation of 0..255")
+    _sbox = list(sbox)
+    _invsbox = [0 for i in range(256)]
+    for i, s in enumerate(_sbox):
+        _invsbox[s] = i
+    _gen_ttables()
+    clear_schedule_cache()
+    from symmetric import aesbatch
+    aesbatch.clear_tables()
+
+def _initialize_sbox(field=None, constant=0x63):
+    """Generate AES S-Box and inverse S-Box (optionally from a custom field)."""
+    global _sbox, _invsbox
+    _sbox, _invsbox = make_sboxes(field, constant)
 
 # -------------------------------------------------------------------------- #
 
@@ -130,6 +170,13 @@ def expand_key(key):
 
 # -------------------------------------------------------------------------- #
 
+def get_subkey(expanded_key, rnd):
+    """Extract the 4x4 subkey [List<List<int>>] of round 'rnd' from 'expanded_key'."""
+    offset = 16*rnd
+    return [expanded_key[offset+i:offset+16:4] for i in range(4)]
+
+# -------------------------------------------------------------------------- #
+
 _mds = [[2, 3, 1, 1], [1, 2, 3, 1], [1, 1, 2, 3], [3, 1, 1, 2]]
 _invmds = [[14, 11, 13, 9], [9, 14, 11, 13], [13, 9, 14, 11], [11, 13, 9, 14]]
 
@@ -142,13 +189,14 @@ class AES_Matrix:
 
     def _get_subkey(self, expanded_key, rnd):
         """Extract subkey for the chosen round from expanded_key."""
-        offset = 16*rnd
-        subkey = [expanded_key[offset+i:offset+16:4] for i in range(self.rows)]
-        return subkey
+        return get_subkey(expanded_key, rnd)
 
     def add_roundkey(self, expanded_key, rnd):
         """Xor self.state with the correct subkey of expanded_key."""
-        rkey = self._get_subkey(expanded_key, rnd)
+        self.add_subkey(self._get_subkey(expanded_key, rnd))
+
+    def add_subkey(self, rkey):
+        """Xor self.state with the 4x4 round key 'rkey' [List<List<int>>]."""
         for r in range(self.rows):
             for c in range(self.cols):
                 self.state[r][c] ^= rkey[r][c]
@@ -183,3 +231,195 @@ class AES_Matrix:
             tmp = self.state[r][self.cols-r:]
             self.state[r][r:] = self.state[r][:self.cols-r]
             self.state[r][:r] = tmp
+
+# -------------------------------------------------------------------------- #
+
+_block = struct.Struct(">4I")
+_te = None
+_td = None
+
+def _rotr(word, n):
+    """Right rotate the 32-bit 'word' [int] by 'n' bits."""
+    return ((word >> n) | (word << (32 - n))) & 0xffffffff
+
+def _gen_ttables():
+    """Generate AES encryption/decryption lookup tables (T-tables).
+
+    Each entry fuses SubBytes and MixColumns for one byte of a column, the
+    three other tables being byte rotations of the first one.
+    """
+    global _te, _td
+    te0 = [0 for i in range(256)]
+    td0 = [0 for i in range(256)]
+    for x in range(256):
+        s = _sbox[x]
+        te0[x] = (gf28.multiply(s, 2) << 24) | (s << 16) | (s << 8) | gf28.multiply(s, 3)
+        s = _invsbox[x]
+        td0[x] = (gf28.multiply(s, 14) << 24) | (gf28.multiply(s, 9) << 16) \
+                 | (gf28.multiply(s, 13) << 8) | gf28.multiply(s, 11)
+    _te = [te0] + [[_rotr(w, 8*k) for w in te0] for k in range(1, 4)]
+    _td = [td0] + [[_rotr(w, 8*k) for w in td0] for k in range(1, 4)]
+
+def ttable_keys(expanded_key):
+    """Convert 'expanded_key' [List<int>] into encryption and decryption round-key words.
+
+    Output:
+    ekeys [List<int>] -- round-key words (4 per round) for ttable_encrypt
+    dkeys [List<int>] -- round-key words (4 per round) for ttable_decrypt
+        (equivalent inverse cipher: reversed and InvMixColumns'ed)
+    """
+    if not _te:
+        _gen_ttables()
+    ekeys = [(expanded_key[i] << 24) | (expanded_key[i+1] << 16)
+             | (expanded_key[i+2] << 8) | expanded_key[i+3]
+             for i in range(0, len(expanded_key), 4)]
+    rounds = len(ekeys)//4 - 1
+    td0, td1, td2, td3 = _td
+    dkeys = []
+    for rnd in range(rounds, -1, -1):
+        for w in ekeys[4*rnd:4*rnd+4]:
+            if 0 < rnd < rounds:
+                w = td0[_sbox[w >> 24]] ^ td1[_sbox[(w >> 16) & 0xff]] \
+                    ^ td2[_sbox[(w >> 8) & 0xff]] ^ td3[_sbox[w & 0xff]]
+            dkeys.append(w)
+    return ekeys, dkeys
+
+def key_words(key):
+    """Expand 'key' [bytes] directly into the encryption round-key words [List<int>] of ttable_encrypt.
+
+    Equivalent to ttable_keys(expand_key(key))[0] but much cheaper, which
+    matters when a lot of keys are only used once (e.g. key search).
+    """
+    if not _te:
+        _gen_ttables()
+    sbox = _sbox
+    nk = len(key)//4
+    words = list(struct.unpack(">{}I".format(nk), key))
+    for i in range(nk, 4*(nk + 7)):
+        t = words[-1]
+        if i % nk == 0:
+            t = ((sbox[(t >> 16) & 0xff] << 24) | (sbox[(t >> 8) & 0xff] << 16)
+                 | (sbox[t & 0xff] << 8) | sbox[t >> 24]) ^ (_rcon[i//nk] << 24)
+        elif nk > 6 and i % nk == 4:
+            t = (sbox[t >> 24] << 24) | (sbox[(t >> 16) & 0xff] << 16) \
+                | (sbox[(t >> 8) & 0xff] << 8) | sbox[t & 0xff]
+        words.append(words[i-nk] ^ t)
+    return words
+
+def ttable_encrypt(block, ekeys, rounds):
+    """Encrypt a 16-byte 'block' [bytes] with the T-tables and return the ciphertext [bytes]."""
+    te0, te1, te2, te3 = _te
+    sbox = _sbox
+    s0, s1, s2, s3 = _block.unpack(block)
+    s0 ^= ekeys[0]
+    s1 ^= ekeys[1]
+    s2 ^= ekeys[2]
+    s3 ^= ekeys[3]
+    k = 4
+    for _ in range(rounds - 1):
+        t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xff] ^ te2[(s2 >> 8) & 0xff] ^ te3[s3 & 0xff] ^ ekeys[k]
+        t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xff] ^ te2[(s3 >> 8) & 0xff] ^ te3[s0 & 0xff] ^ ekeys[k+1]
+        t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xff] ^ te2[(s0 >> 8) & 0xff] ^ te3[s1 & 0xff] ^ ekeys[k+2]
+        t3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xff] ^ te2[(s1 >> 8) & 0xff] ^ te3[s2 & 0xff] ^ ekeys[k+3]
+        s0, s1, s2, s3 = t0, t1, t2, t3
+        k += 4
+    return _block.pack(
+        ((sbox[s0 >> 24] << 24) | (sbox[(s1 >> 16) & 0xff] << 16)
+         | (sbox[(s2 >> 8) & 0xff] << 8) | sbox[s3 & 0xff]) ^ ekeys[k],
+        ((sbox[s1 >> 24] << 24) | (sbox[(s2 >> 16) & 0xff] << 16)
+         | (sbox[(s3 >> 8) & 0xff] << 8) | sbox[s0 & 0xff]) ^ ekeys[k+1],
+        ((sbox[s2 >> 24] << 24) | (sbox[(s3 >> 16) & 0xff] << 16)
+         | (sbox[(s0 >> 8) & 0xff] << 8) | sbox[s1 & 0xff]) ^ ekeys[k+2],
+        ((sbox[s3 >> 24] << 24) | (sbox[(s0 >> 16) & 0xff] << 16)
+         | (sbox[(s1 >> 8) & 0xff] << 8) | sbox[s2 & 0xff]) ^ ekeys[k+3])
+
+def ttable_decrypt(block, dkeys, rounds):
+    """Decrypt a 16-byte 'block' [bytes] with the T-tables and return the plaintext [bytes]."""
+    td0, td1, td2, td3 = _td
+    invsbox = _invsbox
+    s0, s1, s2, s3 = _block.unpack(block)
+    s0 ^= dkeys[0]
+    s1 ^= dkeys[1]
+    s2 ^= dkeys[2]
+    s3 ^= dkeys[3]
+    k = 4
+    for _ in range(rounds - 1):
+        t0 = td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xff] ^ td2[(s2 >> 8) & 0xff] ^ td3[s1 & 0xff] ^ dkeys[k]
+        t1 = td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xff] ^ td2[(s3 >> 8) & 0xff] ^ td3[s2 & 0xff] ^ dkeys[k+1]
+        t2 = td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xff] ^ td2[(s0 >> 8) & 0xff] ^ td3[s3 & 0xff] ^ dkeys[k+2]
+        t3 = td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xff] ^ td2[(s1 >> 8) & 0xff] ^ td3[s0 & 0xff] ^ dkeys[k+3]
+        s0, s1, s2, s3 = t0, t1, t2, t3
+        k += 4
+    return _block.pack(
+        ((invsbox[s0 >> 24] << 24) | (invsbox[(s3 >> 16) & 0xff] << 16)
+         | (invsbox[(s2 >> 8) & 0xff] << 8) | invsbox[s1 & 0xff]) ^ dkeys[k],
+        ((invsbox[s1 >> 24] << 24) | (invsbox[(s0 >> 16) & 0xff] << 16)
+         | (invsbox[(s3 >> 8) & 0xff] << 8) | invsbox[s2 & 0xff]) ^ dkeys[k+1],
+        ((invsbox[s2 >> 24] << 24) | (invsbox[(s1 >> 16) & 0xff] << 16)
+         | (invsbox[(s0 >> 8) & 0xff] << 8) | invsbox[s3 & 0xff]) ^ dkeys[k+2],
+        ((invsbox[s3 >> 24] << 24) | (invsbox[(s2 >> 16) & 0xff] << 16)
+         | (invsbox[(s1 >> 8) & 0xff] << 8) | invsbox[s0 & 0xff]) ^ dkeys[k+3])
+
+# -------------------------------------------------------------------------- #
+
+class KeySchedule:
+    """Expanded AES key, computed once and stored in every format used by the engines.
+
+    Keyword arguments:
+    key [bytes] -- symmetric key (16, 24 or 32 bytes)
+    """
+    def __init__(self, key):
+        self.key = bytes(key)
+        self.expanded = expand_key(self.key)
+        self.rounds = len(self.expanded)//16 - 1
+        self.subkeys = [get_subkey(self.expanded, r) for r in range(self.rounds + 1)]
+        self.ekeys, self.dkeys = ttable_keys(self.expanded)
+
+    def __repr__(self):
+        return "KeySchedule({})".format(self.key)
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+_schedules = OrderedDict()
+_schedules_maxsize = 128
+_schedules_hits = 0
+_schedules_misses = 0
+
+def get_schedule(key):
+    """Return the KeySchedule of 'key' [bytes], using the process-wide LRU cache."""
+    global _schedules_hits, _schedules_misses
+    key = bytes(key)
+    try:
+        schedule = _schedules[key]
+    except KeyError:
+        _schedules_misses += 1
+        schedule = KeySchedule(key)
+        if _schedules_maxsize > 0:
+            _schedules[key] = schedule
+            if len(_schedules) > _schedules_maxsize:
+                _schedules.popitem(last=False)
+        return schedule
+    _schedules_hits += 1
+    _schedules.move_to_end(key)
+    return schedule
+
+def schedule_cache_info():
+    """Return the key schedule cache statistics [CacheInfo]."""
+    return CacheInfo(_schedules_hits, _schedules_misses, _schedules_maxsize, len(_schedules))
+
+def set_schedule_cache_size(maxsize):
+    """Set the maximum number of cached key schedules (0 disables the cache)."""
+    global _schedules_maxsize
+    if maxsize < 0:
+        raise AESError("Cache size must be positive")
+    _schedules_maxsize = maxsize
+    while len(_schedules) > _schedules_maxsize:
+        _schedules.popitem(last=False)
+
+def clear_schedule_cache():
+    """Empty the key schedule cache and reset its statistics."""
+    global _schedules_hits, _schedules_misses
+    _schedules.clear()
+    _schedules_hits = 0
+    _schedules_misses = 0
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+import os
+from socket import create_connection
+
+from symmetric.oraclestats import OracleStats
+from util.error import ECBOracleError
+
+# Maximum block size tried during detection
+_max_block = 64
+
+class SocketOracle:
+    """ECB encryption oracle reached through a TCP service.
+
+    Each query sends the hex encoded input followed by a newline and reads the
+    hex encoded ciphertext from the last word of the answer line (prompts
+    preceding it are ignored).
+
+    Keyword arguments:
+    host [dictionnary] -- oracle info (hostname and port)
+    timeout [float] -- socket timeout in seconds (default 10)
+    """
+    def __init__(self, host, timeout=10):
+        self.host = host
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+
+    def __repr__(self):
+        return "SocketOracle({}:{})".format(self.host["hostname"], self.host["port"])
+
+    def __call__(self, data):
+        if self._sock is None:
+            self._sock = create_connection((self.host["hostname"], self.host["port"]), self.timeout)
+            self._file = self._sock.makefile("rb")
+        self._sock.sendall(data.hex().encode() + b"\n")
+        while True:
+            line = self._file.readline()
+            if not line:
+                raise ECBOracleError("Connection closed by the oracle")
+            words = line.split()
+            try:
+                return bytes.fromhex(words[-1].decode())
+            except (IndexError, ValueError):
+                continue
+
+    def close(self):
+        """Close the connection to the oracle."""
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = self._file = None
+
+# -------------------------------------------------------------------------- #
+
+class ECBOracleAttack:
+    """Byte-at-a-time decryption of the secret appended by an ECB encryption oracle.
+
+    The oracle returns ECB(prefix || data || secret) for any 'data', 'prefix'
+    being an unknown but constant string. The 256 candidates of a position are
+    encrypted at once by sending them as consecutive blocks of a single query,
+    and the resulting dictionaries are cached by 15-byte window.
+
+    Keyword arguments:
+    oracle [function] -- encryption oracle, oracle(data [bytes]) -> ciphertext [bytes]
+    batch [int] -- number of candidate blocks sent per query, to be lowered
+        when the oracle limits the input size (default 256)
+    stats [OracleStats] -- query instrumentation (default OracleStats())
+    """
+    def __init__(self, oracle, batch=256, stats=None):
+        if not 1 <= batch <= 256:
+            raise ECBOracleError("Batch size must be between 1 and 256")
+        self.oracle = oracle
+        self.batch = batch
+        self.queries = 0
+        self.stats = stats if stats is not None else OracleStats()
+        self.block_size = None
+        self.prefix_len = None
+        self.secret_len = None
+        self._dicts = {}
+        self._targets = {}
+        self.cache_hits = 0
+
+    def __repr__(self):
+        return "ECBOracleAttack({}, {:d})".format(self.oracle, self.batch)
+
+    def query(self, data):
+        """Return the oracle ciphertext [bytes] of 'data' [bytes] and count the query."""
+        self.queries += 1
+        self.stats.wait()
+        start = self.stats.clock()
+        cipher = self.oracle(data)
+        self.stats.query(1, self.stats.clock() - start)
+        return cipher
+
+    def run(self):
+        """Recover and return the secret [bytes]."""
+        if self.block_size is None:
+            self.detect()
+        secret = b""
+        # The secret length is known from detect(), the padding is never attacked
+        while len(secret) < self.secret_len:
+            byte = self._next_byte(secret)
+            if byte is None:
+                raise ECBOracleError("Unable to recover the byte {:d} of the secret".format(len(secret)))
+            secret += byte
+            self.stats.recover()
+        return secret
+
+    # ---------------------------------------------------------------------- #
+
+    def detect(self):
+        """Detect the block size, the prefix length and the secret length (ECB mode required)."""
+        base_cipher = self.query(b"")
+        base = len(base_cipher)
+        for size in range(1, _max_block + 1):
+            length = len(self.query(b"\x00"*size))
+            if length != base:
+                self.block_size = length - base
+                break
+        else:
+            raise ECBOracleError("Unable to detect the block size")
+        bs = self.block_size
+        # Two identical random blocks are only encrypted identically when
+        # aligned, which gives the prefix length (repetitions already present
+        # without any input come from the prefix and are skipped)
+        known = set(base_cipher[i:i+bs] for i in range(0, len(base_cipher), bs))
+        rand = os.urandom(bs)
+        for fill in range(bs):
+            cipher = self.query(os.urandom(fill) + 2*rand)
+            blocks = [cipher[i:i+bs] for i in range(0, len(cipher), bs)]
+            idx = next((i for i in range(len(blocks) - 1)
+                        if blocks[i] == blocks[i+1] and blocks[i] not in known), None)
+            if idx is not None:
+                self.prefix_len = bs*idx - fill
+                break
+        else:
+            raise ECBOracleError("No repeated blocks, the oracle does not use ECB mode")
+        # Input size making the ciphertext grow (padding always added)
+        self.secret_len = base - self.prefix_len - size
+
+    def _align(self):
+        """Return the number of bytes [int] aligning the input on a block boundary."""
+        return -self.prefix_len % self.block_size
+
+    def _next_byte(self, secret):
+        """Return the secret byte [bytes] following 'secret', or None if no candidate matches."""
+        bs = self.block_size
+        fill = bs - 1 - len(secret) % bs
+        if fill not in self._targets:
+            self._targets[fill] = self.query(b"A"*(self._align() + fill))
+        cipher = self._targets[fill]
+        start = self.prefix_len + self._align() + bs*(len(secret)//bs)
+        target = cipher[start:start+bs]
+        if len(target) < bs:
+            return None
+        window = (b"A"*(bs - 1) + secret)[-(bs - 1):]
+        byte = self._dictionary(window).get(target)
+        return None if byte is None else bytes([byte])
+
+    def _dictionary(self, window):
+        """Return the {ciphertext block: last byte} mapping [dict] of 'window' + each byte."""
+        if window in self._dicts:
+            self.cache_hits += 1
+            return self._dicts[window]
+        bs = self.block_size
+        align = self._align()
+        start = self.prefix_len + align
+        table = {}
+        for first in range(0, 256, self.batch):
+            values = range(first, min(first + self.batch, 256))
+            cipher = self.query(b"A"*align + b"".join(window + bytes([c]) for c in values))
+            for i, c in enumerate(values):
+                table[cipher[start+bs*i:start+bs*(i+1)]] = c
+        self._dicts[window] = table
+        return table
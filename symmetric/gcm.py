@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+import hmac
+
+from symmetric.aes import AES
+from util.blockcipher import Mode, Padding
+from util.error import GCMError
+
+# GF(2^128) reduction constant (x^128 + x^7 + x^2 + x + 1, bit-reflected)
+_R = 0xe1 << 120
+
+def gf128_multiply(x, y):
+    """Multiply x and y [int] in GCM's GF(2^128) (bitwise reference implementation)."""
+    res = 0
+    for i in range(127, -1, -1):
+        if (y >> i) & 1:
+            res ^= x
+        x = (x >> 1) ^ _R if x & 1 else x >> 1
+    return res
+
+# -------------------------------------------------------------------------- #
+
+class GHash:
+    """GHASH universal hash with per-key multiplication tables.
+
+    H is multiplied by every 'bits'-bit chunk of a block beforehand, so that a
+    multiplication only costs 128/bits table lookups and xors.
+
+    Keyword arguments:
+    h [bytes] -- hash subkey (AES encryption of the zero block)
+    bits [int] -- table width, 4 (32 tables of 16 entries) or 8 (16 tables of
+        256 entries) (default 8)
+    """
+    def __init__(self, h, bits=8):
+        if bits not in (4, 8):
+            raise GCMError("Table width must be 4 or 8 bits")
+        self.bits = bits
+        self._tables = _gen_tables(int.from_bytes(h, "big"), bits)
+        self._shifts = [128 - bits*(j + 1) for j in range(128//bits)]
+        self._mask = (1 << bits) - 1
+        self._buffer = b""
+        self.value = 0
+
+    def multiply(self, x):
+        """Return x*H [int] in GF(2^128)."""
+        res = 0
+        mask = self._mask
+        for table, shift in zip(self._tables, self._shifts):
+            res ^= table[(x >> shift) & mask]
+        return res
+
+    def update(self, data):
+        """Absorb 'data' [bytes]; an incomplete last block is kept until pad()."""
+        data = self._buffer + bytes(data)
+        end = len(data) - len(data)%16
+        value = self.value
+        multiply = self.multiply
+        for offset in range(0, end, 16):
+            value = multiply(value ^ int.from_bytes(data[offset:offset+16], "big"))
+        self.value = value
+        self._buffer = data[end:]
+
+    def pad(self):
+        """Absorb the buffered incomplete block, padded with zeros."""
+        if self._buffer:
+            buf = self._buffer
+            self._buffer = b""
+            self.update(buf + bytes(16 - len(buf)))
+
+    def digest(self):
+        """Return the current GHASH value [bytes] (after padding)."""
+        self.pad()
+        return self.value.to_bytes(16, "big")
+
+def _gen_tables(h, bits):
+    """Generate the GHASH multiplication tables of 'h' [int]."""
+    # hx[i] = H * x^i
+    hx = []
+    for _ in range(128):
+        hx.append(h)
+        h = (h >> 1) ^ _R if h & 1 else h >> 1
+    tables = []
+    for j in range(128//bits):
+        table = [0 for i in range(1 << bits)]
+        for b in range(1, 1 << bits):
+            low = b & -b
+            table[b] = table[b ^ low] ^ hx[bits*j + bits - low.bit_length()]
+        tables.append(table)
+    return tables
+
+# -------------------------------------------------------------------------- #
+
+class GCM:
+    """AES-GCM authenticated encryption (cf. NIST SP 800-38D).
+
+    Additional data is fed with update() before any encrypt()/decrypt() call,
+    both can be called several times with chunks of any size.
+
+    Keyword arguments:
+    key [bytes] -- symmetric key (16, 24 or 32 bytes)
+    nonce [bytes] -- nonce/IV (any non-empty size, 12 bytes recommended)
+    tag_len [int] -- authentication tag size in bytes, 4 to 16 (default 16)
+    bits [int] -- GHASH table width, 4 or 8 (default 8)
+    """
+    def __init__(self, key, nonce, tag_len=16, bits=8):
+        if not nonce:
+            raise GCMError("Nonce must not be empty")
+        if not 4 <= tag_len <= 16:
+            raise GCMError("Tag length must be between 4 and 16 bytes")
+        self.key = key
+        self.nonce = nonce
+        self.tag_len = tag_len
+        block = AES(key, Mode.ECB, Padding.NONE)
+        self._ghash = GHash(block.encrypt_bytes(bytes(16)), bits)
+        if len(nonce) == 12:
+            j0 = nonce + b"\x00\x00\x00\x01"
+        else:
+            ghash = GHash(block.encrypt_bytes(bytes(16)), bits)
+            ghash.update(nonce)
+            ghash.pad()
+            ghash.update(bytes(8) + (8*len(nonce)).to_bytes(8, "big"))
+            j0 = ghash.digest()
+        self._tagmask = block.encrypt_bytes(j0)
+        self._ctr = AES(key, Mode.CTR, iv=j0[:12], counter=int.from_bytes(j0[12:], "big") + 1)
+        self._aadlen = 0
+        self._msglen = 0
+        self._payload = False
+        self._done = False
+
+    def __repr__(self):
+        return "GCM({}, {}, {:d})".format(self.key, self.nonce, self.tag_len)
+
+    def update(self, aad):
+        """Authenticate the additional data 'aad' [bytes]."""
+        if self._payload or self._done:
+            raise GCMError("Additional data must be given before the payload")
+        self._ghash.update(aad)
+        self._aadlen += len(aad)
+
+    def encrypt(self, plain):
+        """Encrypt 'plain' [bytes] and return the corresponding ciphertext [bytes]."""
+        cipher = self._process(plain)
+        self._ghash.update(cipher)
+        return cipher
+
+    def decrypt(self, cipher):
+        """Decrypt 'cipher' [bytes] and return the corresponding (unverified) plaintext [bytes]."""
+        plain = self._process(cipher)
+        self._ghash.update(cipher)
+        return plain
+
+    def digest(self):
+        """Return the authentication tag [bytes] of the data processed so far (ends the session)."""
+        if not self._done:
+            self._ghash.pad()
+            self._ghash.update((8*self._aadlen).to_bytes(8, "big") + (8*self._msglen).to_bytes(8, "big"))
+            self._tag = bytes(a ^ b for a, b in zip(self._ghash.digest(), self._tagmask))
+            self._done = True
+        return self._tag[:self.tag_len]
+
+    def verify(self, tag):
+        """Check 'tag' [bytes] in constant time, raise GCMError if it does not match."""
+        if not hmac.compare_digest(self.digest(), bytes(tag)):
+            raise GCMError("Invalid authentication tag")
+
+    def encrypt_and_digest(self, plain, aad=b""):
+        """Encrypt 'plain' [bytes] and authenticate it with 'aad' [bytes].
+
+        Output:
+        cipher [bytes] -- ciphertext
+        tag [bytes] -- authentication tag
+        """
+        self.update(aad)
+        cipher = self.encrypt(plain)
+        return cipher, self.digest()
+
+    def decrypt_and_verify(self, cipher, tag, aad=b""):
+        """Decrypt 'cipher' [bytes], check 'tag' [bytes] against 'aad' [bytes] and return the plaintext [bytes]."""
+        self.update(aad)
+        plain = self.decrypt(cipher)
+        self.verify(tag)
+        return plain
+
+    def _process(self, data):
+        """Xor 'data' with the CTR keystream at the current payload position."""
+        if self._done:
+            raise GCMError("Session already finalized")
+        if not self._payload:
+            # Additional data is padded to a full block before the payload
+            self._ghash.pad()
+            self._payload = True
+        res = self._ctr.ctr_crypt(data, self._msglen)
+        self._msglen += len(res)
+        return res
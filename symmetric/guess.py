@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""Plaintext models ranking the padding oracle guesses.
+
+A model orders the 256 possible values of a plaintext byte, the most likely
+first, and learns from the bytes recovered during the attack.
+"""
+
+import threading
+
+# Approximate relative frequencies of English text bytes
+_english = {" ": 18.0, "e": 10.0, "t": 7.5, "a": 6.5, "o": 6.0, "i": 5.7, "n": 5.7,
+            "s": 5.3, "h": 5.0, "r": 5.0, "d": 3.4, "l": 3.3, "c": 2.3, "u": 2.3,
+            "m": 2.0, "w": 1.9, "f": 1.8, "g": 1.6, "y": 1.6, "p": 1.5, "b": 1.2,
+            ".": 1.0, ",": 1.0, "v": 0.8, "k": 0.6, "\n": 0.5, "T": 0.4, "I": 0.4,
+            "A": 0.3, "S": 0.3, "'": 0.3, "\"": 0.3, "-": 0.2, "x": 0.15, "j": 0.1,
+            "q": 0.1, "z": 0.07}
+# Weight of the prior against the observed bytes
+_prior_weight = 50.0
+_bigram_weight = 10.0
+
+def _prior():
+    """Return the prior probability [List<float>] of each byte value."""
+    weights = [0.0001 for i in range(256)]
+    for c in range(0x20, 0x7f):
+        weights[c] = 0.05
+    for c in b"0123456789":
+        weights[c] = 0.1
+    for c in b"ABCDEFGHIJKLMNOPQRSTUVWXYZ":
+        weights[c] = 0.12
+    for c in b"\r\t":
+        weights[c] = 0.01
+    for char, freq in _english.items():
+        weights[ord(char)] = freq
+    total = sum(weights)
+    return [w/total for w in weights]
+
+
+class NumericModel:
+    """Guesses in numeric order (no plaintext model)."""
+    def order(self, after=b"", last=False):
+        """Return the 256 byte values [List<int>] in guessing order."""
+        return list(range(256))
+
+    def update(self, byte, after=b""):
+        """Learn that 'byte' [int] was followed by 'after' [bytes]."""
+        pass
+
+
+class GuessModel:
+    """Adaptive plaintext model: printable ASCII and English frequencies first.
+
+    Byte probabilities start from an English text prior and are updated with
+    every recovered byte, along with the frequencies of the byte preceding a
+    given one (bytes are recovered from right to left). In the last block,
+    PKCS7 padding values are tried first.
+
+    Keyword arguments:
+    adaptive [bool] -- learn from the recovered bytes (default True)
+    """
+    def __init__(self, adaptive=True):
+        self.adaptive = adaptive
+        self._prior = _prior()
+        self._rank = {b: i for i, b in enumerate(sorted(range(256), key=lambda b: -self._prior[b]))}
+        self._counts = [0 for i in range(256)]
+        self._total = 0
+        self._bigrams = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "GuessModel({})".format(self.adaptive)
+
+    def order(self, after=b"", last=False):
+        """Return the 256 byte values [List<int>] in guessing order.
+
+        Keyword arguments:
+        after [bytes] -- already recovered bytes following the guessed one in the block
+        last [bool] -- the block is the last one (PKCS7 padding) (default False)
+        """
+        with self._lock:
+            total = self._total
+            probs = [(c + _prior_weight*p)/(total + _prior_weight)
+                     for c, p in zip(self._counts, self._prior)]
+            if after and after[0] in self._bigrams:
+                counts = self._bigrams[after[0]]
+                norm = sum(counts.values()) + _bigram_weight
+                probs = [(counts.get(b, 0) + _bigram_weight*p)/norm for b, p in enumerate(probs)]
+        first = []
+        if last:
+            if not after:
+                first = list(range(1, 17))
+            elif after[-1] <= 16 and len(after) < after[-1]:
+                # Inside the padding, every byte is equal to the last one
+                first = [after[-1]]
+        rest = sorted((b for b in range(256) if b not in first),
+                      key=lambda b: (-probs[b], self._rank[b]))
+        return first + rest
+
+    def update(self, byte, after=b""):
+        """Learn that 'byte' [int] was followed by 'after' [bytes] (padding excluded)."""
+        if not self.adaptive:
+            return
+        with self._lock:
+            self._counts[byte] += 1
+            self._total += 1
+            if after:
+                counts = self._bigrams.setdefault(after[0], {})
+                counts[byte] = counts.get(byte, 0) + 1
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+import hashlib
+import os
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import Event, Value
+
+from symmetric.aesutil import key_words, ttable_encrypt
+from substitution.xor import xorstrings
+from util.blockcipher import Mode
+from util.error import KeySearchError
+from util.parallel import nb_workers
+
+charsets = {"lower": string.ascii_lowercase.encode(),
+            "upper": string.ascii_uppercase.encode(),
+            "digits": string.digits.encode(),
+            "hex": b"0123456789abcdef",
+            "alnum": (string.ascii_letters + string.digits).encode(),
+            "printable": bytes(range(0x20, 0x7f)),
+            "bytes": bytes(range(256))}
+
+# -------------------------------------------------------------------------- #
+
+class MaskSpace:
+    """Key space described by a mask, each wildcard byte taking every value of 'charset'.
+
+    Keyword arguments:
+    mask [bytes] -- key template (e.g. b"YELLOW SUBMA????")
+    charset [bytes] -- possible values of the unknown bytes (default all printable chars)
+    wildcard [bytes] -- placeholder used in the mask (default b"?")
+    """
+    chunk = 1 << 14
+
+    def __init__(self, mask, charset=charsets["printable"], wildcard=b"?"):
+        self.mask = bytes(mask)
+        self.charset = bytes(charset)
+        self.positions = [i for i, c in enumerate(self.mask) if c == wildcard[0]]
+        self.size = len(self.charset)**len(self.positions)
+
+    def __repr__(self):
+        return "MaskSpace({}, {})".format(self.mask, self.charset)
+
+    def candidates(self, start, end):
+        """Yield the candidates number 'start' to 'end'-1 [bytes]."""
+        base = len(self.charset)
+        count = end - start
+        digits = []
+        for _ in self.positions:
+            start, d = divmod(start, base)
+            digits.append(d)
+        key = bytearray(self.mask)
+        for pos, d in zip(self.positions, digits):
+            key[pos] = self.charset[d]
+        for _ in range(count):
+            yield bytes(key)
+            for j, pos in enumerate(self.positions):
+                d = digits[j] + 1
+                if d < base:
+                    digits[j] = d
+                    key[pos] = self.charset[d]
+                    break
+                digits[j] = 0
+                key[pos] = self.charset[0]
+
+
+class WordlistSpace:
+    """Key space read from a wordlist file (one candidate per line).
+
+    The space is sharded by byte offsets: a line belongs to the range
+    containing its first byte.
+
+    Keyword arguments:
+    path [string] -- wordlist path
+    """
+    chunk = 1 << 20
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+
+    def __repr__(self):
+        return "WordlistSpace({})".format(self.path)
+
+    def candidates(self, start, end):
+        """Yield the candidates [bytes] of the lines starting in bytes 'start' to 'end'-1."""
+        with open(self.path, "rb") as f:
+            if start > 0:
+                f.seek(start - 1)
+                f.readline()
+            while f.tell() < end:
+                line = f.readline()
+                if not line:
+                    break
+                yield line.rstrip(b"\r\n")
+
+# -------------------------------------------------------------------------- #
+
+def _md5(candidate):
+    return hashlib.md5(candidate).digest()
+
+def _sha256(candidate):
+    return hashlib.sha256(candidate).digest()
+
+def _zeropad(candidate):
+    return candidate.ljust(16, b"\x00")
+
+# Built-in key derivation hooks (candidate [bytes] -> key [bytes])
+derivations = {"none": None, "md5": _md5, "sha256": _sha256, "zeropad": _zeropad}
+
+# -------------------------------------------------------------------------- #
+
+_stop = None
+_tested = None
+_report = 1024
+
+def _init_worker(stop, tested):
+    """Process pool initializer: share the stop event and the tested counter."""
+    global _stop, _tested
+    _stop = stop
+    _tested = tested
+
+def _search(space, derive, block_in, block_out, start, end):
+    """Test the candidates 'start' to 'end'-1 of 'space'.
+
+    Output:
+    (candidate, key) [(bytes, bytes)] -- matching candidate and derived key, or None
+    """
+    count = 0
+    for candidate in space.candidates(start, end):
+        key = derive(candidate) if derive else candidate
+        count += 1
+        if len(key) in (16, 24, 32) and \
+                ttable_encrypt(block_in, key_words(key), len(key)//4 + 6) == block_out:
+            _add_tested(count)
+            return candidate, key
+        if count == _report:
+            _add_tested(count)
+            count = 0
+            if _stop.is_set():
+                return None
+    _add_tested(count)
+    return None
+
+def _add_tested(count):
+    """Add 'count' to the shared number of tested candidates."""
+    with _tested.get_lock():
+        _tested.value += count
+
+# -------------------------------------------------------------------------- #
+
+class KeySearch:
+    """Known-plaintext AES key search (only the first block is tested).
+
+    Keyword arguments:
+    space [MaskSpace|WordlistSpace] -- key space
+    plain [bytes] -- known plaintext (at least 16 bytes)
+    cipher [bytes] -- corresponding ciphertext (at least 16 bytes)
+    mode [IntEnum.Mode] -- encryption mode (default ECB)
+    iv [bytes] -- initialisation vector (CBC) or nonce (CTR)
+    counter [int] -- initial counter value (CTR only) (default 0)
+    derive [function] -- key derivation hook applied to each candidate, must be
+        picklable when workers > 1 (default None)
+    workers [int] -- number of processes, 0 meaning one per CPU (default 1)
+    """
+    def __init__(self, space, plain, cipher, mode=Mode.ECB, iv=None, counter=0,
+                 derive=None, workers=1):
+        if len(plain) < 16 or len(cipher) < 16:
+            raise KeySearchError("At least one block of plaintext and ciphertext is required")
+        self.space = space
+        self.derive = derive
+        self.workers = nb_workers(workers)
+        if mode == Mode.ECB:
+            self._block_in, self._block_out = bytes(plain[:16]), bytes(cipher[:16])
+        elif mode == Mode.CBC:
+            if iv is None or len(iv) != 16:
+                raise KeySearchError("CBC mode requires a 16-byte IV")
+            self._block_in, self._block_out = xorstrings(plain[:16], iv), bytes(cipher[:16])
+        elif mode == Mode.CTR:
+            if iv is None or len(iv) > 15:
+                raise KeySearchError("CTR mode requires a nonce of at most 15 bytes")
+            iv = bytes(iv)
+            ctrlen = 16 - len(iv)
+            self._block_in = iv + (counter % (1 << (8*ctrlen))).to_bytes(ctrlen, "big")
+            self._block_out = xorstrings(plain[:16], cipher[:16])
+        else:
+            raise KeySearchError("Unsupported mode")
+        self.candidate = None
+        self.tested = 0
+        self.elapsed = 0
+
+    def __repr__(self):
+        return "KeySearch({}, {:d})".format(self.space, self.workers)
+
+    def rate(self):
+        """Return the number of candidates tested per second [float]."""
+        return self.tested/self.elapsed if self.elapsed else 0
+
+    def run(self, progress=None, interval=1.0):
+        """Search the key space and return the matching key [bytes].
+
+        Keyword arguments:
+        progress [function] -- called every 'interval' seconds as
+            progress(tested, done, total, rate) where 'done' and 'total' are in
+            key space units (candidates or wordlist bytes) (default None)
+        interval [float] -- progress reporting interval in seconds (default 1)
+        """
+        stop, tested = Event(), Value("Q", 0)
+        chunk = self.space.chunk
+        ranges = ((start, min(start + chunk, self.space.size))
+                  for start in range(0, self.space.size, chunk))
+        args = (self.space, self.derive, self._block_in, self._block_out)
+        start = time.perf_counter()
+        last = start
+
+        def report(done):
+            nonlocal last
+            now = time.perf_counter()
+            self.tested, self.elapsed = tested.value, now - start
+            if progress and now - last >= interval:
+                last = now
+                progress(self.tested, done, self.space.size, self.rate())
+
+        found = None
+        if self.workers == 1:
+            _init_worker(stop, tested)
+            for begin, end in ranges:
+                found = _search(*args, begin, end)
+                report(end)
+                if found:
+                    break
+        else:
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                     initargs=(stop, tested)) as pool:
+                todo = ranges
+                pending = {}
+                done = 0
+                while True:
+                    while len(pending) < 2*self.workers:
+                        rng = next(todo, None)
+                        if rng is None:
+                            break
+                        pending[pool.submit(_search, *args, *rng)] = rng
+                    if not pending:
+                        break
+                    finished, _ = wait(pending, timeout=interval, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        begin, end = pending.pop(fut)
+                        done += end - begin
+                        found = found or fut.result()
+                    report(done)
+                    if found:
+                        # Stop the running jobs and drop the queued ones
+                        stop.set()
+                        for fut in pending:
+                            fut.cancel()
+                        break
+        report(self.space.size)
+        if not found:
+            raise KeySearchError("Key not found")
+        self.candidate, key = found
+        return key
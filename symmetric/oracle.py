@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+
+"""Padding oracle transports.
+
+Every transport answers query(cipher) -> bool (True if the padding is valid)
+and query_many(ciphers) -> List<bool>, which sends a batch of queries with
+as little per-query overhead as the transport allows. Transports are
+single-connection objects, the attack pools several of them.
+"""
+
+import base64
+import subprocess
+from abc import ABC, abstractmethod
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from socket import create_connection, IPPROTO_TCP, TCP_NODELAY
+from urllib.parse import urlsplit, urlencode
+
+from util.error import PadOracleError
+
+# Maximum number of requests written before reading the answers
+_window = 64
+
+def _encoder(encoding):
+    """Return the ciphertext encoding function [function] named 'encoding'."""
+    if encoding == "hex":
+        return lambda data: data.hex().encode()
+    if encoding == "base64":
+        return base64.b64encode
+    if encoding == "raw":
+        return bytes
+    raise PadOracleError("Unknown encoding '{}'".format(encoding))
+
+
+class Oracle(ABC):
+    """Padding oracle transport base class (query() must be implemented)."""
+    @abstractmethod
+    def query(self, cipher):
+        """Return True if the padding of 'cipher' [bytes] is valid."""
+
+    def query_many(self, ciphers):
+        """Return the padding validity [List<bool>] of each of 'ciphers'."""
+        return [self.query(c) for c in ciphers]
+
+    def close(self):
+        """Release the transport resources."""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# -------------------------------------------------------------------------- #
+
+class CallableOracle(Oracle):
+    """In-process oracle.
+
+    Keyword arguments:
+    fcn [function] -- fcn(cipher [bytes]) -> padding valid [bool]
+    many [function] -- optional batch version, many(ciphers) -> List<bool> (default None)
+    """
+    def __init__(self, fcn, many=None):
+        self.fcn = fcn
+        self.many = many
+
+    def __repr__(self):
+        return "CallableOracle({})".format(self.fcn)
+
+    def query(self, cipher):
+        return bool(self.fcn(cipher))
+
+    def query_many(self, ciphers):
+        if self.many is not None:
+            return [bool(v) for v in self.many(ciphers)]
+        fcn = self.fcn
+        return [bool(fcn(c)) for c in ciphers]
+
+
+class TCPOracle(Oracle):
+    """Raw TCP oracle with configurable framing.
+
+    With the "line" framing, a query waits for 'prompt' (if any), sends the
+    encoded ciphertext followed by 'newline' and reads the answer up to
+    'terminator'; query_many() writes a batch of requests before reading the
+    answers (pipelining).
+
+    The "recv" framing is the protocol of the original padding_oracle(): a
+    greeting message at connection, then a message before each request (read
+    up to 'prompt' if given, else with a single recv()), the ciphertext sent
+    without 'newline' and the answer read with a single recv(). Queries are
+    sent one at a time.
+
+    The padding is invalid when 'error' appears in the answer.
+
+    Keyword arguments:
+    hostname [string] -- oracle address
+    port [int] -- oracle port
+    error [bytes] -- text of an invalid padding answer (default b"Error")
+    prompt [bytes] -- text sent by the oracle before reading a request (default None)
+    terminator [bytes] -- end of an answer (default b"\\n")
+    newline [bytes] -- end of a request (default b"\\n")
+    encoding [string] -- ciphertext encoding: hex, base64 or raw (default hex)
+    timeout [float] -- socket timeout in seconds (default 10)
+    framing [string] -- "line" or "recv" (default "line")
+    """
+    def __init__(self, hostname, port, error=b"Error", prompt=None, terminator=b"\n",
+                 newline=b"\n", encoding="hex", timeout=10, framing="line"):
+        if framing not in ["line", "recv"]:
+            raise PadOracleError("Unknown framing '{}'".format(framing))
+        self.hostname = hostname
+        self.port = port
+        self.error = error
+        self.prompt = prompt
+        self.terminator = terminator
+        self.newline = newline
+        self.framing = framing
+        self._encode = _encoder(encoding)
+        self._sock = create_connection((hostname, port), timeout)
+        self._sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        self._buffer = b""
+        if framing == "recv" and not prompt:
+            # Greeting (with a prompt, it is skipped by the first query)
+            self._recv()
+
+    def __repr__(self):
+        return "TCPOracle({}:{})".format(self.hostname, self.port)
+
+    def query(self, cipher):
+        return self.query_many([cipher])[0]
+
+    def query_many(self, ciphers):
+        if self.framing == "recv":
+            return [self._query_recv(c) for c in ciphers]
+        res = []
+        for start in range(0, len(ciphers), _window):
+            batch = ciphers[start:start+_window]
+            self._sock.sendall(b"".join(self._encode(c) + self.newline for c in batch))
+            for _ in batch:
+                if self.prompt:
+                    self._read_until(self.prompt)
+                res.append(self.error not in self._read_until(self.terminator))
+        return res
+
+    def _query_recv(self, cipher):
+        """Query 'cipher' with the "recv" framing."""
+        if self.prompt:
+            self._read_until(self.prompt)
+        else:
+            self._recv()
+        self._sock.sendall(self._encode(cipher))
+        answer = self._recv()
+        if self.prompt and self.prompt in answer:
+            # Next prompt received with the answer
+            idx = answer.index(self.prompt)
+            answer, self._buffer = answer[:idx], answer[idx:]
+        return self.error not in answer
+
+    def _recv(self):
+        """Return the buffered data if any, else the data of one recv() [bytes]."""
+        data, self._buffer = self._buffer, b""
+        if not data:
+            data = self._sock.recv(4096)
+            if not data:
+                raise ConnectionError("Connection closed by the oracle")
+        return data
+
+    def _read_until(self, delim):
+        """Return the received data [bytes] up to and including 'delim'."""
+        while delim not in self._buffer:
+            data = self._sock.recv(4096)
+            if not data:
+                raise ConnectionError("Connection closed by the oracle")
+            self._buffer += data
+        idx = self._buffer.index(delim) + len(delim)
+        data, self._buffer = self._buffer[:idx], self._buffer[idx:]
+        return data
+
+    def close(self):
+        self._sock.close()
+
+
+class HTTPOracle(Oracle):
+    """HTTP(S) oracle reusing a keep-alive connection.
+
+    The ciphertext is sent as the 'param' query string parameter (GET) or form
+    field (POST). The padding is invalid when the status is an error (>= 400)
+    or when 'error' appears in the body.
+
+    Keyword arguments:
+    url [string] -- oracle URL
+    param [string] -- parameter name (default "c")
+    method [string] -- GET or POST (default GET)
+    error [bytes] -- text of an invalid padding answer (default None)
+    encoding [string] -- ciphertext encoding: hex or base64 (default hex)
+    headers [dict] -- additional request headers (default None)
+    timeout [float] -- socket timeout in seconds (default 10)
+    """
+    def __init__(self, url, param="c", method="GET", error=None, encoding="hex",
+                 headers=None, timeout=10):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise PadOracleError("Unsupported URL scheme '{}'".format(parts.scheme))
+        self.url = url
+        self.param = param
+        self.method = method.upper()
+        self.error = error
+        self.headers = dict(headers or {})
+        self._encode = _encoder(encoding)
+        self._path = parts.path or "/"
+        self._query = parts.query
+        conn = HTTPSConnection if parts.scheme == "https" else HTTPConnection
+        self._conn = conn(parts.netloc, timeout=timeout)
+
+    def __repr__(self):
+        return "HTTPOracle({})".format(self.url)
+
+    def query(self, cipher):
+        params = urlencode({self.param: self._encode(cipher).decode()})
+        headers = dict(self.headers)
+        if self.method == "GET":
+            path = "{}?{}".format(self._path, "&".join(p for p in [self._query, params] if p))
+            body = None
+        else:
+            path = self._path + ("?" + self._query if self._query else "")
+            body = params
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        try:
+            self._conn.request(self.method, path, body, headers)
+            resp = self._conn.getresponse()
+            data = resp.read()
+        except HTTPException as err:
+            self._conn.close()
+            raise ConnectionError("HTTP error: {}".format(err))
+        if resp.status >= 400:
+            return False
+        return self.error is None or self.error not in data
+
+    def close(self):
+        self._conn.close()
+
+
+class SubprocessOracle(Oracle):
+    """Oracle program talking on its standard input/output (one line per query).
+
+    Keyword arguments:
+    args [List<string>] -- command line
+    error [bytes] -- text of an invalid padding answer (default b"Error")
+    encoding [string] -- ciphertext encoding: hex, base64 or raw (default hex)
+    """
+    def __init__(self, args, error=b"Error", encoding="hex"):
+        self.args = args
+        self.error = error
+        self._encode = _encoder(encoding)
+        self._proc = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def __repr__(self):
+        return "SubprocessOracle({})".format(self.args)
+
+    def query(self, cipher):
+        return self.query_many([cipher])[0]
+
+    def query_many(self, ciphers):
+        res = []
+        for start in range(0, len(ciphers), _window):
+            batch = ciphers[start:start+_window]
+            self._proc.stdin.write(b"".join(self._encode(c) + b"\n" for c in batch))
+            self._proc.stdin.flush()
+            for _ in batch:
+                line = self._proc.stdout.readline()
+                if not line:
+                    raise ConnectionError("Oracle process exited")
+                res.append(self.error not in line)
+        return res
+
+    def close(self):
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        self._proc.stdout.close()
+        self._proc.wait()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+"""Timing and throughput instrumentation of oracle-driven attacks.
+
+An attack reports every batch of queries sent to the oracle (with its
+duration), every connection error and every recovered byte. The statistics
+can be exported as JSON or logged periodically. A sustained increase of the
+query latency (or a burst of connection errors), typical of a rate-limited
+oracle, makes the attack pause between batches until the latency recovers.
+"""
+
+import json
+import sys
+import threading
+import time
+
+# Latency histogram buckets upper bounds, in seconds (1 us to ~67 s)
+_buckets = [2**i/1e6 for i in range(27)]
+# Smoothing factor of the latency moving average
+_alpha = 0.2
+
+def _bucket(latency):
+    """Return the index [int] of the histogram bucket of 'latency' [float]."""
+    for i, bound in enumerate(_buckets):
+        if latency <= bound:
+            return i
+    return len(_buckets)
+
+
+class OracleStats:
+    """Statistics of the queries sent to an oracle, with optional auto-throttling.
+
+    The latency baseline is the median per-query latency of the first
+    'warmup' batches. Afterwards, a moving average higher than 'factor' times
+    the baseline (and than 'floor', so that the jitter of fast local oracles
+    is ignored) is an anomaly: the pause between batches is doubled, from
+    'min_delay' up to 'max_delay'. It is halved when the latency is back to
+    normal.
+
+    Keyword arguments:
+    throttle [bool] -- pause between batches on anomalies (default True)
+    warmup [int] -- batches used for the latency baseline (default 32)
+    factor [float] -- latency increase considered as an anomaly (default 5)
+    floor [float] -- latency in seconds under which nothing is an anomaly (default 0.005)
+    min_delay [float] -- first pause in seconds (default 0.01)
+    max_delay [float] -- longest pause in seconds (default 5)
+    clock [function] -- time source in seconds (default time.perf_counter)
+    """
+    def __init__(self, throttle=True, warmup=32, factor=5.0, floor=0.005, min_delay=0.01,
+                 max_delay=5.0, clock=time.perf_counter):
+        self.throttle = throttle
+        self.warmup = warmup
+        self.factor = factor
+        self.floor = floor
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.start = clock()
+        self.queries = 0
+        self.batches = 0
+        self.errors = 0
+        self.reconnections = 0
+        self.recovered = 0
+        self.histogram = [0 for i in range(len(_buckets) + 1)]
+        self.latency_sum = 0.0
+        self.latency_min = None
+        self.latency_max = 0.0
+        self.timeline = []
+        self.anomalies = []
+        self.baseline = None
+        self.average = None
+        self.delay = 0.0
+        self._warmup = []
+        self._lock = threading.Lock()
+        self._stop = None
+
+    def __repr__(self):
+        return "OracleStats({:d} queries)".format(self.queries)
+
+    def elapsed(self):
+        """Return the time [float] since the creation of the statistics."""
+        return self.clock() - self.start
+
+    def qps(self):
+        """Return the average number of queries per second [float]."""
+        elapsed = self.elapsed()
+        return self.queries/elapsed if elapsed > 0 else 0.0
+
+    # ---------------------------------------------------------------------- #
+
+    def wait(self):
+        """Pause before sending a batch if the oracle is being throttled."""
+        delay = self.delay
+        if delay:
+            time.sleep(delay)
+
+    def query(self, count, seconds):
+        """Record a batch of 'count' [int] queries answered in 'seconds' [float]."""
+        latency = seconds/count if count else seconds
+        with self._lock:
+            self.queries += count
+            self.batches += 1
+            self.histogram[_bucket(latency)] += 1
+            self.latency_sum += latency
+            self.latency_min = latency if self.latency_min is None else min(self.latency_min, latency)
+            self.latency_max = max(self.latency_max, latency)
+            self.average = latency if self.average is None else (1 - _alpha)*self.average + _alpha*latency
+            if self.baseline is None:
+                self._warmup.append(latency)
+                if len(self._warmup) >= self.warmup:
+                    self.baseline = sorted(self._warmup)[len(self._warmup)//2]
+                limit = None
+            else:
+                limit = max(self.factor*self.baseline, self.floor)
+            if limit is not None and self.average > limit:
+                self._slow_down("latency", self.average)
+            elif self.delay and (limit is None or self.average < limit/2):
+                self.delay = self.delay/2 if self.delay/2 >= self.min_delay else 0.0
+
+    def error(self, reconnect=True):
+        """Record a failed query, followed by a reconnection if 'reconnect' [bool]."""
+        with self._lock:
+            self.errors += 1
+            if reconnect:
+                self.reconnections += 1
+            self._slow_down("error", None)
+
+    def recover(self, count=1):
+        """Record 'count' [int] recovered bytes."""
+        with self._lock:
+            self.recovered += count
+            self.timeline.append((round(self.elapsed(), 6), self.recovered))
+
+    def _slow_down(self, reason, latency):
+        """Record an anomaly and double the pause between batches (lock held)."""
+        self.anomalies.append({"time": round(self.elapsed(), 6), "reason": reason,
+                               "latency": latency, "delay": self.delay})
+        if self.throttle:
+            self.delay = min(max(2*self.delay, self.min_delay), self.max_delay)
+
+    # ---------------------------------------------------------------------- #
+
+    def percentile(self, p):
+        """Return the latency bucket bound [float] under which 'p' [float] percent of the batches are."""
+        with self._lock:
+            histogram = list(self.histogram)
+            batches = self.batches
+        if not batches:
+            return 0.0
+        total = 0
+        for i, count in enumerate(histogram):
+            total += count
+            if total >= p*batches/100:
+                return _buckets[i] if i < len(_buckets) else self.latency_max
+        return self.latency_max
+
+    def to_dict(self):
+        """Return the statistics [dict] (latencies in seconds, per query)."""
+        with self._lock:
+            histogram = {"{:g}".format(_buckets[i]) if i < len(_buckets) else "inf": count
+                         for i, count in enumerate(self.histogram) if count}
+            res = {"elapsed": self.elapsed(), "queries": self.queries, "batches": self.batches,
+                   "errors": self.errors, "reconnections": self.reconnections,
+                   "recovered": self.recovered, "delay": self.delay,
+                   "latency": {"min": self.latency_min or 0.0, "max": self.latency_max,
+                               "mean": self.latency_sum/self.batches if self.batches else 0.0,
+                               "baseline": self.baseline, "average": self.average,
+                               "histogram": histogram},
+                   "timeline": list(self.timeline), "anomalies": list(self.anomalies)}
+        res["qps"] = self.queries/res["elapsed"] if res["elapsed"] > 0 else 0.0
+        res["latency"].update({"p50": self.percentile(50), "p90": self.percentile(90),
+                               "p99": self.percentile(99)})
+        return res
+
+    def to_json(self, path=None):
+        """Return the statistics as a JSON string, also written to 'path' [string] if given."""
+        data = json.dumps(self.to_dict(), indent=2)
+        if path:
+            with open(path, "w") as f:
+                f.write(data + "\n")
+        return data
+
+    def summary(self):
+        """Return a one-line summary [string] of the statistics."""
+        return ("{:.1f}s: {:d} queries ({:.1f}/s), {:d} bytes recovered, latency p50 {:.2g}s "
+                "p99 {:.2g}s, {:d} errors, {:d} anomalies, delay {:.2g}s").format(
+                    self.elapsed(), self.queries, self.qps(), self.recovered, self.percentile(50),
+                    self.percentile(99), self.errors, len(self.anomalies), self.delay)
+
+    def start_log(self, interval=10, stream=sys.stderr):
+        """Write summary() to 'stream' every 'interval' [float] seconds until stop_log()."""
+        self.stop_log()
+        self._stop = threading.Event()
+        def log(stop):
+            while not stop.wait(interval):
+                print(self.summary(), file=stream, flush=True)
+        threading.Thread(target=log, args=(self._stop,), daemon=True).start()
+
+    def stop_log(self):
+        """Stop the periodic log started by start_log()."""
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
@@ -1,85 +1,462 @@
 #!/usr/bin/env python3
 
-from socket import socket, AF_INET, SOCK_STREAM
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
 
-from util.convert import hstr_to_ascii, ascii_to_hstr
+from symmetric.guess import GuessModel
+from symmetric.oracle import TCPOracle
+from symmetric.oraclestats import OracleStats
+from util.convert import hstr_to_ascii
 from util.error import PadOracleError
 
+_block = 16
+# Pause (in seconds) before the first retry of a failed query, doubled at each attempt
+_backoff = 0.01
 
 def _split_cipher(cipher):
-    """Split 'cipher' [string] into 16-chars blocks [List<List<int>>]."""
-    cipher = hstr_to_ascii(cipher)
-    if not cipher or len(cipher)%16 != 0:
+    """Split 'cipher' [bytes] into 16-bytes blocks [List<bytes>]."""
+    if not cipher or len(cipher)%_block != 0:
         raise PadOracleError("Cipher size must be a multiple of 16 bytes")
-    clist = [[] for i in range(len(cipher)//16)]
-    for i in range(0, len(cipher), 16):
-        tmp = cipher[i:i+16]
-        for j in range(0, 16):
-            clist[i//16].append(tmp[j])
-    return clist
-
-
-def _merge_cipher(clist):
-    """Flatten 'clist' [List<List<int>>] and return the corresponding string [bytes]."""
-    cipher = [e for sublist in clist for e in sublist]
-    return bytes(cipher)
-
-
-def _next_block(clist, plain, n, offset, sock, err):
-    """Compute 'plain' for the 'n'-th block."""
-    for i in range(16-offset):
-        pad = offset+1+i
-        clist_tmp = [[e for e in sublist] for sublist in clist]
-        for j in range(pad-1):
-            clist_tmp[-2-n][-1-j] = pad ^ plain[-1-n][-1-j] ^ clist[-2-n][-1-j]
-
-        for j in range(256):
-
-            data = sock.recv(1024)
-            clist_tmp[-2-n][-pad] = j
-            sock.sendall(ascii_to_hstr(_merge_cipher(clist_tmp)))
-            data = sock.recv(1024)
-            if err not in data:
-                plain[-1-n][-pad] = pad ^ clist_tmp[-2-n][-pad] ^ clist[-2-n][-pad]
+    if len(cipher) < 2*_block:
+        raise PadOracleError("Cipher must contain the IV and at least one block")
+    return [cipher[i:i+_block] for i in range(0, len(cipher), _block)]
+
+
+def _unpad(plain):
+    """Remove the PKCS7 padding of 'plain' [bytes]."""
+    pad = plain[-1] if plain else 0
+    if not 1 <= pad <= _block or plain[-pad:] != bytes([pad])*pad:
+        raise PadOracleError("Invalid padding in the decrypted plaintext")
+    return plain[:-pad]
+
+# -------------------------------------------------------------------------- #
+
+class ConnectionPool:
+    """Pool of at most 'size' oracle connections, created on demand.
+
+    Keyword arguments:
+    connect [function] -- connection factory, connect() -> Oracle (cf. symmetric.oracle)
+    size [int] -- maximum number of simultaneous connections
+    stats [OracleStats] -- where failed connections are recorded (default OracleStats())
+    """
+    def __init__(self, connect, size, stats=None):
+        self.connect = connect
+        self.size = size
+        self.stats = stats if stats is not None else OracleStats()
+        self._idle = Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Return an idle connection, opening a new one if the pool is not full."""
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if not create:
+            return self._idle.get()
+        try:
+            return self.connect()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def release(self, conn):
+        """Give back a working connection."""
+        self._idle.put(conn)
+
+    @property
+    def reconnections(self):
+        """Number of failed connections replaced [int] (cf. OracleStats.reconnections)."""
+        return self.stats.reconnections
+
+    def discard(self, conn, failed=True, reconnect=True):
+        """Close a connection, a new one will be opened when needed.
+
+        The failure of the query is recorded in the statistics if 'failed'
+        [bool], followed by a reconnection if 'reconnect' [bool] (the only
+        place where they are).
+        """
+        with self._lock:
+            self._created -= 1
+        if failed:
+            self.stats.error(reconnect)
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def close(self):
+        """Close all idle connections."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
                 break
-    return plain
+            with self._lock:
+                self._created -= 1
+            conn.close()
+
+# -------------------------------------------------------------------------- #
+
+class Journal:
+    """Persistent record of the oracle answers and of the recovered bytes.
+
+    The journal is a JSON lines file, flushed after every record, so that an
+    interrupted attack can be resumed without sending a query twice.
+
+    Keyword arguments:
+    path [string] -- journal file path
+    resume [bool] -- load and extend an existing journal instead of
+        overwriting it (default False)
+    """
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.answers = {}
+        self.recovered = {}
+        if resume and os.path.exists(path):
+            self._load()
+        self._file = open(path, "a" if resume else "w")
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "Journal({})".format(self.path)
+
+    def _load(self):
+        """Read the answers and recovered bytes of the journal."""
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Last line cut by an interruption
+                    continue
+                if "q" in entry:
+                    self.answers[bytes.fromhex(entry["q"])] = entry["v"]
+                elif "b" in entry:
+                    self.recovered.setdefault(bytes.fromhex(entry["b"]), {})[entry["p"]] = entry["i"]
+
+    def _write(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def answer(self, cipher, valid):
+        """Record the oracle answer 'valid' [bool] to the query 'cipher' [bytes]."""
+        self._write({"q": cipher.hex(), "v": valid})
+
+    def recover(self, block, pos, value):
+        """Record the intermediate byte 'value' [int] at 'pos' [int] of the ciphertext 'block' [bytes]."""
+        self.recovered.setdefault(block, {})[pos] = value
+        self._write({"b": block.hex(), "p": pos, "i": value})
+
+    def close(self):
+        """Close the journal file."""
+        self._file.close()
+
+# -------------------------------------------------------------------------- #
+
+class PaddingOracleAttack:
+    """Concurrent padding oracle attack on CBC encryption mode.
+
+    All blocks (each paired with its predecessor) are attacked in parallel
+    over a pool of 'connections' oracle connections, and the guesses of a byte
+    are sent by batches of 'pipeline' with the transport query_many(). Failed
+    queries and connections are retried, on a new connection and after an
+    increasing pause. Guesses are ordered by a
+    plaintext model so that likely bytes are tried first. Answers are cached,
+    and recorded with the recovered bytes in the journal if any.
+
+    The intermediate state (raw block decryption) of every attacked block is
+    kept, so that encrypt() can forge ciphertexts from known blocks (CBC-R).
+
+    Keyword arguments:
+    connect [function] -- connection factory (cf. ConnectionPool)
+    connections [int] -- number of oracle connections (default 1)
+    pipeline [int] -- guesses sent at once for each byte (default 1)
+    retries [int] -- attempts per query before giving up (default 3)
+    model [GuessModel|NumericModel] -- guess ordering (default GuessModel())
+    journal [Journal] -- journal to resume from and to extend (default None)
+    stats [OracleStats] -- query instrumentation and throttling (default OracleStats())
+    """
+    def __init__(self, connect, connections=1, pipeline=1, retries=3, model=None, journal=None,
+                 stats=None):
+        if connections < 1 or pipeline < 1 or retries < 1:
+            raise PadOracleError("Connections, pipeline and retries must be positive")
+        self.connections = connections
+        self.pipeline = pipeline
+        self.retries = retries
+        self.model = model if model is not None else GuessModel()
+        self.journal = journal
+        self.stats = stats if stats is not None else OracleStats()
+        self.pool = ConnectionPool(connect, connections, self.stats)
+        self.queries = 0
+        self.cached = 0
+        self.block_queries = []
+        self._cache = dict(journal.answers) if journal else {}
+        self._intermediates = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __repr__(self):
+        return "PaddingOracleAttack({:d}, {:d})".format(self.connections, self.pipeline)
 
+    def run(self, cipher):
+        """Decrypt 'cipher' [bytes] (IV followed by the ciphertext) and return the unpadded plaintext [bytes]."""
+        blocks = _split_cipher(bytes(cipher))
+        pairs = list(zip(blocks[:-1], blocks[1:]))
+        self.block_queries = [0 for p in pairs]
+        # The last block is attacked first, its padding is known in advance
+        def job(idx):
+            return self.decrypt_block(*pairs[idx], idx, idx == len(pairs) - 1)
+        with ThreadPoolExecutor(min(len(pairs), self.connections)) as block_pool:
+            try:
+                order = list(reversed(range(len(pairs))))
+                plain = dict(zip(order, block_pool.map(job, order)))
+                plain = b"".join(plain[i] for i in range(len(pairs)))
+            finally:
+                self.pool.close()
+        return _unpad(plain)
 
-def padding_oracle(cipher, host):
+    def decrypt_block(self, prev, block, index=None, last=False):
+        """Return the plaintext [bytes] of 'block' [bytes] preceded by 'prev' [bytes].
+
+        Keyword arguments:
+        index [int] -- block number used for block_queries (default None)
+        last [bool] -- last block of the ciphertext (PKCS7 padding) (default False)
+        """
+        self._local.sent = 0
+        plain = _next_block(self, block, prev, last)
+        if index is not None:
+            self.block_queries[index] = self._local.sent
+        return plain
+
+    def intermediate(self, block, prev=None, guesses=None, found=None):
+        """Return the intermediate state [bytes] of 'block' [bytes], i.e. its raw decryption.
+
+        Keyword arguments:
+        prev [bytes] -- previous ciphertext block (or IV) (default None)
+        guesses [function] -- guesses(pos, after) -> intermediate values in guessing order,
+            'after' being the plaintext recovered after 'pos' (default numeric order)
+        found [function] -- found(pos, plain) called with the plaintext from 'pos' (default None)
+        """
+        block = bytes(block)
+        if block not in self._intermediates:
+            self._intermediates[block] = _intermediate(self, block, prev, guesses, found)
+        return self._intermediates[block]
+
+    def known_blocks(self):
+        """Return the blocks [List<bytes>] whose intermediate state is fully known."""
+        blocks = dict.fromkeys(self._intermediates)
+        if self.journal:
+            blocks.update(dict.fromkeys(b for b, known in self.journal.recovered.items()
+                                        if len(known) == _block))
+        return list(blocks)
+
+    def encrypt(self, plain, block=None):
+        """Forge a ciphertext [bytes] (IV included) of 'plain' [bytes] (CBC-R).
+
+        The ciphertext is built backwards: the intermediate state of the
+        current first block, xored with the plaintext block, gives the block
+        preceding it. Only the last block comes for free when its intermediate
+        state is already known (e.g. from a previous decryption).
+
+        Keyword arguments:
+        plain [bytes] -- plaintext, PKCS7 padded before encryption
+        block [bytes] -- last ciphertext block (default a known block if any, or random)
+        """
+        pad = _block - len(plain) % _block
+        plain = bytes(plain) + bytes([pad])*pad
+        if block is None:
+            known = self.known_blocks()
+            block = known[0] if known else os.urandom(_block)
+        if len(block) != _block:
+            raise PadOracleError("Block size must be 16 bytes")
+        blocks = [bytes(block)]
+        count = len(plain)//_block
+        self.block_queries = [0 for i in range(count)]
+        try:
+            for idx in reversed(range(count)):
+                self._local.sent = 0
+                inter = self.intermediate(blocks[0])
+                self.block_queries[idx] = self._local.sent
+                chunk = plain[idx*_block:(idx+1)*_block]
+                blocks.insert(0, bytes(i ^ p for i, p in zip(inter, chunk)))
+        finally:
+            self.pool.close()
+        return b"".join(blocks)
+
+    def query(self, cipher):
+        """Return True if the padding of 'cipher' [bytes] is valid (retried on connection errors)."""
+        return self.query_many([cipher])[0]
+
+    def query_many(self, ciphers):
+        """Return the padding validity [List<bool>] of each of 'ciphers'.
+
+        Queries already answered come from the cache, the others are sent as
+        one batch.
+        """
+        with self._lock:
+            todo = list(dict.fromkeys(c for c in ciphers if c not in self._cache))
+            self.cached += len(ciphers) - len(todo)
+        if todo:
+            answers = self._send(todo)
+            with self._lock:
+                self._cache.update(zip(todo, answers))
+            if self.journal:
+                for cipher, valid in zip(todo, answers):
+                    self.journal.answer(cipher, valid)
+        with self._lock:
+            return [self._cache[c] for c in ciphers]
+
+    def recovered(self, block):
+        """Return the intermediate bytes [dict] of 'block' [bytes] known from the journal ({pos: value})."""
+        if not self.journal:
+            return {}
+        return dict(self.journal.recovered.get(block, {}))
+
+    def record(self, block, pos, value):
+        """Record the intermediate byte 'value' [int] at 'pos' [int] of 'block' [bytes]."""
+        self.stats.recover()
+        if self.journal:
+            self.journal.recover(block, pos, value)
+
+    def _send(self, ciphers):
+        """Send 'ciphers' [List<bytes>] to the oracle and return the answers [List<bool>]."""
+        with self._lock:
+            self.queries += len(ciphers)
+        self._local.sent = getattr(self._local, "sent", 0) + len(ciphers)
+        for attempt in range(self.retries):
+            self.stats.wait()
+            conn = None
+            try:
+                # Connection errors (e.g. server restarting) are retried too
+                conn = self.pool.acquire()
+                start = self.stats.clock()
+                res = conn.query_many(ciphers)
+            except OSError as err:
+                last = attempt == self.retries - 1
+                if conn is None:
+                    # No connection to replace
+                    self.stats.error(False)
+                else:
+                    self.pool.discard(conn, reconnect=not last)
+                if last:
+                    raise PadOracleError("Oracle query failed: {}".format(err))
+                time.sleep(_backoff*2**attempt)
+                continue
+            except BaseException:
+                # The connection state is unknown (e.g. KeyboardInterrupt)
+                if conn is not None:
+                    self.pool.discard(conn, False)
+                raise
+            self.stats.query(len(ciphers), self.stats.clock() - start)
+            self.pool.release(conn)
+            return res
+
+
+def _next_block(attack, block, prev, last=False):
+    """Recover the plaintext of 'block' byte after byte, from the last one.
+
+    Keyword arguments:
+    attack [PaddingOracleAttack] -- only used as a padding validity oracle
+    block [bytes] -- ciphertext block
+    prev [bytes] -- previous ciphertext block (or IV)
+    last [bool] -- last block of the ciphertext (default False)
+    Output:
+    plain [bytes] -- plaintext block
+    """
+    state = {"padlen": 0}
+    def guesses(pos, plain):
+        # Plaintext guesses p give intermediate values p ^ prev[pos]
+        return [p ^ prev[pos] for p in attack.model.order(plain, last)]
+    def found(pos, plain):
+        pad = _block - pos
+        if last and pad == 1 and 1 <= plain[0] <= _block:
+            state["padlen"] = plain[0]
+        if pad > state["padlen"]:
+            attack.model.update(plain[0], plain[1:])
+    inter = attack.intermediate(block, prev, guesses, found)
+    return bytes(i ^ p for i, p in zip(inter, prev))
+
+
+def _intermediate(attack, block, prev=None, guesses=None, found=None):
+    """Recover the intermediate state of 'block' byte after byte, from the last one.
+
+    Keyword arguments:
+    attack [PaddingOracleAttack] -- only used as a padding validity oracle
+    block [bytes] -- ciphertext block
+    prev, guesses, found -- cf. PaddingOracleAttack.intermediate()
+    Output:
+    inter [bytes] -- intermediate state of the block
+    """
+    prev = prev if prev is not None else bytes(_block)
+    inter = bytearray(_block)
+    # Bytes already recovered by an interrupted run
+    known = attack.recovered(block)
+    for pad in range(1, _block + 1):
+        pos = _block - pad
+        if pos in known:
+            inter[pos] = known[pos]
+        else:
+            after = bytes(i ^ p for i, p in zip(inter[pos+1:], prev[pos+1:]))
+            order = guesses(pos, after) if guesses else range(256)
+            tail = bytes(i ^ pad for i in inter[pos+1:])
+            inter[pos] = _find_byte(attack, block, pos, tail, order)
+            attack.record(block, pos, inter[pos])
+        if found:
+            found(pos, bytes(i ^ p for i, p in zip(inter[pos:], prev[pos:])))
+    return bytes(inter)
+
+
+def _find_byte(attack, block, pos, tail, guesses):
+    """Return the intermediate byte [int] at 'pos' of 'block', trying 'guesses' in order."""
+    pad = _block - pos
+    for start in range(0, len(guesses), attack.pipeline):
+        window = guesses[start:start+attack.pipeline]
+        forged = [bytes(pos) + bytes([g ^ pad]) + tail + block for g in window]
+        for g, cipher, valid in zip(window, forged, attack.query_many(forged)):
+            if not valid:
+                continue
+            if pad == 1 and not _check_last(attack, cipher):
+                # Valid padding of another length (e.g. \x02\x02)
+                continue
+            return g
+    raise PadOracleError("No valid padding found, check the oracle")
+
+
+def _check_last(attack, cipher):
+    """Confirm that 'cipher' is valid because of a one-byte padding by altering the previous byte."""
+    altered = bytearray(cipher)
+    altered[_block-2] ^= 0xff
+    return attack.query(bytes(altered))
+
+# -------------------------------------------------------------------------- #
+
+def padding_oracle(cipher, host, connections=1, pipeline=1, framing="recv"):
     """Padding oracle attack on CBC encryption mode.
 
     Keyword arguments:
-    cipher [hex string] -- ciphertext
+    cipher [hex string] -- ciphertext (the first block being the IV)
     host [dictionnary] -- oracle info (IP, port and error message)
+    connections [int] -- number of simultaneous connections to the oracle (default 1)
+    pipeline [int] -- guesses sent at once for each byte (default 1)
+    framing [string] -- TCPOracle framing: "recv" (original protocol, one
+        message per recv() and no newline) or "line" (default "recv")
     Output:
     plain [bytes] -- decoded plaintext
     """
-    clist = _split_cipher(cipher)
-    plain = [[0 for i in clist[0]] for j in range(len(clist) - 1)]
-
-    with socket(AF_INET, SOCK_STREAM) as s:
-        s.connect((host["hostname"], host["port"]))
-        # Compute padding
-        padding = 0
-        for i in range(16):
-            data = s.recv(1024)
-            data = s.recv(1024)
-            print(data)
-            clist[-2][i] = (clist[-2][i] + 1) % 256
-            s.sendall(ascii_to_hstr(_merge_cipher(clist)))
-            clist[-2][i] = (clist[-2][i] - 1) % 256
-            data = s.recv(1024)
-            print(data)
-            if host["error"] in data or b"invalid" in data or b"Error" in data:
-                padding = 16 - i
-                break
-        # Update plain with the previously found padding
-        for i in range(padding):
-            plain[-1][-1-i] = padding
-        # Compute plain using the oracle
-        offset = padding
-        for n, _ in enumerate(plain):
-            _next_block(clist, plain, n, offset, s, host["error"])
-            offset = 0
-
-    return _merge_cipher(plain)[:-padding]
+    def connect():
+        return TCPOracle(host["hostname"], host["port"], host.get("error", b"Error"), host.get("prompt"),
+                         framing=framing)
+    attack = PaddingOracleAttack(connect, connections, pipeline)
+    return attack.run(hstr_to_ascii(cipher))
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 
 import binascii
+import mmap
+import os
+import random
 from unittest import TestCase
 from Crypto.Cipher import AES as pyAES
 
-from symmetric.aes import AES
+from symmetric.aes import AES, Engine
 from util.blockcipher import Mode, Padding
+from util.error import AESError, PaddingError
 
 class TestAES128_ECB(TestCase):
     def test_simple(self):
@@ -285,5 +289,179 @@ class TestAES256_CBC(TestCase):
 
 # -------------------------------------------------------------------------- #
 
+class TestEngines(TestCase):
+    def test_ecb(self):
+        plain = bytes(range(256))*3
+        for key in [b"Yellow submarine", b"Yellow submarineazertyui", b"\x2a"*32]:
+            fast = AES(key, Mode.ECB, Padding.PKCS7, engine=Engine.TTABLE)
+            slow = AES(key, Mode.ECB, Padding.PKCS7, engine=Engine.MATRIX)
+            cipher = fast.encrypt(plain)
+            self.assertEqual(cipher, slow.encrypt(plain))
+            self.assertEqual(fast.decrypt(cipher), plain)
+            self.assertEqual(slow.decrypt(cipher), plain)
+
+    def test_cbc(self):
+        iv = b"\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09\x0a\x0b\x0c\x0d\x0e\x0f"
+        plain = b"Hello world!!!!  !!!!dlrow olleH!"
+        for key in [b"Yellow submarine", b"Yellow submarineazertyui", b"\x2a"*32]:
+            fast = AES(key, Mode.CBC, Padding.ANSI, iv, Engine.TTABLE)
+            slow = AES(key, Mode.CBC, Padding.ANSI, iv, Engine.MATRIX)
+            cipher = fast.encrypt(plain)
+            self.assertEqual(cipher, slow.encrypt(plain))
+            self.assertEqual(fast.decrypt(cipher), plain)
+            self.assertEqual(slow.decrypt(cipher), plain)
+
+# -------------------------------------------------------------------------- #
+
+class TestAES_CTR(TestCase):
+    def test_pycrypto(self):
+        for key in [b"Yellow submarine", b"Yellow submarineazertyui", b"\x2a"*32]:
+            for nonce, counter in [(b"\x01"*8, 0), (b"abcd", 0xfffffffffffffffffffffffe), (b"", 7)]:
+                plain = os.urandom(100)
+                aes = AES(key, Mode.CTR, iv=nonce, counter=counter)
+                aestrue = pyAES.new(key, pyAES.MODE_CTR, nonce=nonce, initial_value=counter)
+                cipher = aes.encrypt(plain)
+                self.assertEqual(cipher, aestrue.encrypt(plain).hex())
+                self.assertEqual(aes.decrypt(cipher), plain)
+
+    def test_random_access(self):
+        aes = AES(b"Yellow submarine", Mode.CTR, iv=b"\x00"*8)
+        plain = os.urandom(200)
+        cipher = aes.ctr_crypt(plain)
+        for offset in [0, 1, 15, 16, 33, 199]:
+            self.assertEqual(aes.ctr_crypt(cipher[offset:], offset), plain[offset:])
+        self.assertEqual(aes.ctr_crypt(cipher[17:40], 17), plain[17:40])
+
+    def test_parallel(self):
+        aes = AES(b"Yellow submarine", Mode.CTR, iv=b"\x00"*12, counter=0xfffffff0, workers=2)
+        aes.parallel_threshold = 0
+        plain = os.urandom(1000)
+        serial = aes.ctr_crypt(plain, workers=1)
+        self.assertEqual(aes.ctr_crypt(plain), serial)
+        self.assertEqual(aes.ctr_crypt(plain[5:], 5), serial[5:])
+        self.assertEqual(bytes.fromhex(aes.encrypt(plain)), serial)
+
+    def test_errors(self):
+        with self.assertRaises(AESError):
+            AES(b"Yellow submarine", Mode.CTR, iv=b"\x00"*16)
+        with self.assertRaises(AESError):
+            AES(b"Yellow submarine", Mode.ECB).ctr_crypt(b"abc")
+
+# -------------------------------------------------------------------------- #
+
+class TestParallelDecrypt(TestCase):
+    def test_parallel(self):
+        key = b"Yellow submarine"
+        iv = bytes(range(16))
+        plain = os.urandom(1000)
+        for mode in [Mode.ECB, Mode.CBC]:
+            aes = AES(key, mode, Padding.PKCS7, iv, workers=2)
+            aes.parallel_threshold = 0
+            cipher = aes.encrypt(plain)
+            self.assertEqual(aes.decrypt(cipher), plain)
+            aestrue = pyAES.new(key, pyAES.MODE_ECB) if mode == Mode.ECB else pyAES.new(key, pyAES.MODE_CBC, iv)
+            self.assertEqual(aes.decrypt(cipher)[:992], aestrue.decrypt(bytes.fromhex(cipher))[:992])
+
+    def test_threshold(self):
+        aes = AES(b"Yellow submarine", Mode.CBC, iv=bytes(16), workers=0)
+        self.assertEqual(aes._workers_for(16), 1)
+        self.assertGreaterEqual(aes._workers_for(aes.parallel_threshold), 1)
+        aes = AES(b"Yellow submarine", Mode.CBC, iv=bytes(16), workers=3)
+        self.assertEqual(aes._workers_for(aes.parallel_threshold), 3)
+
+# -------------------------------------------------------------------------- #
+
+class TestBuffers(TestCase):
+    def test_bytes(self):
+        key = b"Yellow submarine"
+        iv = bytes(range(16))
+        plain = os.urandom(77)
+        for mode in Mode:
+            aes = AES(key, mode, Padding.PKCS7, iv[:8] if mode == Mode.CTR else iv)
+            cipher = aes.encrypt_bytes(plain)
+            self.assertEqual(cipher.hex(), aes.encrypt(plain))
+            self.assertEqual(len(cipher), aes.encrypted_size(len(plain)))
+            self.assertEqual(aes.encrypt_bytes(bytearray(plain)), cipher)
+            self.assertEqual(aes.encrypt_bytes(memoryview(plain)), cipher)
+            self.assertEqual(aes.decrypt_bytes(memoryview(cipher)), plain)
+
+    def test_mmap(self):
+        aes = AES(b"Yellow submarine", Mode.CBC, Padding.ANSI, bytes(16))
+        plain = os.urandom(4000)
+        with mmap.mmap(-1, len(plain)) as mm:
+            mm[:] = plain
+            self.assertEqual(aes.encrypt_bytes(mm), bytes.fromhex(aes.encrypt(plain)))
+
+    def test_into(self):
+        aes = AES(b"Yellow submarine", Mode.CBC, Padding.PKCS7, bytes(16))
+        plain = os.urandom(40)
+        out = bytearray(100)
+        size = aes.encrypt_into(plain, out)
+        self.assertEqual(size, 48)
+        self.assertEqual(bytes(out[:size]), aes.encrypt_bytes(plain))
+        # In-place decryption
+        buf = bytearray(out[:size])
+        self.assertEqual(aes.decrypt_into(buf, buf), 40)
+        self.assertEqual(bytes(buf[:40]), plain)
+        with self.assertRaises(AESError):
+            aes.encrypt_into(plain, bytearray(47))
+        with self.assertRaises(AESError):
+            aes.decrypt_bytes(bytes(17))
+        with self.assertRaises(PaddingError):
+            AES(b"Yellow submarine", Mode.ECB, Padding.PKCS7).decrypt_bytes(bytes(16))
+
+# -------------------------------------------------------------------------- #
+
+def _chunks(data, rng):
+    """Split 'data' into randomly sized chunks."""
+    offset = 0
+    while offset < len(data):
+        size = rng.randint(0, 40)
+        yield data[offset:offset+size]
+        offset += size
+
+class TestStream(TestCase):
+    def test_roundtrip(self):
+        rng = random.Random(1337)
+        key = b"Yellow submarine"
+        iv = bytes(range(16))
+        for mode in Mode:
+            for padding in [Padding.ZERO, Padding.ANSI, Padding.PKCS7]:
+                aes = AES(key, mode, padding, iv[:8] if mode == Mode.CTR else iv)
+                for size in [0, 1, 15, 16, 17, 100, 256]:
+                    plain = os.urandom(size) + b"\x00"*(size % 3)
+                    cipher = bytes.fromhex(aes.encrypt(plain))
+                    streamed = b"".join(aes.encrypt_stream(_chunks(plain, rng)))
+                    self.assertEqual(streamed, cipher)
+                    decrypted = b"".join(aes.decrypt_stream(_chunks(cipher, rng)))
+                    self.assertEqual(decrypted, aes.decrypt(cipher.hex()))
+
+    def test_bounded(self):
+        aes = AES(b"Yellow submarine", Mode.CBC, Padding.PKCS7, b"\x00"*16)
+        enc, dec = aes.encryptor(), aes.decryptor()
+        total = b""
+        for _ in range(200):
+            cipher = enc.update(b"A"*37)
+            self.assertLess(len(enc._buffer), 16)
+            total += dec.update(cipher)
+            self.assertLessEqual(len(dec._buffer), 32)
+        total += dec.update(enc.finalize()) + dec.finalize()
+        self.assertEqual(total, b"A"*37*200)
+
+    def test_errors(self):
+        aes = AES(b"Yellow submarine", Mode.ECB, Padding.NONE)
+        enc = aes.encryptor()
+        enc.update(b"abc")
+        with self.assertRaises(AESError):
+            enc.finalize()
+        with self.assertRaises(AESError):
+            enc.update(b"abc")
+        dec = AES(b"Yellow submarine", Mode.ECB, Padding.PKCS7).decryptor()
+        dec.update(bytes(16))
+        with self.assertRaises(PaddingError):
+            dec.finalize()
+
+# -------------------------------------------------------------------------- #
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+from unittest import TestCase
+
+from symmetric import aesbatch
+from symmetric.aes import AES, Engine
+from symmetric.aesutil import get_schedule, ttable_encrypt, ttable_decrypt
+from util.blockcipher import Mode, Padding
+
+@unittest.skipUnless(aesbatch.available(), "numpy not installed")
+class TestBatch(TestCase):
+    def test_blocks(self):
+        data = os.urandom(16*50)
+        for key in [b"Yellow submarine", b"Yellow submarineazertyui", b"\x2a"*32]:
+            sched = get_schedule(key)
+            expected = b"".join(ttable_encrypt(data[i:i+16], sched.ekeys, sched.rounds)
+                                for i in range(0, len(data), 16))
+            self.assertEqual(aesbatch.encrypt_blocks(data, sched), expected)
+            expected = b"".join(ttable_decrypt(data[i:i+16], sched.dkeys, sched.rounds)
+                                for i in range(0, len(data), 16))
+            self.assertEqual(aesbatch.decrypt_blocks(data, sched), expected)
+            # CBC chaining: xor with the previous ciphertext block
+            iv = os.urandom(16)
+            chained = iv + data[:-16]
+            expected = bytes(a ^ b for a, b in zip(expected, chained))
+            self.assertEqual(aesbatch.decrypt_blocks(data, sched, iv), expected)
+
+    def test_counters(self):
+        for nonce, start in [(b"\x01"*8, 0), (b"\x01"*15, 250), (b"", 2**64 - 2), (b"ab", 2**100)]:
+            ctrlen = 16 - len(nonce)
+            start %= 1 << (8*ctrlen)
+            expected = b"".join(nonce + ((start + i) % (1 << (8*ctrlen))).to_bytes(ctrlen, "big")
+                                for i in range(10))
+            self.assertEqual(aesbatch.counter_blocks(nonce, ctrlen, start, 10), expected)
+        # Last counter just below 2^64, without wrapping
+        for nonce in [b"", b"ab"]:
+            ctrlen = 16 - len(nonce)
+            expected = b"".join(nonce + (2**64 - 10 + i).to_bytes(ctrlen, "big") for i in range(10))
+            self.assertEqual(aesbatch.counter_blocks(nonce, ctrlen, 2**64 - 10, 10), expected)
+
+    def test_aes(self):
+        iv = bytes(range(16))
+        plain = os.urandom(1000)
+        for mode in Mode:
+            nonce = iv[:8] if mode == Mode.CTR else iv
+            fast = AES(b"Yellow submarine", mode, Padding.PKCS7, nonce, Engine.NUMPY)
+            slow = AES(b"Yellow submarine", mode, Padding.PKCS7, nonce, Engine.TTABLE)
+            cipher = fast.encrypt_bytes(plain)
+            self.assertEqual(cipher, slow.encrypt_bytes(plain))
+            self.assertEqual(fast.decrypt_bytes(cipher), plain)
+        fast = AES(b"Yellow submarine", Mode.CTR, iv=iv[:8], engine=Engine.NUMPY)
+        cipher = fast.ctr_crypt(plain)
+        self.assertEqual(fast.ctr_crypt(cipher[5:], 5), plain[5:])
+
+    def test_threshold(self):
+        # Small inputs go through the T-tables, larger ones through NumPy
+        iv = bytes(range(16))
+        for size in [16, 32, AES.batch_threshold - 16, AES.batch_threshold, 2*AES.batch_threshold]:
+            plain = os.urandom(size)
+            for mode in Mode:
+                nonce = iv[:8] if mode == Mode.CTR else iv
+                fast = AES(b"Yellow submarine", mode, Padding.NONE, nonce, Engine.NUMPY)
+                slow = AES(b"Yellow submarine", mode, Padding.NONE, nonce, Engine.TTABLE)
+                cipher = fast.encrypt_bytes(plain)
+                self.assertEqual(cipher, slow.encrypt_bytes(plain))
+                self.assertEqual(fast.decrypt_bytes(cipher), plain)
+        fast = AES(b"Yellow submarine", Mode.ECB, Padding.NONE, engine=Engine.NUMPY)
+        self.assertFalse(fast._batched(AES.batch_threshold - 16))
+        self.assertTrue(fast._batched(AES.batch_threshold))
+
+# -------------------------------------------------------------------------- #
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+
+from symmetric.aes import AES
+from symmetric.aesfile import encrypt_file, decrypt_file
+from util.blockcipher import Mode, Padding
+from util.error import AESError
+
+class TestFiles(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.plain = os.path.join(self.dir, "plain")
+        self.cipher = os.path.join(self.dir, "cipher")
+        self.out = os.path.join(self.dir, "out")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _check(self, aes, data, chunk):
+        with open(self.plain, "wb") as f:
+            f.write(data)
+        size = encrypt_file(aes, self.plain, self.cipher, chunk=chunk)
+        with open(self.cipher, "rb") as f:
+            cipher = f.read()
+        self.assertEqual(size, len(cipher))
+        self.assertEqual(cipher, aes.encrypt_bytes(data))
+        decrypt_file(aes, self.cipher, self.out, chunk=chunk)
+        with open(self.out, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_modes(self):
+        iv = bytes(range(16))
+        for mode in Mode:
+            for padding in [Padding.ZERO, Padding.ANSI, Padding.PKCS7]:
+                aes = AES(b"Yellow submarine", mode, padding, iv[:8] if mode == Mode.CTR else iv)
+                for size in [0, 16, 100]:
+                    self._check(aes, os.urandom(size) + b"\x01", 40)
+
+    def test_hex(self):
+        aes = AES(b"Yellow submarine", Mode.CBC, Padding.PKCS7, bytes(16))
+        data = os.urandom(1000)
+        with open(self.plain, "wb") as f:
+            f.write(data)
+        progress = []
+        encrypt_file(aes, self.plain, self.cipher, True, 64, lambda *args: progress.append(args))
+        self.assertEqual(progress[-1], (1000, 1000))
+        with open(self.cipher, "ab") as f:
+            f.write(b"\n")
+        with open(self.cipher, "rb") as f:
+            self.assertEqual(f.read().strip().decode(), aes.encrypt(data))
+        decrypt_file(aes, self.cipher, self.out, True, 64)
+        with open(self.out, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_wrapped_hex(self):
+        aes = AES(b"Yellow submarine", Mode.CBC, Padding.PKCS7, bytes(16))
+        data = os.urandom(1000)
+        hexa = aes.encrypt(data)
+        # 61-digit lines: the chunks split hex pairs and end on newlines
+        wrapped = "\r\n".join(hexa[i:i+61] for i in range(0, len(hexa), 61)) + "\n"
+        with open(self.cipher, "w") as f:
+            f.write(wrapped)
+        for chunk in [7, 16, 31, 64, 5000]:
+            decrypt_file(aes, self.cipher, self.out, True, chunk)
+            with open(self.out, "rb") as f:
+                self.assertEqual(f.read(), data)
+        with open(self.cipher, "w") as f:
+            f.write(wrapped.strip() + "a\n")
+        self.assertRaises(AESError, decrypt_file, aes, self.cipher, self.out, True, 16)
+
+# -------------------------------------------------------------------------- #
+
+if __name__ == '__main__':
+    unittest.main()
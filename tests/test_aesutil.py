@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
+import os
+import unittest
 from unittest import TestCase
 
-from symmetric.aesutil import AES_Matrix, expand_key
+import symmetric.aesutil as aesutil
+from symmetric.aesutil import AES_Matrix, expand_key, ttable_keys, ttable_encrypt, ttable_decrypt
+from util.convert import matrix_to_str, str_to_matrix
+from util.error import AESError
+from util.gf2n import GF2n
 
 class TestSteps(TestCase):
     def test_key_sched(self):
@@ -87,5 +93,135 @@ class TestSteps(TestCase):
 
 # -------------------------------------------------------------------------- #
 
+class TestTTables(TestCase):
+    def test_keys(self):
+        key = b"YELLOW SUBMARINE"
+        ekeys, dkeys = ttable_keys(expand_key(key))
+        self.assertEqual(len(ekeys), 44)
+        self.assertEqual(len(dkeys), 44)
+        self.assertEqual(ekeys[0], 0x59454c4c)
+        self.assertEqual(ekeys[-4:], dkeys[:4])
+        self.assertEqual(ekeys[:4], dkeys[-4:])
+
+    def test_fips197(self):
+        key = bytes(range(16))
+        plain = bytes.fromhex("00112233445566778899aabbccddeeff")
+        cipher = bytes.fromhex("69c4e0d86a7b0430d8cdb78070b4c55a")
+        ekeys, dkeys = ttable_keys(expand_key(key))
+        self.assertEqual(ttable_encrypt(plain, ekeys, 10), cipher)
+        self.assertEqual(ttable_decrypt(cipher, dkeys, 10), plain)
+
+        key = bytes(range(32))
+        cipher = bytes.fromhex("8ea2b7ca516745bfeafc49904b496089")
+        ekeys, dkeys = ttable_keys(expand_key(key))
+        self.assertEqual(ttable_encrypt(plain, ekeys, 14), cipher)
+        self.assertEqual(ttable_decrypt(cipher, dkeys, 14), plain)
+
+    def test_matrix(self):
+        key = b"OneTwoThreeFour!"
+        plain = b"deadbeefdeadbeef"
+        expkey = expand_key(key)
+        aesmat = AES_Matrix(str_to_matrix(plain))
+        aesmat.add_roundkey(expkey, 0)
+        for i in range(1, 10):
+            aesmat.sub_bytes()
+            aesmat.shift_rows()
+            aesmat.mix_columns()
+            aesmat.add_roundkey(expkey, i)
+        aesmat.sub_bytes()
+        aesmat.shift_rows()
+        aesmat.add_roundkey(expkey, 10)
+        ekeys, _ = ttable_keys(expkey)
+        self.assertEqual(ttable_encrypt(plain, ekeys, 10), matrix_to_str(aesmat.state))
+
+# -------------------------------------------------------------------------- #
+
+class TestScheduleCache(TestCase):
+    def setUp(self):
+        aesutil.clear_schedule_cache()
+        aesutil.set_schedule_cache_size(2)
+
+    def tearDown(self):
+        aesutil.set_schedule_cache_size(128)
+        aesutil.clear_schedule_cache()
+
+    def test_schedule(self):
+        key = b"YELLOW SUBMARINE"
+        sched = aesutil.get_schedule(key)
+        self.assertEqual(sched.rounds, 10)
+        self.assertEqual(sched.expanded, expand_key(key))
+        self.assertEqual(len(sched.subkeys), 11)
+        self.assertEqual(sched.subkeys[1], AES_Matrix([])._get_subkey(sched.expanded, 1))
+        self.assertEqual((sched.ekeys, sched.dkeys), ttable_keys(sched.expanded))
+
+    def test_hits(self):
+        k1, k2, k3 = b"\x00"*16, b"\x01"*24, b"\x02"*32
+        first = aesutil.get_schedule(k1)
+        self.assertIs(aesutil.get_schedule(bytearray(k1)), first)
+        self.assertEqual(aesutil.schedule_cache_info(), (1, 1, 2, 1))
+        aesutil.get_schedule(k2)
+        aesutil.get_schedule(k1)
+        aesutil.get_schedule(k3)
+        # k2 was the least recently used key
+        self.assertEqual(aesutil.schedule_cache_info(), (2, 3, 2, 2))
+        self.assertIs(aesutil.get_schedule(k1), first)
+        aesutil.get_schedule(k2)
+        self.assertEqual(aesutil.schedule_cache_info().misses, 4)
+
+    def test_disabled(self):
+        aesutil.set_schedule_cache_size(0)
+        key = b"\x00"*16
+        self.assertIsNot(aesutil.get_schedule(key), aesutil.get_schedule(key))
+        self.assertEqual(aesutil.schedule_cache_info(), (0, 2, 0, 0))
+        with self.assertRaises(AESError):
+            aesutil.set_schedule_cache_size(-1)
+
+class TestCustomSBox(TestCase):
+    def tearDown(self):
+        aesutil.set_sbox(aesutil.make_sboxes()[0])
+
+    def test_aes_field(self):
+        sbox, invsbox = aesutil.make_sboxes(GF2n(0x11B))
+        self.assertEqual((sbox, invsbox), (aesutil._sbox, aesutil._invsbox))
+
+    def test_custom_field(self):
+        from symmetric.aes import AES, Engine
+        from util.blockcipher import Mode, Padding
+        sbox, invsbox = aesutil.make_sboxes(GF2n(0x11D), 0x05)
+        self.assertEqual(sbox[0], 0x05)
+        self.assertEqual([invsbox[s] for s in sbox], list(range(256)))
+        key, plain = b"YELLOW SUBMARINE", os.urandom(64)
+        reference = AES(key, Mode.ECB, Padding.NONE, engine=Engine.TTABLE).encrypt_bytes(plain)
+        aesutil.set_sbox(sbox)
+        self.assertEqual(aesutil._invsbox, invsbox)
+        ciphers = set()
+        for engine in Engine:
+            try:
+                aes = AES(key, Mode.ECB, Padding.NONE, engine=engine)
+            except AESError:
+                continue
+            cipher = aes.encrypt_bytes(plain)
+            self.assertEqual(aes.decrypt_bytes(cipher), plain)
+            ciphers.add(cipher)
+        self.assertEqual(len(ciphers), 1)
+        self.assertNotIn(reference, ciphers)
+
+    def test_existing_instance(self):
+        from symmetric.aes import AES, Engine
+        from util.blockcipher import Mode, Padding
+        plain = os.urandom(32)
+        aes = AES(b"YELLOW SUBMARINE", Mode.CBC, Padding.NONE, os.urandom(16), engine=Engine.TTABLE)
+        reference = aes.encrypt_bytes(plain)
+        aesutil.set_sbox(aesutil.make_sboxes(GF2n(0x11D), 0x05)[0])
+        cipher = aes.encrypt_bytes(plain)
+        self.assertNotEqual(cipher, reference)
+        self.assertEqual(aes.decrypt_bytes(cipher), plain)
+
+    def test_errors(self):
+        self.assertRaises(AESError, aesutil.make_sboxes, GF2n(0x13))
+        self.assertRaises(AESError, aesutil.set_sbox, [0]*256)
+
+# -------------------------------------------------------------------------- #
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import TestCase
+
+import gmpy2
+
+from asymmetric import batchgcd
+from asymmetric.batchgcd import BatchGCD, batch_gcd
+from asymmetric.rsa import PubKey
+from util.error import BatchGCDError
+
+def primes(count, bits=128):
+    """Return 'count' distinct primes [List<mpz>] of about 'bits' bits."""
+    res = []
+    p = gmpy2.mpz(1) << (bits - 1)
+    for _ in range(count):
+        p = gmpy2.next_prime(p + gmpy2.mpz(int.from_bytes(os.urandom(4), "big")))
+        res.append(p)
+    return res
+
+
+class TestBatchGCD(TestCase):
+    def setUp(self):
+        ps = self.primes = primes(210)
+        self.keys = [PubKey(int(ps[2*i]*ps[2*i+1]), 65537) for i in range(100)]
+        # Sharing a prime with keys 0 and 1, a repeated modulus and both factors of key 3
+        self.keys += [PubKey(int(ps[0]*ps[200]), 65537), PubKey(int(ps[3]*ps[201]), 65537),
+                      PubKey(self.keys[2].n, 65537), PubKey(int(ps[6]*ps[202]), 65537),
+                      PubKey(int(ps[7]*ps[203]), 65537)]
+
+    def check(self, res):
+        found = {pk.n: r for pk, r in res}
+        expected = [self.keys[i].n for i in [0, 1, 3, 100, 101, 103, 104]]
+        self.assertEqual(sorted(found), sorted(expected))
+        for pk, r in res:
+            self.assertEqual(r.p*r.q, pk.n)
+            self.assertEqual(r.e, pk.e)
+            pub, priv = r.gen_keys()
+            self.assertEqual(priv.decrypt(pub.encrypt(b"shared prime")), b"shared prime")
+
+    def test_gcds(self):
+        moduli = [6, 35, 33, 7*13]
+        self.assertEqual(BatchGCD().gcds(moduli), [3, 7, 3, 7])
+        self.assertEqual(BatchGCD().remainders(moduli), [(6*35*33*91) % (n*n) for n in moduli])
+        self.assertEqual(BatchGCD().gcds([15, 77]), [1, 1])
+
+    def test_factor(self):
+        self.check(batch_gcd(self.keys))
+
+    def test_workers(self):
+        self.check(BatchGCD(workers=3).factor(self.keys))
+
+    def test_single_pool(self):
+        created = []
+
+        class CountingPool(ProcessPoolExecutor):
+            def __init__(self, *args, **kwargs):
+                created.append(self)
+                super().__init__(*args, **kwargs)
+
+        batchgcd.ProcessPoolExecutor = CountingPool
+        try:
+            self.check(BatchGCD(workers=2).factor(self.keys))
+        finally:
+            batchgcd.ProcessPoolExecutor = ProcessPoolExecutor
+        # Two parallel steps (products and remainders of the 105 leaves) for a
+        # single pool
+        self.assertEqual(len(created), 1)
+
+    def test_spill(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.check(BatchGCD(workers=2, spill=directory).factor(self.keys))
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_errors(self):
+        self.assertRaises(BatchGCDError, BatchGCD().gcds, [15])
+        self.assertRaises(BatchGCDError, BatchGCD, 1, "/nonexistent/directory")
+
+if __name__ == '__main__':
+    unittest.main()
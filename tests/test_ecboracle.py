@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import os
+import socketserver
+import threading
+import unittest
+from unittest import TestCase
+
+from symmetric.aes import AES
+from symmetric.ecboracle import ECBOracleAttack, SocketOracle
+from util.blockcipher import Mode, Padding
+from util.error import ECBOracleError
+
+_secret = b"Rollin' in my 5.0\nWith my rag-top down so my hair can blow\n"
+
+def make_oracle(prefix, secret, mode=Mode.ECB, padding=Padding.PKCS7):
+    """Return a local encryption oracle of prefix || data || secret."""
+    aes = AES(os.urandom(16), mode, padding, os.urandom(16))
+    return lambda data: aes.encrypt_bytes(prefix + data + secret)
+
+
+class TestECBOracle(TestCase):
+    def test_simple(self):
+        attack = ECBOracleAttack(make_oracle(b"", _secret))
+        self.assertEqual(attack.run(), _secret)
+        self.assertEqual(attack.block_size, 16)
+        self.assertEqual(attack.prefix_len, 0)
+        self.assertEqual(attack.secret_len, len(_secret))
+
+    def test_prefix(self):
+        for plen in [1, 15, 16, 17, 40]:
+            prefix = os.urandom(plen)
+            attack = ECBOracleAttack(make_oracle(prefix, _secret))
+            self.assertEqual(attack.run(), _secret)
+            self.assertEqual(attack.prefix_len, plen)
+
+    def test_repeated_prefix(self):
+        attack = ECBOracleAttack(make_oracle(b"A"*37, _secret))
+        self.assertEqual(attack.run(), _secret)
+        self.assertEqual(attack.prefix_len, 37)
+
+    def test_lengths(self):
+        for secret in [b"", b"x", b"\x01", os.urandom(15), os.urandom(16), os.urandom(33)]:
+            self.assertEqual(ECBOracleAttack(make_oracle(b"pre", secret)).run(), secret)
+
+    def test_queries(self):
+        attack = ECBOracleAttack(make_oracle(os.urandom(5), _secret))
+        attack.run()
+        # Detection, one target query per alignment and one dictionary per byte
+        self.assertLessEqual(attack.queries, 1 + 16 + 16 + 16 + len(_secret))
+        # One dictionary per secret byte, none for the padding
+        self.assertEqual(len(attack._dicts) + attack.cache_hits, len(_secret))
+        attack = ECBOracleAttack(make_oracle(b"", b"ab"*40))
+        attack.run()
+        self.assertGreater(attack.cache_hits, 0)
+
+    def test_batch(self):
+        attack = ECBOracleAttack(make_oracle(b"", _secret[:20]), batch=64)
+        self.assertEqual(attack.run(), _secret[:20])
+        self.assertRaises(ECBOracleError, ECBOracleAttack, None, 0)
+
+    def test_zero_padding(self):
+        secret = _secret[:30]
+        self.assertEqual(ECBOracleAttack(make_oracle(b"", secret, padding=Padding.ZERO)).run(), secret)
+
+    def test_not_ecb(self):
+        attack = ECBOracleAttack(make_oracle(b"", _secret, Mode.CBC))
+        self.assertRaises(ECBOracleError, attack.run)
+
+    def test_socket(self):
+        oracle = make_oracle(b"prefix", _secret)
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    cipher = oracle(bytes.fromhex(line.decode().strip()))
+                    self.wfile.write(b"Ciphertext: " + cipher.hex().encode() + b"\n")
+
+        with socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler) as server:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            sock = SocketOracle({"hostname": "127.0.0.1", "port": server.server_address[1]})
+            try:
+                self.assertEqual(ECBOracleAttack(sock).run(), _secret)
+            finally:
+                sock.close()
+                server.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
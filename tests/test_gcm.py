@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import unittest
+from unittest import TestCase
+
+from Crypto.Cipher import AES as RefAES
+
+from symmetric.gcm import GCM, GHash, gf128_multiply
+from util.error import GCMError
+
+# McGrew & Viega test cases 1 to 4
+_key = bytes.fromhex("feffe9928665731c6d6a8f9467308308")
+_nonce = bytes.fromhex("cafebabefacedbaddecaf888")
+_plain = bytes.fromhex("d9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d8a318a72"
+                       "1c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657ba637b39")
+_aad = bytes.fromhex("feedfacedeadbeeffeedfacedeadbeefabaddad2")
+
+class TestGHash(TestCase):
+    def test_multiply(self):
+        h = os.urandom(16)
+        ref = int.from_bytes(h, "big")
+        for bits in [4, 8]:
+            ghash = GHash(h, bits)
+            for _ in range(20):
+                x = random.getrandbits(128)
+                self.assertEqual(ghash.multiply(x), gf128_multiply(x, ref))
+
+    def test_width(self):
+        self.assertRaises(GCMError, GHash, bytes(16), 16)
+
+
+class TestGCM(TestCase):
+    def test_vectors(self):
+        cipher = bytes.fromhex("42831ec2217774244b7221b784d0d49ce3aa212f2c02a4e035c17e2329aca12e"
+                               "21d514b25466931c7d8f6a5aac84aa051ba30b396a0aac973d58e091473f5985")
+        cases = [(bytes(16), bytes(12), b"", b"", b"", "58e2fccefa7e3061367f1d57a4e7455a"),
+                 (bytes(16), bytes(12), bytes(16), b"",
+                  bytes.fromhex("0388dace60b6a392f328c2b971b2fe78"), "ab6e47d42cec13bdf53a67b21257bddf"),
+                 (_key, _nonce, _plain + bytes.fromhex("1aafd255"), b"", cipher,
+                  "4d5c2af327cd64a62cf35abd2ba6fab4"),
+                 (_key, _nonce, _plain, _aad, cipher[:60], "5bc94fbc3221a5db94fae95ae7121a47")]
+        for key, nonce, plain, aad, cipher, tag in cases:
+            for bits in [4, 8]:
+                gcm = GCM(key, nonce, bits=bits)
+                self.assertEqual(gcm.encrypt_and_digest(plain, aad), (cipher, bytes.fromhex(tag)))
+                gcm = GCM(key, nonce, bits=bits)
+                self.assertEqual(gcm.decrypt_and_verify(cipher, bytes.fromhex(tag), aad), plain)
+
+    def test_reference(self):
+        for key in [os.urandom(16), os.urandom(24), os.urandom(32)]:
+            for nonce in [os.urandom(12), os.urandom(8), os.urandom(60), b"\x01"]:
+                plain, aad = os.urandom(random.randint(0, 200)), os.urandom(random.randint(0, 50))
+                ref = RefAES.new(key, RefAES.MODE_GCM, nonce=nonce)
+                ref.update(aad)
+                self.assertEqual(GCM(key, nonce).encrypt_and_digest(plain, aad),
+                                 ref.encrypt_and_digest(plain))
+
+    def test_stream(self):
+        key, nonce = os.urandom(16), os.urandom(12)
+        plain, aad = os.urandom(1000), os.urandom(100)
+        cipher, tag = GCM(key, nonce).encrypt_and_digest(plain, aad)
+        gcm = GCM(key, nonce)
+        for i in range(0, len(aad), 7):
+            gcm.update(aad[i:i+7])
+        parts = []
+        offset = 0
+        while offset < len(plain):
+            size = random.randint(1, 100)
+            parts.append(gcm.encrypt(plain[offset:offset+size]))
+            offset += size
+        self.assertEqual(b"".join(parts), cipher)
+        self.assertEqual(gcm.digest(), tag)
+        gcm = GCM(key, nonce)
+        gcm.update(aad)
+        self.assertEqual(gcm.decrypt(cipher[:33]) + gcm.decrypt(cipher[33:]), plain)
+        gcm.verify(tag)
+
+    def test_tag_len(self):
+        key, nonce = os.urandom(16), os.urandom(12)
+        cipher, tag = GCM(key, nonce, 12).encrypt_and_digest(b"YELLOW SUBMARINE")
+        self.assertEqual(len(tag), 12)
+        self.assertEqual(GCM(key, nonce, 12).decrypt_and_verify(cipher, tag), b"YELLOW SUBMARINE")
+        self.assertRaises(GCMError, GCM, key, nonce, 3)
+        self.assertRaises(GCMError, GCM, key, b"")
+
+    def test_forgery(self):
+        key, nonce = os.urandom(16), os.urandom(12)
+        cipher, tag = GCM(key, nonce).encrypt_and_digest(b"attack at dawn", b"header")
+        forged = bytes([cipher[0] ^ 1]) + cipher[1:]
+        self.assertRaises(GCMError, GCM(key, nonce).decrypt_and_verify, forged, tag, b"header")
+        self.assertRaises(GCMError, GCM(key, nonce).decrypt_and_verify, cipher, tag, b"Header")
+        self.assertRaises(GCMError, GCM(key, nonce).decrypt_and_verify, cipher, tag[:15] + b"\x00", b"header")
+
+    def test_order(self):
+        gcm = GCM(os.urandom(16), os.urandom(12))
+        gcm.encrypt(b"payload")
+        self.assertRaises(GCMError, gcm.update, b"aad")
+        gcm.digest()
+        self.assertRaises(GCMError, gcm.encrypt, b"more")
+
+
+if __name__ == '__main__':
+    unittest.main()
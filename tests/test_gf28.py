@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+import os
+import unittest
 from unittest import TestCase
 
 import util.gf28 as gf28
@@ -38,3 +40,59 @@ class TestGF28(TestCase):
         self.assertEqual(gf28.multiply(gf28.invert(43), 43), 1)
         self.assertEqual(gf28.multiply(gf28.invert(78), 78), 1)
         self.assertEqual(gf28.multiply(gf28.invert(154), 154), 1)
+
+
+class TestGF28Bulk(TestCase):
+    def test_table(self):
+        for x in range(256):
+            for y in range(0, 256, 7):
+                self.assertEqual(gf28.multiply(x, y), gf28._shift_multiply(x, y))
+        self.assertEqual(gf28.multiply(300, 7), gf28._shift_multiply(300, 7))
+
+    def test_multiply_bytes(self):
+        data = os.urandom(100)
+        for c in [0, 1, 2, 3, 9, 0xfe]:
+            self.assertEqual(gf28.multiply_bytes(data, c), bytes(gf28.multiply(b, c) for b in data))
+        with self.assertRaises(GF28Error):
+            gf28.multiply_bytes(data, 256)
+
+    def test_dot(self):
+        x, y = os.urandom(37), os.urandom(37)
+        expected = 0
+        for a, b in zip(x, y):
+            expected ^= gf28.multiply(a, b)
+        self.assertEqual(gf28.dot(x, y), expected)
+        self.assertEqual(gf28.dot(b"", b""), 0)
+        with self.assertRaises(GF28Error):
+            gf28.dot(b"ab", b"a")
+
+    def test_matrix_columns(self):
+        mds = [[2, 3, 1, 1], [1, 2, 3, 1], [1, 1, 2, 3], [3, 1, 1, 2]]
+        data = os.urandom(4*50)
+        expected = b"".join(bytes(gf28.dot(bytes(row), data[i:i+4]) for row in mds)
+                            for i in range(0, len(data), 4))
+        self.assertEqual(gf28.matrix_columns(mds, data), expected)
+        # Non square matrix
+        mat = [[1, 2, 3], [4, 5, 6]]
+        self.assertEqual(gf28.matrix_columns(mat, b"\x01\x00\x00\x00\x01\x00"), b"\x01\x04\x02\x05")
+        with self.assertRaises(GF28Error):
+            gf28.matrix_columns(mds, b"abc")
+
+    @unittest.skipUnless(gf28.np is not None, "numpy not installed")
+    def test_numpy(self):
+        np = gf28.np
+        data = np.frombuffer(os.urandom(64), dtype=np.uint8)
+        self.assertEqual(gf28.multiply_bytes(data, 3).tobytes(), gf28.multiply_bytes(data.tobytes(), 3))
+        self.assertEqual(gf28.dot(data, data[::-1]), gf28.dot(data.tobytes(), data[::-1].tobytes()))
+        mds = [[2, 3, 1, 1], [1, 2, 3, 1], [1, 1, 2, 3], [3, 1, 1, 2]]
+        res = gf28.matrix_columns(mds, data.reshape(-1, 4))
+        self.assertEqual(res.shape, (16, 4))
+        self.assertEqual(res.tobytes(), gf28.matrix_columns(mds, data.tobytes()))
+        # Width not matching the columns' length: (8, 8), 63-byte and 3-D arrays
+        for bad in [data.reshape(-1, 8), data[:63], data.reshape(4, 4, 4)]:
+            with self.assertRaises(GF28Error):
+                gf28.matrix_columns(mds, bad)
+
+
+if __name__ == '__main__':
+    unittest.main()
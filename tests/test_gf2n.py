@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import random
+import unittest
+from unittest import TestCase
+
+import util.gf28 as gf28
+from util.gf2n import GF2n, clmul, polymod, is_irreducible, np
+from util.error import GF2nError
+
+class TestGF2n(TestCase):
+    def test_polynomials(self):
+        self.assertEqual(clmul(0b11, 0b11), 0b101)
+        self.assertEqual(polymod(0x100, 0x11B), 0x1B)
+        self.assertTrue(is_irreducible(0x11B))
+        self.assertTrue(is_irreducible(0x11D))
+        self.assertFalse(is_irreducible(0x100))
+        self.assertFalse(is_irreducible(0b101))
+        self.assertRaises(GF2nError, GF2n, 0x100)
+        self.assertRaises(GF2nError, GF2n, 0x11B, 9)
+
+    def test_aes_field(self):
+        field = GF2n(0x11B)
+        for x in range(256):
+            self.assertEqual(field.invert(x), gf28.invert(x))
+            for y in range(0, 256, 11):
+                self.assertEqual(field.multiply(x, y), gf28.multiply(x, y))
+        self.assertEqual(field.pow(3, 255), 1)
+        self.assertEqual(field.pow(2, -1), field.invert(2))
+        self.assertEqual(field.divide(field.multiply(7, 9), 9), 7)
+        self.assertRaises(GF2nError, field.divide, 1, 0)
+
+    def test_fields(self):
+        for poly in [0x11D, 0x13, 0x1002B, 0x1000000AF]:
+            field = GF2n(poly)
+            for _ in range(30):
+                x, y, z = (random.randrange(1, field.order + 1) for _ in range(3))
+                self.assertEqual(field.multiply(x, y), polymod(clmul(x, y), poly))
+                self.assertEqual(field.multiply(x, field.invert(x)), 1)
+                self.assertEqual(field.multiply(x, y ^ z), field.multiply(x, y) ^ field.multiply(x, z))
+                self.assertEqual(field.pow(x, 5), field.multiply(field.pow(x, 2), field.pow(x, 3)))
+
+    def test_cache(self):
+        first, second = GF2n(0x11D), GF2n(0x11D)
+        self.assertIs(first.tables(), second.tables())
+
+    def test_batch(self):
+        field = GF2n(0x1002B)
+        xs = [random.randrange(1 << 16) for _ in range(50)] + [0]
+        self.assertEqual(field.multiply_many(xs, 1234), [field.multiply(x, 1234) for x in xs])
+        self.assertEqual(field.multiply_many(xs, 0), [0]*len(xs))
+        self.assertEqual(field.invert_many(xs[:5]), [field.invert(x) for x in xs[:5]])
+        self.assertEqual(field.dot([1, 2], [3, 4]), field.multiply(1, 3) ^ field.multiply(2, 4))
+        self.assertRaises(GF2nError, field.dot, [1], [1, 2])
+
+    def test_matrix(self):
+        field = GF2n(0x11B)
+        mds = [[2, 3, 1, 1], [1, 2, 3, 1], [1, 1, 2, 3], [3, 1, 1, 2]]
+        invmds = [[14, 11, 13, 9], [9, 14, 11, 13], [13, 9, 14, 11], [11, 13, 9, 14]]
+        self.assertEqual(field.matrix_multiply(mds, mds), gf28.matrix_multiply(mds, mds))
+        self.assertEqual(field.matrix_invert(mds), invmds)
+        cols = [[random.randrange(256) for _ in range(4)] for _ in range(10)]
+        self.assertEqual(field.matrix_columns(mds, cols),
+                         [[field.dot(row, col) for row in mds] for col in cols])
+        self.assertRaises(GF2nError, field.matrix_invert, [[1, 1], [1, 1]])
+        self.assertRaises(GF2nError, field.matrix_multiply, [[1, 2]], [[1, 2]])
+
+    @unittest.skipUnless(np is not None, "numpy not installed")
+    def test_numpy(self):
+        field = GF2n(0x1002B)
+        xs = np.array([0, 1, 2, 65535, 4321], dtype=np.uint16)
+        self.assertEqual(field.multiply_many(xs, 77).tolist(), field.multiply_many(xs.tolist(), 77))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+from symmetric.aes import AES
+from symmetric.keysearch import KeySearch, MaskSpace, WordlistSpace, charsets, derivations
+from util.blockcipher import Mode, Padding
+from util.error import KeySearchError
+
+class TestMask(TestCase):
+    def test_candidates(self):
+        space = MaskSpace(b"ab??", b"xyz")
+        self.assertEqual(space.size, 9)
+        cands = list(space.candidates(0, 9))
+        self.assertEqual(len(set(cands)), 9)
+        self.assertEqual(cands[0], b"abxx")
+        self.assertEqual(cands[-1], b"abzz")
+        self.assertEqual(list(space.candidates(4, 6)), cands[4:6])
+
+    def test_modes(self):
+        key = b"YELLOW SUBMARINE"
+        plain = b"Attack at dawn!! and some more text"
+        space = MaskSpace(b"YELLOW SUBMAR??E", charsets["upper"])
+        for mode, iv in [(Mode.ECB, None), (Mode.CBC, os.urandom(16)), (Mode.CTR, os.urandom(8))]:
+            cipher = AES(key, mode, Padding.PKCS7, iv).encrypt_bytes(plain)
+            search = KeySearch(space, plain, cipher, mode, iv)
+            self.assertEqual(search.run(), key)
+            self.assertGreater(search.tested, 0)
+
+    def test_parallel(self):
+        key = b"0123456789abc" + b"fed"
+        plain = b"A"*16
+        cipher = AES(key, Mode.ECB, Padding.NONE).encrypt_bytes(plain)
+        space = MaskSpace(b"0123456789abc???", charsets["hex"])
+        space.chunk = 256
+        reports = []
+        search = KeySearch(space, plain, cipher, workers=2)
+        self.assertEqual(search.run(lambda *args: reports.append(args), 0), key)
+        self.assertTrue(reports)
+
+    def test_not_found(self):
+        cipher = AES(b"YELLOW SUBMARINE", Mode.ECB, Padding.NONE).encrypt_bytes(b"A"*16)
+        search = KeySearch(MaskSpace(b"YELLOW SUBMARIN?", b"abc"), b"A"*16, cipher)
+        with self.assertRaises(KeySearchError):
+            search.run()
+        self.assertEqual(search.tested, 3)
+
+    def test_iv(self):
+        space = MaskSpace(b"YELLOW SUBMARIN?", b"abc")
+        for mode, iv in [(Mode.CBC, None), (Mode.CBC, b"short"), (Mode.CTR, None), (Mode.CTR, bytes(16))]:
+            with self.assertRaises(KeySearchError):
+                KeySearch(space, b"A"*16, b"B"*16, mode, iv)
+
+# -------------------------------------------------------------------------- #
+
+class TestWordlist(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            for i in range(500):
+                f.write("password{}\n".format(i).encode())
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_shards(self):
+        space = WordlistSpace(self.path)
+        full = list(space.candidates(0, space.size))
+        self.assertEqual(len(full), 500)
+        sharded = []
+        for start in range(0, space.size, 7):
+            sharded.extend(space.candidates(start, start + 7))
+        self.assertEqual(sharded, full)
+
+    def test_derive(self):
+        key = derivations["md5"](b"password321")
+        cipher = AES(key, Mode.ECB, Padding.NONE).encrypt_bytes(b"B"*16)
+        space = WordlistSpace(self.path)
+        space.chunk = 1000
+        for workers in [1, 2]:
+            search = KeySearch(space, b"B"*16, cipher, derive=derivations["md5"], workers=workers)
+            self.assertEqual(search.run(), key)
+            self.assertEqual(search.candidate, b"password321")
+
+# -------------------------------------------------------------------------- #
+
+if __name__ == '__main__':
+    unittest.main()
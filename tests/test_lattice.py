@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import random
+import unittest
+from fractions import Fraction
+from unittest import TestCase
+
+import gmpy2
+
+from asymmetric import lattice
+from asymmetric.lattice import lll, is_reduced, integer_roots, poly_mul, poly_eval, small_roots, \
+    bivariate_small_roots, resultant_y
+from asymmetric.rsa import PubKey, factor_high_bits, stereotyped
+from util.error import LatticeError, CoppersmithError
+
+def prime(bits, seed):
+    """Return a prime [int] of 'bits' bits."""
+    rng = random.Random(seed)
+    return int(gmpy2.next_prime(rng.getrandbits(bits) | (1 << (bits - 1))))
+
+def gram_det(basis):
+    """Return the Gram determinant [int] of 'basis' (Bareiss), the squared volume of the lattice."""
+    mat = [[sum(a*b for a, b in zip(x, y)) for y in basis] for x in basis]
+    dim = len(mat)
+    sign, prev = 1, 1
+    for k in range(dim - 1):
+        if mat[k][k] == 0:
+            swap = next(i for i in range(k + 1, dim) if mat[i][k])
+            mat[k], mat[swap] = mat[swap], mat[k]
+            sign = -sign
+        for i in range(k + 1, dim):
+            for j in range(k + 1, dim):
+                mat[i][j] = (mat[i][j]*mat[k][k] - mat[i][k]*mat[k][j])//prev
+        prev = mat[k][k]
+    return sign*mat[-1][-1]
+
+
+class TestLLL(TestCase):
+    def setUp(self):
+        rng = random.Random(1)
+        self.basis = [[rng.randint(-1000, 1000) for j in range(12)] for i in range(10)]
+
+    def test_reduced(self):
+        res = lll(self.basis, exact=True)
+        self.assertTrue(is_reduced(res))
+        # Floating-point size reduction up to 0.51
+        res = lll(self.basis, prec=40)
+        self.assertTrue(is_reduced(res, eta=Fraction(51, 100)))
+        self.assertEqual(len(res), len(self.basis))
+        self.assertFalse(is_reduced(self.basis))
+
+    def test_same_lattice(self):
+        self.assertEqual(gram_det(lll(self.basis)), gram_det(self.basis))
+        self.assertEqual(gram_det(lll(self.basis, exact=True)), gram_det(self.basis))
+
+    def test_knapsack(self):
+        # Subset sum with a unique short solution
+        rng = random.Random(2)
+        weights = [rng.getrandbits(60) for i in range(12)]
+        subset = [1, 0, 1, 1, 0, 0, 1, 0, 1, 1, 0, 1]
+        target = sum(w for w, s in zip(weights, subset) if s)
+        basis = [[2*int(i == j) for j in range(12)] + [w << 20] for i, w in enumerate(weights)]
+        basis.append([1]*12 + [target << 20])
+        for exact in [True, False]:
+            # Solution vector: +-(2*subset - 1, 0), subset[0] being 1
+            sols = [[(1 + c*row[0])//2 for c in row[:-1]] for row in lll(basis, exact=exact)
+                    if row[-1] == 0 and all(abs(c) == 1 for c in row[:-1])]
+            self.assertIn(subset, sols)
+
+    def test_errors(self):
+        self.assertRaises(LatticeError, lll, [[1, 2], [2, 4]], exact=True)
+        self.assertRaises(LatticeError, lll, [[1, 2], [2, 4]])
+        self.assertRaises(LatticeError, lll, [[1, 2], [3]])
+        self.assertRaises(LatticeError, lll, [[1, 0], [0, 1]], 0.2)
+
+
+class TestPolynomials(TestCase):
+    def test_integer_roots(self):
+        poly = poly_mul(poly_mul([-5, 1], [7, 1]), [3, 1, 1])
+        self.assertEqual(integer_roots(poly), [-7, 5])
+        self.assertEqual(integer_roots(poly_mul([-5, 1], [-5, 1])), [5])
+        self.assertEqual(integer_roots([0, 0, 1, 1]), [-1, 0])
+        big = 123456789123456789123456789
+        poly = poly_mul([-big, 1], [big + 2, 3])
+        self.assertEqual(integer_roots(poly, big), [big])
+        self.assertEqual(integer_roots([1, 0, 1]), [])
+
+    def test_resultant(self):
+        # Res_y(y - 3, x + y) = x + 3
+        self.assertEqual(resultant_y({(0, 1): 1, (0, 0): -3}, {(1, 0): 1, (0, 1): 1}), [3, 1])
+        # Res_y(y^2 - x, y - 2) = 4 - x
+        self.assertEqual(resultant_y({(0, 2): 1, (1, 0): -1}, {(0, 1): 1, (0, 0): -2}), [4, -1])
+
+
+class TestCoppersmith(TestCase):
+    def setUp(self):
+        self.p, self.q = prime(256, 3), prime(256, 4)
+        self.n = self.p*self.q
+
+    def test_univariate(self):
+        root = 123456789012
+        f = [-root**3 % self.n, 0, 0, 1]
+        for exact in [True, False]:
+            self.assertEqual(small_roots(f, self.n, 1 << 40, exact=exact), [root])
+        # Second root large: (x - root)*(x - big)
+        big = self.n//3
+        f = [root*big % self.n, -(root + big) % self.n, 1]
+        self.assertEqual(small_roots(f, self.n, 1 << 40), [root])
+        self.assertRaises(LatticeError, small_roots, [self.p, self.p], self.n)
+
+    def test_unusable_row(self):
+        root = 123456789012
+        f = [-root**3 % self.n, 0, 0, 1]
+        calls = []
+
+        def first_fails(poly, bound=None):
+            calls.append(poly)
+            if len(calls) == 1:
+                raise LatticeError("Unable to find the roots of the polynomial")
+            return integer_roots(poly, bound)
+
+        def all_fail(poly, bound=None):
+            raise LatticeError("Unable to find the roots of the polynomial")
+
+        try:
+            # The first reduced vector cannot be used, the next ones give the root
+            lattice.integer_roots = first_fails
+            self.assertEqual(small_roots(f, self.n, 1 << 40), [root])
+            self.assertGreater(len(calls), 1)
+            lattice.integer_roots = all_fail
+            self.assertRaises(LatticeError, small_roots, f, self.n, 1 << 40)
+        finally:
+            lattice.integer_roots = integer_roots
+
+    def test_divisor(self):
+        low = self.p & ((1 << 100) - 1)
+        roots = small_roots([self.p - low, 1], self.n, 1 << 100, 0.49)
+        self.assertEqual(roots, [low])
+        self.assertEqual(poly_eval([self.p - low, 1], roots[0]), self.p)
+
+    def test_bivariate(self):
+        rng = random.Random(5)
+        x0, y0 = rng.getrandbits(32), rng.getrandbits(32)
+        a, b = rng.randrange(self.n), rng.randrange(self.n)
+        f = {(1, 1): 1, (1, 0): a, (0, 1): b, (0, 0): -(x0*y0 + a*x0 + b*y0) % self.n}
+        self.assertEqual(bivariate_small_roots(f, self.n, 1 << 32, 1 << 32, 2), [(x0, y0)])
+
+    def test_high_bits(self):
+        pk = PubKey(self.n, 65537)
+        for unknown in [64, 110]:
+            hint = self.p >> unknown << unknown
+            self.assertEqual(factor_high_bits(pk, hint, unknown), tuple(sorted([self.p, self.q])))
+        self.assertEqual(factor_high_bits(pk, self.p >> 80 << 80, 80, True), tuple(sorted([self.p, self.q])))
+        self.assertRaises(CoppersmithError, factor_high_bits, pk, self.p >> 200 << 200, 200)
+
+    def test_stereotyped(self):
+        pk = PubKey(self.n, 3)
+        plain = b"The secret code is: hunter2!XY. Bye."
+        c = pow(int.from_bytes(plain, "big"), 3, self.n)
+        known = b"The secret code is: " + bytes(10) + b". Bye."
+        self.assertEqual(stereotyped(pk, c, known, 10, 6), plain)
+        plain = b"Key: 0123456789abcdefgh"
+        c = pow(int.from_bytes(plain, "big"), 3, self.n)
+        self.assertEqual(stereotyped(pk, c, b"Key: " + bytes(18), 18), plain)
+        self.assertRaises(CoppersmithError, stereotyped, pk, c, b"Key: " + bytes(18), 30)
+
+if __name__ == '__main__':
+    unittest.main()
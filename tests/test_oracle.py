@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import os
+import socketserver
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+from urllib.parse import urlsplit, parse_qs
+
+from symmetric.aes import AES
+from symmetric.oracle import Oracle, CallableOracle, TCPOracle, HTTPOracle, SubprocessOracle
+from symmetric.padoracle import PaddingOracleAttack
+from util.blockcipher import Mode, Padding
+from util.error import PadOracleError
+
+_key = os.urandom(16)
+
+def valid_padding(cipher):
+    """Local (strict PKCS7) padding oracle: the first block of 'cipher' is the IV."""
+    plain = AES(_key, Mode.CBC, Padding.NONE, cipher[:16]).decrypt_bytes(cipher[16:])
+    pad = plain[-1]
+    return 1 <= pad <= 16 and plain[-pad:] == bytes([pad])*pad
+
+def encrypt(plain):
+    iv = os.urandom(16)
+    return iv + AES(_key, Mode.CBC, Padding.PKCS7, iv).encrypt_bytes(plain)
+
+# Oracle program used by the subprocess transport
+_script = """
+import sys
+key = bytes.fromhex(sys.argv[1])
+from symmetric.aes import AES
+from util.blockcipher import Mode, Padding
+for line in sys.stdin.buffer:
+    cipher = bytes.fromhex(line.decode().strip())
+    plain = AES(key, Mode.CBC, Padding.NONE, cipher[:16]).decrypt_bytes(cipher[16:])
+    pad = plain[-1]
+    ok = 1 <= pad <= 16 and plain[-pad:] == bytes([pad])*pad
+    sys.stdout.buffer.write(b"ok\\n" if ok else b"Error\\n")
+    sys.stdout.buffer.flush()
+"""
+
+
+class PromptHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.wfile.write(b"Welcome!\n")
+        while True:
+            self.wfile.write(b"cipher> ")
+            line = self.rfile.readline()
+            if not line:
+                return
+            cipher = bytes.fromhex(line.decode().strip())
+            self.wfile.write(b"Padding OK\n" if valid_padding(cipher) else b"Error: bad padding\n")
+
+
+class HTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()
+
+    def do_GET(self):
+        HTTPHandler.connections.add(self.client_address)
+        cipher = bytes.fromhex(parse_qs(urlsplit(self.path).query)["c"][0])
+        status = 200 if valid_padding(cipher) else 500
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTransports(TestCase):
+    def setUp(self):
+        self.plain = b"Pluggable transports"
+        self.cipher = encrypt(self.plain)
+        self.good = self.cipher[:32]
+        self.bad = self.cipher[:15] + bytes([self.cipher[15] ^ 0x55]) + self.cipher[16:32]
+        self.expected = [valid_padding(self.good), valid_padding(self.bad)]
+
+    def test_callable(self):
+        oracle = CallableOracle(valid_padding)
+        self.assertEqual(oracle.query_many([self.good, self.bad]), self.expected)
+        calls = []
+        oracle = CallableOracle(valid_padding, lambda cs: calls.append(cs) or [valid_padding(c) for c in cs])
+        self.assertEqual(oracle.query_many([self.good, self.bad]), self.expected)
+        self.assertEqual(len(calls), 1)
+        attack = PaddingOracleAttack(lambda: CallableOracle(valid_padding), 2, 16)
+        self.assertEqual(attack.run(self.cipher), self.plain)
+
+    def test_tcp(self):
+        with socketserver.ThreadingTCPServer(("127.0.0.1", 0), PromptHandler) as server:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            port = server.server_address[1]
+            try:
+                with TCPOracle("127.0.0.1", port, b"Error", b"cipher> ") as oracle:
+                    self.assertEqual(oracle.query(self.good), self.expected[0])
+                    self.assertEqual(oracle.query_many([self.good, self.bad]*40), self.expected*40)
+                attack = PaddingOracleAttack(lambda: TCPOracle("127.0.0.1", port, b"Error", b"cipher> "), 2, 32)
+                self.assertEqual(attack.run(self.cipher), self.plain)
+            finally:
+                server.shutdown()
+
+    def test_http(self):
+        HTTPHandler.connections = set()
+        with ThreadingHTTPServer(("127.0.0.1", 0), HTTPHandler) as server:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = "http://127.0.0.1:{}/oracle".format(server.server_address[1])
+            try:
+                with HTTPOracle(url) as oracle:
+                    self.assertEqual(oracle.query_many([self.good, self.bad]*5), self.expected*5)
+                # Keep-alive: a single connection was used
+                self.assertEqual(len(HTTPHandler.connections), 1)
+            finally:
+                server.shutdown()
+        self.assertRaises(PadOracleError, HTTPOracle, "ftp://127.0.0.1/")
+
+    def test_subprocess(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        args = [sys.executable, "-c", "import sys; sys.path.insert(0, {!r})\n".format(root) + _script, _key.hex()]
+        with SubprocessOracle(args) as oracle:
+            self.assertEqual(oracle.query_many([self.good, self.bad]*100), self.expected*100)
+        attack = PaddingOracleAttack(lambda: SubprocessOracle(args), 1, 64)
+        self.assertEqual(attack.run(self.cipher), self.plain)
+
+    def test_encoding(self):
+        self.assertRaises(PadOracleError, SubprocessOracle, ["true"], encoding="rot13")
+
+    def test_abstract(self):
+        class Incomplete(Oracle):
+            pass
+
+        class Local(Oracle):
+            def query(self, cipher):
+                return valid_padding(cipher)
+
+        # An incomplete transport fails at instantiation, not during the attack
+        self.assertRaises(TypeError, Incomplete)
+        with Local() as oracle:
+            self.assertEqual(oracle.query_many([self.good, self.bad]), self.expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
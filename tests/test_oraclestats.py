@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import TestCase
+
+from symmetric.oraclestats import OracleStats
+from symmetric.padoracle import PaddingOracleAttack
+from tests.test_padoracle import LocalConnection, encrypt
+
+
+class Clock:
+    """Manual time source."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestOracleStats(TestCase):
+    def test_counters(self):
+        clock = Clock()
+        stats = OracleStats(clock=clock)
+        for _ in range(10):
+            stats.query(8, 0.008)
+        stats.recover(3)
+        clock.now = 2.0
+        stats.error()
+        self.assertEqual((stats.queries, stats.batches, stats.errors, stats.reconnections), (80, 10, 1, 1))
+        self.assertEqual(stats.qps(), 40)
+        self.assertEqual(stats.timeline, [(0.0, 3)])
+        data = stats.to_dict()
+        self.assertEqual(data["latency"]["histogram"], {"0.001024": 10})
+        self.assertEqual(data["latency"]["p50"], 0.001024)
+        self.assertAlmostEqual(data["latency"]["mean"], 0.001)
+        self.assertEqual(json.loads(stats.to_json())["queries"], 80)
+
+    def test_throttle(self):
+        stats = OracleStats(warmup=8, clock=Clock())
+        for _ in range(20):
+            stats.query(1, 0.01)
+        self.assertEqual((stats.baseline, stats.delay, stats.anomalies), (0.01, 0.0, []))
+        # Rate limited oracle: 10x slower
+        for _ in range(20):
+            stats.query(1, 0.1)
+        self.assertGreater(stats.delay, stats.min_delay)
+        self.assertLessEqual(stats.delay, stats.max_delay)
+        self.assertEqual(stats.anomalies[0]["reason"], "latency")
+        for _ in range(50):
+            stats.query(1, 0.01)
+        self.assertEqual(stats.delay, 0.0)
+        # Latency spikes on fast oracles are ignored
+        stats = OracleStats(warmup=8, clock=Clock())
+        for latency in [1e-5]*10 + [1e-3]*10:
+            stats.query(1, latency)
+        self.assertEqual(stats.anomalies, [])
+        stats = OracleStats(False, warmup=8, clock=Clock())
+        for latency in [0.01]*10 + [0.1]*10:
+            stats.query(1, latency)
+        self.assertTrue(stats.anomalies)
+        self.assertEqual(stats.delay, 0.0)
+
+    def test_log(self):
+        stream = io.StringIO()
+        stats = OracleStats()
+        stats.query(4, 0.001)
+        stats.start_log(0.01, stream)
+        time.sleep(0.1)
+        stats.stop_log()
+        self.assertIn("4 queries", stream.getvalue())
+
+    def test_attack(self):
+        plain = b"instrumented padding oracle attack"
+        stats = OracleStats()
+        attack = PaddingOracleAttack(lambda: LocalConnection(101), 2, 8, stats=stats)
+        self.assertEqual(attack.run(encrypt(plain)), plain)
+        self.assertEqual(stats.queries, attack.queries)
+        self.assertGreater(stats.errors, 0)
+        self.assertEqual(stats.reconnections, attack.pool.reconnections)
+        self.assertEqual(stats.recovered, 16*len(attack.block_queries))
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            stats.to_json(path)
+            with open(path) as f:
+                self.assertEqual(json.load(f)["recovered"], stats.recovered)
+        finally:
+            os.remove(path)
+
+    def test_one_reconnect(self):
+        # Only the first connection fails, on its first query
+        LocalConnection.opened = 0
+        stats = OracleStats()
+        attack = PaddingOracleAttack(lambda: LocalConnection(1 if LocalConnection.opened == 0 else 0),
+                                     stats=stats)
+        plain = b"one reconnection"
+        self.assertEqual(attack.run(encrypt(plain)), plain)
+        self.assertEqual(LocalConnection.opened, 2)
+        self.assertEqual((stats.errors, stats.reconnections, attack.pool.reconnections), (1, 1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+import os
+import socketserver
+import tempfile
+import threading
+import unittest
+from unittest import TestCase
+
+from symmetric.aes import AES
+from symmetric.guess import GuessModel, NumericModel
+from symmetric.oracle import CallableOracle, Oracle
+from symmetric.padoracle import Journal, PaddingOracleAttack, padding_oracle
+from util.blockcipher import Mode, Padding
+from util.error import PadOracleError
+
+_key = os.urandom(16)
+
+def encrypt(plain):
+    """Return IV || AES-CBC(plain) with the test key."""
+    iv = os.urandom(16)
+    return iv + AES(_key, Mode.CBC, Padding.PKCS7, iv).encrypt_bytes(plain)
+
+def valid_padding(cipher):
+    """Local (strict PKCS7) padding oracle: the first block of 'cipher' is the IV."""
+    plain = AES(_key, Mode.CBC, Padding.NONE, cipher[:16]).decrypt_bytes(cipher[16:])
+    pad = plain[-1]
+    return 1 <= pad <= 16 and plain[-pad:] == bytes([pad])*pad
+
+
+class LocalConnection(Oracle):
+    """In-process oracle connection, failing every 'fail_every' queries."""
+    opened = 0
+
+    def __init__(self, fail_every=0):
+        LocalConnection.opened += 1
+        self.fail_every = fail_every
+        self.count = 0
+
+    def query(self, cipher):
+        self.count += 1
+        if self.fail_every and self.count % self.fail_every == 0:
+            raise ConnectionResetError("connection reset")
+        return valid_padding(cipher)
+
+    def close(self):
+        pass
+
+
+class OracleHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        for count, line in enumerate(self.rfile, 1):
+            if count % 200 == 0:
+                # Drop the connection from time to time
+                return
+            cipher = bytes.fromhex(line.decode().strip())
+            self.wfile.write(b"OK\n" if valid_padding(cipher) else b"Error: invalid padding\n")
+
+
+class PromptOracleHandler(socketserver.BaseRequestHandler):
+    """Oracle of the original padding_oracle() protocol: greeting, prompt, request without newline."""
+    def handle(self):
+        self.request.sendall(b"Welcome to the padding oracle\n")
+        while True:
+            self.request.sendall(b"cipher> ")
+            data = self.request.recv(4096)
+            if not data:
+                return
+            valid = valid_padding(bytes.fromhex(data.decode()))
+            self.request.sendall(b"OK\n" if valid else b"Error: invalid padding\n")
+
+
+class TestPaddingOracle(TestCase):
+    def test_local(self):
+        for plain in [b"", b"YELLOW SUBMARINE", os.urandom(45)]:
+            attack = PaddingOracleAttack(LocalConnection, connections=4, pipeline=8)
+            self.assertEqual(attack.run(encrypt(plain)), plain)
+            self.assertGreater(attack.queries, 0)
+
+    def test_serial(self):
+        plain = b"attack at dawn"
+        attack = PaddingOracleAttack(LocalConnection, connections=1, pipeline=1)
+        self.assertEqual(attack.run(encrypt(plain)), plain)
+
+    def test_reconnect(self):
+        LocalConnection.opened = 0
+        attack = PaddingOracleAttack(lambda: LocalConnection(97), connections=3, pipeline=4)
+        plain = os.urandom(40)
+        self.assertEqual(attack.run(encrypt(plain)), plain)
+        self.assertGreater(attack.pool.reconnections, 0)
+        self.assertLessEqual(LocalConnection.opened, 3 + attack.pool.reconnections)
+
+    def test_refused(self):
+        # The server refuses the first connection (e.g. while restarting)
+        refused = []
+
+        def connect():
+            if not refused:
+                refused.append(True)
+                raise ConnectionRefusedError("connection refused")
+            return LocalConnection()
+
+        attack = PaddingOracleAttack(connect)
+        plain = b"refused once"
+        self.assertEqual(attack.run(encrypt(plain)), plain)
+        self.assertEqual((attack.stats.errors, attack.stats.reconnections), (1, 0))
+
+        def never():
+            raise ConnectionRefusedError("connection refused")
+
+        self.assertRaises(PadOracleError, PaddingOracleAttack(never, retries=2).run, encrypt(plain))
+
+    def test_errors(self):
+        self.assertRaises(PadOracleError, PaddingOracleAttack(LocalConnection).run, b"a"*17)
+        self.assertRaises(PadOracleError, PaddingOracleAttack(LocalConnection).run, b"a"*16)
+        attack = PaddingOracleAttack(lambda: LocalConnection(1), connections=2, retries=2)
+        self.assertRaises(PadOracleError, attack.run, encrypt(b"test"))
+        # Two failed attempts, no reconnection after the last one
+        self.assertEqual((attack.stats.errors, attack.stats.reconnections), (2, 1))
+        self.assertRaises(PadOracleError, PaddingOracleAttack, LocalConnection, 0)
+
+    def test_encrypt(self):
+        for plain in [b"", b"forged by the padding oracle, no key needed"]:
+            attack = PaddingOracleAttack(LocalConnection, connections=2, pipeline=8)
+            forged = attack.encrypt(plain)
+            self.assertEqual(len(forged), 16*(len(plain)//16 + 2))
+            aes = AES(_key, Mode.CBC, Padding.PKCS7, forged[:16])
+            self.assertEqual(aes.decrypt_bytes(forged[16:]), plain)
+            self.assertEqual(attack.run(forged), plain)
+        self.assertRaises(PadOracleError, attack.encrypt, b"test", b"short")
+
+    def test_encrypt_reuse(self):
+        cipher = encrypt(b"The intermediate state of these blocks is known")
+        attack = PaddingOracleAttack(LocalConnection, connections=2, pipeline=8)
+        attack.run(cipher)
+        self.assertEqual(set(attack.known_blocks()), set(cipher[i:i+16] for i in range(16, 64, 16)))
+        queries = attack.queries
+        forged = attack.encrypt(b"admin=true", cipher[-16:])
+        self.assertEqual(forged[-16:], cipher[-16:])
+        self.assertEqual((attack.queries, attack.block_queries), (queries, [0]))
+        forged = attack.encrypt(b"admin=true" + b"!"*20)
+        self.assertEqual(attack.block_queries[-1], 0)
+        self.assertGreater(attack.block_queries[0], 0)
+        self.assertEqual(PaddingOracleAttack(LocalConnection).run(forged), b"admin=true" + b"!"*20)
+
+    def test_socket(self):
+        with socketserver.ThreadingTCPServer(("127.0.0.1", 0), OracleHandler) as server:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            host = {"hostname": "127.0.0.1", "port": server.server_address[1], "error": b"Error"}
+            try:
+                plain = b"Just a plaintext for the padding oracle"
+                cipher = encrypt(plain).hex().encode()
+                self.assertEqual(padding_oracle(cipher, host, 4, 16, "line"), plain)
+            finally:
+                server.shutdown()
+
+    def test_socket_recv(self):
+        with socketserver.ThreadingTCPServer(("127.0.0.1", 0), PromptOracleHandler) as server:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            host = {"hostname": "127.0.0.1", "port": server.server_address[1], "error": b"Error",
+                    "prompt": b"cipher> "}
+            try:
+                plain = b"original protocol"
+                self.assertEqual(padding_oracle(encrypt(plain).hex().encode(), host), plain)
+            finally:
+                server.shutdown()
+
+
+class TestGuessModel(TestCase):
+    def test_order(self):
+        model = GuessModel()
+        order = model.order()
+        self.assertEqual(sorted(order), list(range(256)))
+        self.assertEqual(order[:3], [ord(" "), ord("e"), ord("t")])
+        self.assertLess(order.index(ord("z")), order.index(0x00))
+        self.assertEqual(NumericModel().order(), list(range(256)))
+
+    def test_padding(self):
+        model = GuessModel()
+        self.assertEqual(model.order(b"", True)[:16], list(range(1, 17)))
+        self.assertEqual(model.order(b"\x03", True)[0], 3)
+        self.assertEqual(model.order(b"\x03\x03\x03", True)[0], ord(" "))
+
+    def test_adaptive(self):
+        model = GuessModel()
+        for _ in range(100):
+            model.update(ord("Q"), b"u")
+        self.assertEqual(model.order(b"u")[0], ord("Q"))
+        self.assertEqual(GuessModel(False).order(b"u")[0], ord(" "))
+
+    def test_queries(self):
+        plain = (b"It was the best of times, it was the worst of times, it was the age of "
+                 b"wisdom, it was the age of foolishness...")
+        cipher = encrypt(plain)
+        numeric = PaddingOracleAttack(LocalConnection, 1, 1, model=NumericModel())
+        self.assertEqual(numeric.run(cipher), plain)
+        attack = PaddingOracleAttack(LocalConnection, 1, 1)
+        self.assertEqual(attack.run(cipher), plain)
+        self.assertEqual(sum(attack.block_queries), attack.queries)
+        self.assertEqual(len(attack.block_queries), len(cipher)//16 - 1)
+        self.assertLess(3*attack.queries, numeric.queries)
+
+    def test_false_positive(self):
+        # Block whose decryption has \x02 as 15th byte: with a zero forged
+        # prefix, the last byte guess giving \x02\x02 is also valid
+        aes = AES(_key, Mode.ECB, Padding.NONE)
+        while True:
+            block = os.urandom(16)
+            if aes.decrypt_bytes(block)[14] == 2:
+                break
+        iv = os.urandom(16)
+        expected = bytes(a ^ b for a, b in zip(aes.decrypt_bytes(block), iv))
+        for model in [NumericModel(), GuessModel()]:
+            attack = PaddingOracleAttack(LocalConnection, 1, 8, model=model)
+            self.assertEqual(attack.decrypt_block(iv, block), expected)
+
+
+class TestJournal(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_resume(self):
+        plain = b"An interrupted attack resumed from its journal"
+        cipher = encrypt(plain)
+        sent = []
+        def connect(limit=None):
+            def query(c):
+                if limit is not None and len(sent) >= limit:
+                    raise PadOracleError("interrupted")
+                sent.append(c)
+                return valid_padding(c)
+            return CallableOracle(query)
+        journal = Journal(self.path)
+        attack = PaddingOracleAttack(lambda: connect(300), 1, 4, journal=journal)
+        self.assertRaises(PadOracleError, attack.run, cipher)
+        journal.close()
+        first = len(sent)
+        # A truncated last line is ignored
+        with open(self.path, "a") as f:
+            f.write('{"q": "00')
+        journal = Journal(self.path, resume=True)
+        answered = set(journal.answers)
+        self.assertGreater(len(answered), first - 4)
+        self.assertTrue(journal.recovered)
+        attack = PaddingOracleAttack(connect, 1, 4, journal=journal)
+        self.assertEqual(attack.run(cipher), plain)
+        journal.close()
+        self.assertFalse(answered.intersection(sent[first:]))
+        self.assertEqual(attack.queries, len(sent) - first)
+        # Everything is known once the attack is over
+        journal = Journal(self.path, resume=True)
+        attack = PaddingOracleAttack(connect, 1, 4, journal=journal)
+        self.assertEqual(attack.run(cipher), plain)
+        journal.close()
+        self.assertEqual(attack.queries, 0)
+
+    def test_cache(self):
+        cipher = encrypt(b"cached answers")
+        attack = PaddingOracleAttack(LocalConnection, 1, 8)
+        self.assertEqual(attack.query_many([cipher]*3), [True]*3)
+        self.assertEqual((attack.queries, attack.cached), (1, 2))
+        self.assertTrue(attack.query(cipher))
+        self.assertEqual((attack.queries, attack.cached), (1, 3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,9 +2,11 @@
 
 from unittest import TestCase
 
-from asymmetric.rsa import RSA, PubKey, PrivKey, hastad, wiener
+import gmpy2
+
+from asymmetric.rsa import RSA, PubKey, PrivKey, hastad, wiener, extended_wiener, _continued_frac, _cvgs
 from util.convert import hex_to_str
-from util.error import RSAError
+from util.error import RSAError, WienerError
 
 class TestGen(TestCase):
     def test_simple(self):
@@ -26,6 +28,58 @@ class TestGen(TestCase):
 
 # -------------------------------------------------------------------------- #
 
+class TestCRT(TestCase):
+    def test_params(self):
+        r = RSA(61, 53, 17)
+        _, priv = r.gen_keys()
+        self.assertEqual((priv.p, priv.q, priv.dp, priv.dq, priv.qinv), (61, 53, 53, 49, 38))
+        self.assertEqual(priv.crt, [])
+        self.assertIs(r.gen_keys()[1], priv)
+
+    def test_decrypt(self):
+        primes = [gmpy2.next_prime(2**256 + i*2**200) for i in range(4)]
+        for k in range(2, 5):
+            pub, priv = RSA(primes[0], primes[1], 65537, primes[2:k]).gen_keys()
+            self.assertEqual(len(priv.crt), k - 2)
+            plain = b"multi-prime RSA with %d factors" % k
+            cipher = pub.encrypt(plain)
+            self.assertEqual(priv.decrypt(cipher), plain)
+            self.assertEqual(PrivKey(pub.n, priv.d).decrypt(cipher), plain)
+        # Repeated factor (n = p^2 q)
+        pub, priv = RSA(primes[0], primes[0], 65537, primes[1:2]).gen_keys()
+        self.assertEqual(priv.decrypt(pub.encrypt(b"prime power")), b"prime power")
+
+    def test_error(self):
+        with self.assertRaises(RSAError):
+            RSA(61, 53, 17, [12])
+        with self.assertRaises(RSAError):
+            PrivKey(3233, 413, [61, 59])
+
+# -------------------------------------------------------------------------- #
+
+class TestMany(TestCase):
+    def setUp(self):
+        p = gmpy2.next_prime(2**256)
+        q = gmpy2.next_prime(2**257)
+        self.pub, self.priv = RSA(p, q).gen_keys()
+        self.plains = [b"message %d" % i for i in range(300)] + [b"\x00", b"\xff"*32]
+
+    def test_serial(self):
+        ciphers = list(self.pub.encrypt_many(self.plains))
+        self.assertEqual(ciphers, [self.pub.encrypt(p) for p in self.plains])
+        self.assertEqual(list(self.priv.decrypt_many(ciphers)), self.plains)
+
+    def test_workers(self):
+        ciphers = list(self.pub.encrypt_many(iter(self.plains), workers=2, chunk=16))
+        self.assertEqual(ciphers, [self.pub.encrypt(p) for p in self.plains])
+        plains = self.priv.decrypt_many((c for c in ciphers), workers=2, chunk=50)
+        self.assertEqual(next(plains), b"message 0")
+        self.assertEqual(list(plains), self.plains[1:])
+        full = PrivKey(self.priv.n, self.priv.d)
+        self.assertEqual(list(full.decrypt_many(ciphers[:20], workers=2, chunk=8)), self.plains[:20])
+
+# -------------------------------------------------------------------------- #
+
 class TestCTF(TestCase):
     def test_abctf_oldrsa(self):
         plain = b"ABCTF{th1s_was_h4rd_in_1980}"
@@ -84,6 +138,24 @@ class TestWiener(TestCase):
         self.assertEqual(q, 239)
         self.assertEqual(d, 5)
 
+    def test_convergents(self):
+        coeffs = _continued_frac(649, 200)
+        self.assertEqual(next(coeffs), 3)
+        self.assertEqual(list(_cvgs(coeffs)), [(4, 1), (49, 12), (200, 49)])
+        self.assertEqual(list(_cvgs(_continued_frac(649, 200))), [(3, 1), (13, 4), (159, 49), (649, 200)])
+
+    def test_extended(self):
+        n = 94438858603502606974808219655933221334320305084488100558416199781699235952529
+        e = 43435944907718356162708944575359935180331274609765138153921198365077842385437
+        pub = PubKey(n, e)
+        with self.assertRaises(WienerError):
+            wiener(pub)
+        p, q, d = extended_wiener(pub, 8)
+        self.assertEqual(p*q, n)
+        self.assertEqual(d, 89559784301877387965)
+        self.assertEqual(extended_wiener(PubKey(90581, 17993), 1), (379, 239, 5))
+        self.assertRaises(WienerError, extended_wiener, pub, 0)
+
 # -------------------------------------------------------------------------- #
 
 class TestHastad(TestCase):
@@ -1 +1 @@
-__all__ = ["error", "blockcipher", "convert", "gf28"]
+__all__ = ["error", "blockcipher", "convert", "gf28", "gf2n", "parallel"]
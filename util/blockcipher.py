@@ -6,6 +6,7 @@ class Mode(IntEnum):
     """Encryption mode."""
     ECB = 0
     CBC = 1
+    CTR = 2
 
 class Padding(IntEnum):
     """Padding scheme."""
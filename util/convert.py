@@ -39,8 +39,7 @@ def str_to_hexarray(bstr):
 
 def str_to_matrix(bstr):
     """Convert byte string into a 4x4 column-major order matrix."""
-    hexarray = str_to_hexarray(bstr)
-    return [[hexarray[k] for k in range(i, 16, 4)] for i in range(4)]
+    return [list(bstr[i:16:4]) for i in range(4)]
 
 # -------------------------------------------------------------------------- #
 
@@ -39,6 +39,12 @@ class HastadError(RSAError):
 class CommonModError(RSAError):
     """Common modulus attack error."""
     pass
+class BatchGCDError(RSAError):
+    """Batch GCD error."""
+    pass
+class CoppersmithError(RSAError):
+    """Coppersmith's attacks error."""
+    pass
 
 # -------------------------------------------------------------------------- #
 
@@ -50,6 +56,10 @@ class GF28Error(Exception):
     def __str__(self):
         return self.value
 
+class GF2nError(GF28Error):
+    """Generic GF(2^n) operations error."""
+    pass
+
 # -------------------------------------------------------------------------- #
 
 class AESError(Exception):
@@ -60,6 +70,13 @@ class AESError(Exception):
     def __str__(self):
         return self.value
 
+class KeySearchError(AESError):
+    """AES key search error."""
+    pass
+class GCMError(AESError):
+    """AES-GCM error (including authentication failures)."""
+    pass
+
 # -------------------------------------------------------------------------- #
 
 class PaddingError(Exception):
@@ -82,6 +99,16 @@ class PadOracleError(Exception):
 
 # -------------------------------------------------------------------------- #
 
+class ECBOracleError(Exception):
+    """Generic ECB encryption oracle attack error."""
+    def __init__(self, value):
+        super().__init__(value)
+        self.value = value
+    def __str__(self):
+        return self.value
+
+# -------------------------------------------------------------------------- #
+
 class DLPError(Exception):
     """Generic DLP error."""
     def __init__(self, value):
@@ -89,3 +116,13 @@ class DLPError(Exception):
         self.value = value
     def __str__(self):
         return self.value
+
+# -------------------------------------------------------------------------- #
+
+class LatticeError(Exception):
+    """Generic lattice reduction error."""
+    def __init__(self, value):
+        super().__init__(value)
+        self.value = value
+    def __str__(self):
+        return self.value
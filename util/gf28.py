@@ -1,9 +1,17 @@
 #!/usr/bin/env python3
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from util.error import GF28Error
 
 _LOGTABLE = None
 _ANTILOGTABLE = None
+# _PRODUCTS[(x << 8) | y] = x*y, built lazily (64 KB)
+_PRODUCTS = None
+_NP_PRODUCTS = None
 
 def _gen_tables():
     """Generate GF(2^8) _LOGTABLE and _ANTILOGTABLE with 3 as generator."""
@@ -15,7 +23,36 @@ def _gen_tables():
     for i in range(255):
         _LOGTABLE[x] = i
         _ANTILOGTABLE[i] = x
-        x = multiply(x, generator)
+        x = _shift_multiply(x, generator)
+
+def _gen_products():
+    """Generate the full _PRODUCTS table from the log/antilog tables."""
+    global _PRODUCTS
+    if not _LOGTABLE or not _ANTILOGTABLE:
+        _gen_tables()
+    products = bytearray(256*256)
+    for x in range(1, 256):
+        logx = _LOGTABLE[x]
+        products[x << 8 | 1:(x + 1) << 8] = bytes(_ANTILOGTABLE[(logx + _LOGTABLE[y]) % 255]
+                                                  for y in range(1, 256))
+    _PRODUCTS = bytes(products)
+
+def _products():
+    """Return the _PRODUCTS table [bytes] (generated if needed)."""
+    if _PRODUCTS is None:
+        _gen_products()
+    return _PRODUCTS
+
+def _np_products():
+    """Return the products table as a (256, 256) NumPy array."""
+    global _NP_PRODUCTS
+    if _NP_PRODUCTS is None:
+        _NP_PRODUCTS = np.frombuffer(_products(), dtype=np.uint8).reshape(256, 256)
+    return _NP_PRODUCTS
+
+def _is_array(data):
+    """Return True if 'data' is a NumPy array."""
+    return np is not None and isinstance(data, np.ndarray)
 
 def add(x, y):
     """Add x and y in GF(2^8)."""
@@ -23,6 +60,13 @@ def add(x, y):
 
 def multiply(x, y):
     """Multiply x and y in GF(2^8)."""
+    if 0 <= x < 256:
+        # Only the 8 lowest bits of y are used, as in the shift-and-add loop
+        return _products()[x << 8 | (y & 0xff)]
+    return _shift_multiply(x, y)
+
+def _shift_multiply(x, y):
+    """Multiply x and y in GF(2^8) with the shift-and-add algorithm."""
     res = 0
     for _ in range(8):
         if y & 0x1:
@@ -64,3 +108,83 @@ def invert(n):
         _gen_tables()
     inv_exp = (255 - _LOGTABLE[n]) % 255
     return _ANTILOGTABLE[inv_exp]
+
+# -------------------------------------------------------------------------- #
+
+def multiply_row(c):
+    """Return the products c*y for y in 0..255 [bytes], usable with bytes.translate()."""
+    if c < 0 or c > 255:
+        raise GF28Error("Unsupported value")
+    return _products()[c << 8:(c + 1) << 8]
+
+def multiply_bytes(data, c):
+    """Multiply every byte of 'data' [bytes-like|numpy.ndarray] by 'c' [int].
+
+    Output:
+    res [bytes|numpy.ndarray] -- products, a uint8 array if 'data' is an array
+    """
+    row = multiply_row(c)
+    if _is_array(data):
+        return _np_products()[c][data]
+    return bytes(data).translate(row)
+
+def xor_bytes(x, y):
+    """Add x and y [bytes-like] of the same size elementwise in GF(2^8)."""
+    if len(x) != len(y):
+        raise GF28Error("Operands' sizes not matching")
+    return (int.from_bytes(x, "big") ^ int.from_bytes(y, "big")).to_bytes(len(x), "big")
+
+def dot(x, y):
+    """Return the dot product [int] of the vectors x and y [bytes-like|numpy.ndarray] in GF(2^8)."""
+    if len(x) != len(y):
+        raise GF28Error("Vectors' sizes not matching")
+    if _is_array(x) or _is_array(y):
+        prods = _np_products()[np.asarray(x, dtype=np.uint8), np.asarray(y, dtype=np.uint8)]
+        return int(np.bitwise_xor.reduce(prods)) if len(prods) else 0
+    products = _products()
+    res = 0
+    for a, b in zip(bytes(x), bytes(y)):
+        res ^= products[a << 8 | b]
+    return res
+
+def matrix_columns(mat, columns):
+    """Multiply the matrix 'mat' by many columns at once in GF(2^8).
+
+    Keyword arguments:
+    mat [List<List<int>>] -- r x k matrix
+    columns [bytes-like|numpy.ndarray] -- concatenated k-byte columns (e.g. the
+        AES state of many blocks), or a (N, k) uint8 array
+    Output:
+    res [bytes|numpy.ndarray] -- concatenated r-byte result columns, or a (N, r) array
+    """
+    rows, size = len(mat), len(mat[0])
+    if any(len(r) != size for r in mat):
+        raise GF28Error("Malformed matrix")
+    if _is_array(columns):
+        cols = np.asarray(columns, dtype=np.uint8)
+        # (N, k) array, or concatenated k-byte columns as with bytes
+        if cols.ndim == 2 and cols.shape[1] != size or cols.ndim == 1 and len(cols) % size \
+                or cols.ndim not in (1, 2):
+            raise GF28Error("Columns' size not matching the matrix")
+        cols = cols.reshape(-1, size)
+        table = _np_products()
+        res = np.zeros((len(cols), rows), dtype=np.uint8)
+        for i, row in enumerate(mat):
+            for j, c in enumerate(row):
+                if c:
+                    res[:, i] ^= table[c][cols[:, j]]
+        return res
+    columns = bytes(columns)
+    if len(columns) % size:
+        raise GF28Error("Columns' size not matching the matrix")
+    count = len(columns)//size
+    # Each result row is computed on the whole column set with translate()
+    lines = [columns[j::size] for j in range(size)]
+    res = bytearray(count*rows)
+    for i, row in enumerate(mat):
+        acc = 0
+        for j, c in enumerate(row):
+            if c:
+                acc ^= int.from_bytes(lines[j].translate(multiply_row(c)), "big")
+        res[i::rows] = acc.to_bytes(count, "big")
+    return bytes(res)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from util.error import GF2nError
+
+# Log/antilog tables are used up to this degree, windowed multiplication above
+_log_limit = 16
+
+# Tables shared by every field using the same polynomial
+_cache = {}
+
+def clmul(x, y):
+    """Carry-less multiplication of x and y [int] (product of polynomials over GF(2))."""
+    res = 0
+    while y:
+        if y & 1:
+            res ^= x
+        y >>= 1
+        x <<= 1
+    return res
+
+def polymod(x, poly):
+    """Return the remainder [int] of the polynomial x divided by poly over GF(2)."""
+    deg = poly.bit_length() - 1
+    while x.bit_length() > deg:
+        x ^= poly << (x.bit_length() - 1 - deg)
+    return x
+
+def _polygcd(x, y):
+    """Return the gcd [int] of the polynomials x and y over GF(2)."""
+    while y:
+        x, y = y, polymod(x, y)
+    return x
+
+def is_irreducible(poly):
+    """Return True if the polynomial 'poly' [int] is irreducible over GF(2) (Ben-Or test)."""
+    deg = poly.bit_length() - 1
+    if deg < 1:
+        return False
+    power = 2
+    for _ in range(deg//2):
+        # power = x^(2^i) mod poly
+        power = polymod(clmul(power, power), poly)
+        if _polygcd(power ^ 2, poly) != 1:
+            return False
+    return True
+
+def _prime_factors(n):
+    """Return the distinct prime factors [List<int>] of n (trial division)."""
+    factors = []
+    p = 2
+    while p*p <= n:
+        if n % p == 0:
+            factors.append(p)
+            while n % p == 0:
+                n //= p
+        p += 1
+    if n > 1:
+        factors.append(n)
+    return factors
+
+# -------------------------------------------------------------------------- #
+
+class GF2n:
+    """Binary field GF(2^n) defined by an irreducible reduction polynomial.
+
+    Elements are ints in [0, 2^n[. Fields of degree up to 16 multiply with
+    log/antilog tables, larger ones with a 4-bit window and an 8-bit reduction
+    table. Tables are built on first use and shared between the fields using
+    the same polynomial.
+
+    Keyword arguments:
+    poly [int] -- reduction polynomial including the x^n term (e.g. 0x11B)
+    n [int] -- field degree (default degree of 'poly')
+    """
+    def __init__(self, poly, n=None):
+        deg = poly.bit_length() - 1
+        if n is None:
+            n = deg
+        if n < 1 or deg != n:
+            raise GF2nError("Polynomial degree does not match the field degree")
+        if not is_irreducible(poly):
+            raise GF2nError("Reducible polynomial")
+        self.poly = poly
+        self.n = n
+        self.order = (1 << n) - 1
+        self._tables = None
+
+    def __repr__(self):
+        return "GF2n({:#x}, {:d})".format(self.poly, self.n)
+
+    def __eq__(self, other):
+        return isinstance(other, GF2n) and self.poly == other.poly
+
+    def __hash__(self):
+        return hash(self.poly)
+
+    def tables(self):
+        """Return the field tables, generating them if needed.
+
+        Output:
+        (log, antilog, generator) [(array, array, int)] -- for degrees up to 16,
+            antilog being doubled so that no modular reduction is needed
+        (None, reduction, None) [(None, List<int>, None)] -- for larger degrees
+        """
+        if self._tables is None:
+            if self.poly not in _cache:
+                _cache[self.poly] = self._gen_tables()
+            self._tables = _cache[self.poly]
+        return self._tables
+
+    def _gen_tables(self):
+        """Generate the log/antilog tables or the windowed multiplication reduction table."""
+        n = self.n
+        # reduction[t] = t*x^n mod poly
+        reduction = [polymod(t << n, self.poly) for t in range(256)]
+        if n > _log_limit:
+            return None, reduction, None
+        self._tables = (None, reduction, None)
+        generator = self._find_generator()
+        typecode = "B" if n <= 8 else "H"
+        log = array(typecode, bytes(array(typecode, [0]).itemsize << n))
+        antilog = array(typecode, bytes(array(typecode, [0]).itemsize*2*self.order))
+        x = 1
+        for i in range(self.order):
+            log[x] = i
+            antilog[i] = antilog[i + self.order] = x
+            x = self._window_multiply(x, generator)
+        return log, antilog, generator
+
+    def _find_generator(self):
+        """Return the smallest generator [int] of the multiplicative group."""
+        if self.order == 1:
+            return 1
+        factors = _prime_factors(self.order)
+        for g in range(2, self.order + 1):
+            if all(self._window_pow(g, self.order//p) != 1 for p in factors):
+                return g
+        raise GF2nError("No generator found")
+
+    def _window_multiply(self, x, y):
+        """Multiply x and y with a 4-bit window and the reduction table."""
+        mults = [0]*16
+        mults[1] = x
+        for k in range(2, 16, 2):
+            mults[k] = mults[k >> 1] << 1
+            mults[k + 1] = mults[k] ^ x
+        res = 0
+        shift = (y.bit_length() + 3) & ~3
+        while shift:
+            shift -= 4
+            res = (res << 4) ^ mults[(y >> shift) & 0xf]
+        n = self.n
+        reduction = self.tables()[1]
+        while res >> n:
+            s = max(res.bit_length() - n - 8, 0)
+            t = res >> (n + s)
+            res ^= (t << (n + s)) ^ (reduction[t] << s)
+        return res
+
+    def _window_pow(self, x, e):
+        """Return x^e [int] by square and multiply."""
+        res = 1
+        while e:
+            if e & 1:
+                res = self._window_multiply(res, x)
+            x = self._window_multiply(x, x)
+            e >>= 1
+        return res
+
+    # ---------------------------------------------------------------------- #
+
+    def add(self, x, y):
+        """Add x and y."""
+        return x ^ y
+
+    def multiply(self, x, y):
+        """Multiply x and y."""
+        log, antilog, _ = self.tables()
+        if log is None:
+            return self._window_multiply(x, y)
+        if not x or not y:
+            return 0
+        return antilog[log[x] + log[y]]
+
+    def pow(self, x, e):
+        """Return x^e (negative exponents use the inverse of x)."""
+        if not x:
+            if e < 0:
+                raise GF2nError("Zero is not invertible")
+            return 0 if e else 1
+        log, antilog, _ = self.tables()
+        if log is None:
+            return self._window_pow(x, e % self.order)
+        return antilog[log[x]*e % self.order]
+
+    def invert(self, x):
+        """Return the inverse of x (0 is mapped to 0, as in the AES S-Box)."""
+        if x < 0 or x > self.order:
+            raise GF2nError("Unsupported value")
+        if not x:
+            return 0
+        return self.pow(x, -1)
+
+    def divide(self, x, y):
+        """Return x/y."""
+        if not y:
+            raise GF2nError("Division by zero")
+        return self.multiply(x, self.invert(y))
+
+    # ---------------------------------------------------------------------- #
+
+    def multiply_many(self, xs, c):
+        """Multiply every element of 'xs' [List<int>|numpy.ndarray] by 'c' [int].
+
+        Output:
+        res [List<int>|numpy.ndarray] -- products, an array if 'xs' is an array
+        """
+        log, antilog, _ = self.tables()
+        if np is not None and isinstance(xs, np.ndarray) and log is not None:
+            if not c:
+                return np.zeros_like(xs)
+            nlog, nantilog = np.asarray(log), np.asarray(antilog)
+            res = nantilog[nlog[xs].astype(np.int64) + log[c]].astype(xs.dtype)
+            res[xs == 0] = 0
+            return res
+        if log is None:
+            return [self._window_multiply(x, c) for x in xs]
+        if not c:
+            return [0 for x in xs]
+        logc = log[c]
+        return [antilog[log[x] + logc] if x else 0 for x in xs]
+
+    def invert_many(self, xs):
+        """Return the inverses [List<int>] of the elements of 'xs' [List<int>]."""
+        return [self.invert(x) for x in xs]
+
+    def dot(self, xs, ys):
+        """Return the dot product [int] of the vectors xs and ys."""
+        if len(xs) != len(ys):
+            raise GF2nError("Vectors' sizes not matching")
+        res = 0
+        for x, y in zip(xs, ys):
+            res ^= self.multiply(x, y)
+        return res
+
+    def matrix_multiply(self, x, y):
+        """Multiply the matrices x (r x k) and y (k x c) [List<List<int>>]."""
+        if any(len(row) != len(y) for row in x):
+            raise GF2nError("Matrices' sizes not matching")
+        yt = [list(c) for c in zip(*y)]
+        return [[self.dot(row, col) for col in yt] for row in x]
+
+    def matrix_columns(self, mat, columns):
+        """Multiply the matrix 'mat' (r x k) by every k-element vector of 'columns' [List<List<int>>]."""
+        size = len(mat[0])
+        if any(len(row) != size for row in mat) or any(len(col) != size for col in columns):
+            raise GF2nError("Matrices' sizes not matching")
+        # Rows of the result are computed with one batch multiplication per coefficient
+        lines = [[col[j] for col in columns] for j in range(size)]
+        res_rows = []
+        for row in mat:
+            acc = [0 for col in columns]
+            for j, c in enumerate(row):
+                if c:
+                    acc = [a ^ p for a, p in zip(acc, self.multiply_many(lines[j], c))]
+            res_rows.append(acc)
+        return [list(col) for col in zip(*res_rows)]
+
+    def matrix_invert(self, mat):
+        """Return the inverse [List<List<int>>] of the square matrix 'mat' (Gauss-Jordan)."""
+        size = len(mat)
+        if any(len(row) != size for row in mat):
+            raise GF2nError("Matrix must be square")
+        aug = [list(row) + [int(i == j) for j in range(size)] for i, row in enumerate(mat)]
+        for col in range(size):
+            pivot = next((r for r in range(col, size) if aug[r][col]), None)
+            if pivot is None:
+                raise GF2nError("Singular matrix")
+            aug[col], aug[pivot] = aug[pivot], aug[col]
+            aug[col] = self.multiply_many(aug[col], self.invert(aug[col][col]))
+            for r in range(size):
+                if r != col and aug[r][col]:
+                    factor = aug[r][col]
+                    aug[r] = [a ^ b for a, b in zip(aug[r], self.multiply_many(aug[col], factor))]
+        return [row[size:] for row in aug]
+
+def clear_cache():
+    """Drop the tables shared by the fields."""
+    _cache.clear()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+def nb_workers(workers):
+    """Return the number of worker processes to use (0 means one per CPU)."""
+    if workers is None:
+        return 1
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+def split(length, parts, align=1):
+    """Split range(0, length) into at most 'parts' consecutive ranges.
+
+    Every boundary except the last one is a multiple of 'align'.
+    Output:
+    ranges [List<(int, int)>] -- list of (start, end) tuples
+    """
+    nbunits = (length + align - 1)//align
+    parts = max(1, min(parts, nbunits))
+    ranges = []
+    start = 0
+    for i in range(parts):
+        end = min(length, align*(nbunits*(i+1)//parts))
+        if end > start:
+            ranges.append((start, end))
+        start = end
+    return ranges
+
+def run_jobs(fcn, jobs, workers=1, pool=None):
+    """Compute fcn(*job) for each job of 'jobs' and return the results in order.
+
+    The jobs are spread across a process pool when 'workers' > 1, 'fcn' and
+    its arguments must therefore be picklable. An existing 'pool'
+    [ProcessPoolExecutor] is used if given, instead of starting a new one
+    (e.g. to share it between the successive steps of a computation).
+    """
+    workers = nb_workers(workers)
+    if workers <= 1 or len(jobs) <= 1:
+        return [fcn(*job) for job in jobs]
+    if pool is not None:
+        return list(pool.map(fcn, *zip(*jobs)))
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(fcn, *zip(*jobs)))
+
+def stream_jobs(fcn, jobs, workers=1, initializer=None, initargs=()):
+    """Compute fcn(*job) for each job of the iterable 'jobs' and yield the results in order.
+
+    The jobs are consumed lazily, at most two per worker being pending at
+    once. 'initializer(*initargs)' is called once per worker process (once
+    in the current process when 'workers' <= 1), e.g. to load a key.
+    """
+    workers = nb_workers(workers)
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for job in jobs:
+            yield fcn(*job)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(fcn, *job))
+            if len(pending) >= 2*workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()